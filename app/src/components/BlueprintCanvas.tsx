@@ -3,7 +3,8 @@ import type { Blueprint, Building } from '@/types';
 import { getBlueprintSegments } from '@/types';
 
 interface BlueprintCanvasProps {
-  blueprint: Blueprint;
+  /** A full blueprint, or only the segments received so far while it streams */
+  blueprint: Pick<Blueprint, 'building' | 'segments'>;
   className?: string;
 }
 
@@ -1,4 +1,4 @@
-import type { BlueprintResponse, BuildRequest, BuildStatus } from '@/types';
+import type { Blueprint, BlueprintBatchEvent, BlueprintResponse, BlueprintStreamEvent, BuildRequest, BuildStatus } from '@/types';
 
 const API_BASE = '/api';
 
@@ -36,6 +36,116 @@ export async function generateBlueprint(
   return response.json();
 }
 
+export async function generateBlueprintStream(
+  imageFile: File,
+  style: string = 'ghibli',
+  onEvent?: (event: BlueprintStreamEvent) => void
+): Promise<BlueprintResponse> {
+  const formData = new FormData();
+  formData.append('image', imageFile);
+  formData.append('style', style);
+
+  const response = await fetch(`${API_BASE}/blueprint/stream`, {
+    method: 'POST',
+    body: formData,
+  });
+
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({ detail: 'Unknown error' }));
+    const detail = typeof body.detail === 'string' ? body.detail : 'Unknown error';
+    throw new Error(getBlueprintErrorMessage(response.status, detail));
+  }
+
+  const reader = response.body?.getReader();
+  if (!reader) throw new Error(getBlueprintErrorMessage(500, ''));
+
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop() || '';
+
+    for (const line of lines) {
+      if (!line.trim()) continue;
+
+      let event: BlueprintStreamEvent;
+      try {
+        event = JSON.parse(line);
+      } catch (e) {
+        console.warn('Failed to parse blueprint event:', line);
+        continue;
+      }
+      onEvent?.(event);
+      if (event.event === 'error') throw new Error(getBlueprintErrorMessage(500, event.detail));
+      if (event.event === 'done') {
+        const { event: _event, elapsed_ms: _elapsed, ...result } = event;
+        return result;
+      }
+    }
+  }
+
+  throw new Error(getBlueprintErrorMessage(500, ''));
+}
+
+export async function generateBlueprintBatch(
+  images: File[],
+  style: string = 'ghibli',
+  onEvent?: (event: BlueprintBatchEvent) => void,
+  concurrency?: number
+): Promise<BlueprintBatchEvent[]> {
+  const formData = new FormData();
+  for (const image of images) {
+    formData.append(image.name.toLowerCase().endsWith('.zip') ? 'archive' : 'images', image);
+  }
+  formData.append('style', style);
+  if (concurrency) formData.append('concurrency', String(concurrency));
+
+  const response = await fetch(`${API_BASE}/blueprint/batch`, {
+    method: 'POST',
+    body: formData,
+  });
+
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({ detail: 'Unknown error' }));
+    const detail = typeof body.detail === 'string' ? body.detail : 'Unknown error';
+    throw new Error(getBlueprintErrorMessage(response.status, detail));
+  }
+
+  const reader = response.body?.getReader();
+  if (!reader) throw new Error(getBlueprintErrorMessage(500, ''));
+
+  const decoder = new TextDecoder();
+  const events: BlueprintBatchEvent[] = [];
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop() || '';
+
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      try {
+        const event: BlueprintBatchEvent = JSON.parse(line);
+        events.push(event);
+        onEvent?.(event);
+      } catch (e) {
+        console.warn('Failed to parse batch event:', line);
+      }
+    }
+  }
+
+  return events;
+}
+
 function getBlueprintFromAudioErrorMessage(status: number, detail: string): string {
   if (status === 400) return detail || 'Invalid audio. Please record or upload an audio file.';
   if (status === 503) return detail || 'Voice input is not available.';
@@ -65,6 +175,18 @@ export async function generateBlueprintFromAudio(
   return response.json();
 }
 
+export async function getStoredBlueprint(id: string): Promise<Blueprint> {
+  const response = await fetch(`${API_BASE}/blueprints/${encodeURIComponent(id)}`);
+
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({ detail: 'Unknown error' }));
+    const detail = typeof body.detail === 'string' ? body.detail : 'Unknown error';
+    throw new Error(response.status === 404 ? 'This blueprint is no longer stored.' : detail);
+  }
+
+  return response.json();
+}
+
 export async function buildInMinecraft(
   request: BuildRequest,
   onProgress?: (status: BuildStatus) => void
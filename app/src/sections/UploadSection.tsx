@@ -3,9 +3,10 @@ import { cn } from '@/lib/utils';
 import { UploadZone } from '@/components/UploadZone';
 import { StylePresets } from '@/components/StylePresets';
 import { MinecraftBlockLoader } from '@/components/MinecraftBlockLoader';
-import { generateBlueprint, generateBlueprintFromAudio } from '@/lib/api';
+import { BlueprintCanvas } from '@/components/BlueprintCanvas';
+import { generateBlueprintStream, generateBlueprintFromAudio } from '@/lib/api';
 import { Wand2, AlertCircle, Image as ImageIcon, Mic } from 'lucide-react';
-import type { Blueprint, StylePreset } from '@/types';
+import type { Blueprint, Building, StylePreset } from '@/types';
 
 type InputMode = 'image' | 'voice';
 
@@ -21,6 +22,8 @@ export function UploadSection({ onBlueprintGenerated }: UploadSectionProps) {
   const [isRecording, setIsRecording] = useState(false);
   const [selectedStyle, setSelectedStyle] = useState<StylePreset>('ghibli');
   const [isGenerating, setIsGenerating] = useState(false);
+  // Segments drawn while the blueprint streams in, before the whole response is validated
+  const [partialSegments, setPartialSegments] = useState<Building[]>([]);
   const [error, setError] = useState<string | null>(null);
   const [isVisible, setIsVisible] = useState(false);
   const sectionRef = useRef<HTMLDivElement>(null);
@@ -113,8 +116,17 @@ export function UploadSection({ onBlueprintGenerated }: UploadSectionProps) {
       if (!selectedFile) return;
       setIsGenerating(true);
       setError(null);
+      setPartialSegments([]);
       try {
-        const response = await generateBlueprint(selectedFile, selectedStyle);
+        const response = await generateBlueprintStream(selectedFile, selectedStyle, (event) => {
+          if (event.event !== 'segment') return;
+          const { index, segment } = event;
+          setPartialSegments((segments) => {
+            const next = [...segments];
+            next[index] = segment;
+            return next;
+          });
+        });
         if (response.success && response.blueprint) {
           onBlueprintGenerated(response.blueprint);
           const blueprintSection = document.getElementById('blueprint-section');
@@ -126,6 +138,7 @@ export function UploadSection({ onBlueprintGenerated }: UploadSectionProps) {
         setError(err instanceof Error ? err.message : 'An unexpected error occurred');
       } finally {
         setIsGenerating(false);
+        setPartialSegments([]);
       }
     } else {
       if (!audioFile) return;
@@ -224,10 +237,21 @@ export function UploadSection({ onBlueprintGenerated }: UploadSectionProps) {
               aria-busy="true"
               aria-live="polite"
             >
-              <MinecraftBlockLoader size="lg" />
+              {partialSegments.length > 0 ? (
+                <BlueprintCanvas
+                  blueprint={{ segments: partialSegments.filter(Boolean) }}
+                  className="w-full max-w-md h-48"
+                />
+              ) : (
+                <MinecraftBlockLoader size="lg" />
+              )}
               <p className="text-white font-medium">Generating blueprint...</p>
               <p className="text-sm text-white/60">
-                {inputMode === 'voice' ? 'Transcribing and building...' : 'Analyzing your image with AI'}
+                {inputMode === 'voice'
+                  ? 'Transcribing and building...'
+                  : partialSegments.length > 0
+                    ? `Drawing segment ${partialSegments.length}...`
+                    : 'Analyzing your image with AI'}
               </p>
             </div>
           )}
@@ -45,19 +45,63 @@ export interface Blueprint {
 }
 
 /** Return the list of segments (single building as one segment). */
-export function getBlueprintSegments(blueprint: Blueprint): Building[] {
+export function getBlueprintSegments(blueprint: Pick<Blueprint, 'building' | 'segments'>): Building[] {
   if (blueprint.segments && blueprint.segments.length > 0) return blueprint.segments;
   if (blueprint.building) return [blueprint.building];
   return [];
 }
 
+/** One repair the backend validator made to the AI's blueprint. */
+export interface ValidationWarning {
+  path: string;
+  code: string;
+  message: string;
+  value?: unknown;
+  repaired?: unknown;
+}
+
 export interface BlueprintResponse {
   success: boolean;
   blueprint: Blueprint;
   warnings: string[];
+  warning_details?: ValidationWarning[];
   raw_ai_json?: Record<string, unknown>;
+  cached?: boolean;
+  blueprint_id?: string | null;
 }
 
+export type BlueprintStreamEvent =
+  | {
+      event: 'segment';
+      index: number;
+      segment: Building;
+      warnings: string[];
+      warning_details?: ValidationWarning[];
+      elapsed_ms: number;
+    }
+  | { event: 'style'; style: Style; elapsed_ms: number }
+  | ({ event: 'done'; elapsed_ms: number } & BlueprintResponse)
+  | { event: 'error'; detail: string; elapsed_ms: number };
+
+export type BlueprintBatchEvent =
+  | {
+      event: 'item';
+      index: number;
+      name: string;
+      success: boolean;
+      blueprint?: Blueprint;
+      warnings?: string[];
+      warning_details?: ValidationWarning[];
+      cached?: boolean;
+      blueprint_id?: string | null;
+      error?: string;
+      attempts: number;
+      queue_ms: number;
+      duration_ms: number;
+      elapsed_ms: number;
+    }
+  | { event: 'done'; total: number; succeeded: number; failed: number; concurrency: number; elapsed_ms: number };
+
 export interface BuildStatus {
   status: 'idle' | 'building' | 'completed' | 'error';
   progress: number;
@@ -66,10 +110,14 @@ export interface BuildStatus {
   current_action: string;
   logs: string[];
   error?: string;
+  plan_id?: string;
+  blueprint_id?: string | null;
 }
 
+/** Either the full blueprint or the blueprint_id of a stored one. */
 export interface BuildRequest {
-  blueprint: Blueprint;
+  blueprint?: Blueprint;
+  blueprint_id?: string;
   origin: {
     x: number;
     y: number;
@@ -7,6 +7,18 @@ class Settings(BaseSettings):
     # App settings
     app_name: str = "Image-to-Minecraft API"
     debug: bool = True
+    # Debug log (JSON lines, written by a background thread); empty path disables the file
+    debug_log_path: str = "./logs/debug.log"
+    debug_log_max_bytes: int = 10 * 1024 * 1024  # 10MB per file
+    debug_log_backups: int = 3
+    # Last N raw provider responses kept in memory for /api/debug/responses/{request_id}
+    debug_response_buffer_size: int = 200
+    # Fraction of raw responses also written to debug_response_dir (0 = none)
+    debug_response_sample_rate: float = 0.0
+    debug_response_dir: str = "./logs/responses"
+    # Serve /api/debug/responses: raw model output of every user's requests, so off unless
+    # explicitly enabled (independent of DEBUG, which only sets the log level)
+    debug_endpoints_enabled: bool = False
     version: str = "1.0.0"
     
     # CORS comma-separated (e.g. CORS_ORIGINS=http://localhost:5173,http://localhost:3000)
@@ -21,19 +33,96 @@ class Settings(BaseSettings):
     build_origin_x: int = 100
     build_origin_y: int = 70
     build_origin_z: int = 100
+    # Keep the build footprint chunks loaded (/forceload) while a build runs
+    build_forceload: bool = False
+    # Clip, merge or move openings that overlap, leave the wall face or float above the ground
+    geometry_lint_enabled: bool = True
+    # Worker processes for multi-structure site planning (0 = one per CPU core)
+    site_planner_workers: int = 0
+    # Compiled plan store (memory-mapped, shared by all workers)
+    plan_store_enabled: bool = True
+    plan_store_dir: str = "./plans"
+    plan_store_max_bytes: int = 1024 * 1024 * 1024  # 1GB
+    # Generated blueprints by canonical content hash (GET /api/blueprints/{id}, builds by id)
+    blueprint_store_enabled: bool = True
+    blueprint_store_path: str = "./cache/blueprints.sqlite3"
+    blueprint_store_max_bytes: int = 256 * 1024 * 1024  # 256MB
     
     # AI Provider
     ai_provider: str = "openai"  # or "gemini"
     ai_api_key: Optional[str] = None
     ai_model: str = "gpt-4-vision-preview"
+    # Content-addressed cache of AI results (same image + style + model -> no new API call)
+    ai_cache_enabled: bool = True
+    ai_cache_path: str = "./cache/ai_cache.sqlite3"
+    ai_cache_ttl_seconds: int = 7 * 24 * 3600  # 7 days
+    ai_cache_max_bytes: int = 256 * 1024 * 1024  # 256MB
+    # Reuse the result of a perceptually similar earlier image (max dHash Hamming distance, -1 = off)
+    ai_near_duplicate_threshold: int = 6
+    # Per-provider cap on in-flight AI calls, and how many more may wait for a slot
+    ai_max_concurrency: int = 8
+    ai_max_queue: int = 32
+    # Structured output: pass the Blueprint schema as the provider response schema (Gemini
+    # responseSchema, OpenAI json_schema; needs a model that supports it) and drop the prompt examples
+    ai_structured_output: bool = False
+    # Ordered providers for hedging/failover, e.g. "gemini,openai" (empty = AI_PROVIDER only).
+    # AI_API_KEY/AI_MODEL belong to AI_PROVIDER; the others use their own key/model below.
+    # "mock:<latency_ms>:<error_rate>[:<ms_per_kb>]" adds a local mock provider (for testing);
+    # ms_per_kb adds latency in proportion to the request payload
+    ai_providers: str = ""
+    openai_api_key: Optional[str] = None
+    openai_model: str = "gpt-4o"
+    gemini_api_key: Optional[str] = None
+    gemini_model: str = "gemini-2.5-flash"
+    # Hedge to the next provider once a call runs past the provider's rolling p95
+    ai_hedge_enabled: bool = True
+    ai_hedge_min_samples: int = 20
+    ai_hedge_default_delay_ms: int = 15000  # until min_samples calls are recorded
+    # Circuit breaker: skip a provider after this many consecutive failures, for the cooldown
+    ai_breaker_failure_threshold: int = 5
+    ai_breaker_cooldown_seconds: float = 30.0
+    # Gemini context caching of the static prompt prefix (instructions + examples)
+    gemini_context_cache_enabled: bool = True
+    gemini_context_cache_ttl_seconds: int = 3600
+    # Local sketch analyzer: clean pen outlines are converted without an AI call when its
+    # confidence (overlap of the extracted shape with the drawing, 0..1) reaches the threshold
+    sketch_analyzer_enabled: bool = True
+    sketch_confidence_threshold: float = 0.85
+    # Line drawings sent to a provider are cropped to the strokes, reduced to 1-bit or grayscale
+    # and encoded as PNG/WebP, downscaled until they fit the byte and (estimated) vision token budget
+    sketch_payload_enabled: bool = True
+    sketch_payload_max_bytes: int = 48 * 1024
+    sketch_payload_max_tokens: int = 0  # 0 = no token cap
+    sketch_payload_margin: float = 0.04  # crop margin, fraction of the longest side
+
+    # Shared provider HTTP clients (keep-alive pools, created at startup)
+    http2_enabled: bool = True
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 60.0
+    http_timeout: float = 60.0
+    http_connect_timeout: float = 10.0
     
     # Upload settings
     max_upload_size: int = 10 * 1024 * 1024  # 10MB
-    upload_dir: str = "./uploads"
+    # Threads decoding and resizing uploaded images (0 = one per CPU core)
+    image_workers: int = 0
+
+    # Batch blueprint endpoint (/api/blueprint/batch)
+    batch_concurrency: int = 4  # default images in flight per batch
+    batch_max_concurrency: int = 16  # cap on the per-request concurrency field
+    batch_max_items: int = 500
+    batch_max_bytes: int = 200 * 1024 * 1024  # 200MB
+    batch_max_retries: int = 2
+    batch_retry_backoff_seconds: float = 0.5  # doubled per retry
 
     # ElevenLabs (speech-to-text for voice blueprint)
     elevenlabs_api_key: Optional[str] = None
     elevenlabs_stt_model: str = "scribe_v1"
+    elevenlabs_base_url: Optional[str] = None  # e.g. a local mock STT server; default api.elevenlabs.io
+    # WAV recordings: trim leading/trailing silence, downmix to mono, downsample (compressed formats pass through)
+    audio_preprocess_enabled: bool = True
+    audio_target_rate: int = 16000
 
     class Config:
         env_file = ".env"
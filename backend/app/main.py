@@ -3,8 +3,21 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.config import get_settings
-from app.routers import blueprint_router, build_router
+from app.routers import blueprint_router, blueprints_router, build_router, plans_router, debug_router
 from app.models import HealthResponse
+from app.services.http_clients import get_provider_clients, close_provider_clients
+from app.services.ai_client import compile_prompts
+from app.services.ai_usage import ai_usage_metrics
+from app.services.debug_log import RequestIdMiddleware, get_response_ring, setup_logging, shutdown_logging
+from app.services.geometry_lint import geometry_metrics
+from app.services.gemini_context import close_gemini_context_cache, get_gemini_context_cache
+from app.services.elevenlabs_client import audio_metrics
+from app.services.image_pipeline import payload_metrics, shutdown_image_executor
+from app.services.provider_limits import provider_limits_metrics
+from app.services.provider_router import provider_health_metrics
+from app.services.single_flight import get_single_flight
+from app.services.site_planner import shutdown_site_executor
+from app.services.upload_limits import UploadLimitMiddleware
 
 
 @asynccontextmanager
@@ -13,9 +26,19 @@ async def lifespan(app: FastAPI):
     # Startup
     settings = get_settings()
     print(f"Starting {settings.app_name} v{settings.version}")
+    # Debug logs are written by a background thread, never on the request path
+    setup_logging()
+    # Open the pooled provider clients once; every AI/STT request reuses their connections
+    get_provider_clients()
+    compile_prompts()
     yield
     # Shutdown
     print("Shutting down...")
+    shutdown_site_executor()
+    shutdown_image_executor()
+    await close_gemini_context_cache(get_provider_clients().gemini)
+    await close_provider_clients()
+    shutdown_logging()
 
 
 def create_app() -> FastAPI:
@@ -29,6 +52,9 @@ def create_app() -> FastAPI:
         lifespan=lifespan,
     )
     
+    # Oversized uploads are refused before their body is read
+    app.add_middleware(UploadLimitMiddleware)
+
     # Configure CORS (cors_origins is comma-separated string from env)
     origins_list = [x.strip() for x in settings.cors_origins.split(",") if x.strip()]
     app.add_middleware(
@@ -37,11 +63,16 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Request-ID"],
     )
+    app.add_middleware(RequestIdMiddleware)
     
     # Include routers
     app.include_router(blueprint_router, prefix="/api")
+    app.include_router(blueprints_router, prefix="/api")
     app.include_router(build_router, prefix="/api")
+    app.include_router(plans_router, prefix="/api")
+    app.include_router(debug_router, prefix="/api")
     
     return app
 
@@ -59,6 +90,24 @@ async def health_check():
     )
 
 
+@app.get("/api/metrics")
+async def metrics():
+    """Provider HTTP connection reuse, AI call queue and token usage metrics."""
+    context_cache = get_gemini_context_cache()
+    return {
+        "http": get_provider_clients().metrics(),
+        "queues": provider_limits_metrics(),
+        "providers": provider_health_metrics(),
+        "single_flight": get_single_flight().snapshot(),
+        "ai_usage": ai_usage_metrics(),
+        "image_payload": payload_metrics(),
+        "voice_audio": audio_metrics(),
+        "geometry": geometry_metrics(),
+        "debug_responses": get_response_ring().snapshot(),
+        "gemini_context_cache": context_cache.snapshot() if context_cache else None,
+    }
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import List, Literal, Optional
+from typing import Any, List, Literal, Optional
 from enum import Enum
 
 
@@ -77,11 +77,24 @@ class Blueprint(BaseModel):
         return []
 
 
+class ValidationWarning(BaseModel):
+    """One repair the validator made to the AI's blueprint."""
+    path: str  # e.g. "segments.1.openings.0.w"
+    code: str  # Pydantic error type ("less_than_equal", "missing", ...), "removed" or "unknown_material"
+    message: str
+    value: Any = None
+    repaired: Any = None
+
+
 class BlueprintResponse(BaseModel):
     success: bool
     blueprint: Blueprint
     warnings: List[str] = Field(default_factory=list)
+    warning_details: List[ValidationWarning] = Field(default_factory=list)
     raw_ai_json: Optional[dict] = None
+    cached: bool = False
+    # Id in the blueprint store (None when the store is disabled)
+    blueprint_id: Optional[str] = None
 
 
 class Origin(BaseModel):
@@ -91,10 +104,28 @@ class Origin(BaseModel):
 
 
 class BuildRequest(BaseModel):
+    """A blueprint to build, posted in full or referenced by its blueprint store id."""
+    blueprint: Optional[Blueprint] = None
+    blueprint_id: Optional[str] = None
+    origin: Origin
+
+    @model_validator(mode="after")
+    def require_blueprint_or_id(self):
+        if (self.blueprint is None) == (self.blueprint_id is None):
+            raise ValueError("Exactly one of 'blueprint' or 'blueprint_id' must be set")
+        return self
+
+
+class SiteStructure(BaseModel):
     blueprint: Blueprint
     origin: Origin
 
 
+class SiteBuildRequest(BaseModel):
+    """Several blueprints at their own origins, built as one job (e.g. a village)."""
+    structures: List[SiteStructure] = Field(..., min_length=1)
+
+
 class BuildStatus(BaseModel):
     status: Literal["idle", "building", "completed", "error"]
     progress: float = Field(0, ge=0, le=100)
@@ -103,6 +134,8 @@ class BuildStatus(BaseModel):
     current_action: str = ""
     logs: List[str] = Field(default_factory=list)
     error: Optional[str] = None
+    plan_id: Optional[str] = None
+    blueprint_id: Optional[str] = None
 
 
 class HealthResponse(BaseModel):
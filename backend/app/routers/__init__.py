@@ -1,4 +1,7 @@
 from .blueprint import router as blueprint_router
+from .blueprints import router as blueprints_router
 from .build import router as build_router
+from .plans import router as plans_router
+from .debug import router as debug_router
 
-__all__ = ["blueprint_router", "build_router"]
\ No newline at end of file
+__all__ = ["blueprint_router", "blueprints_router", "build_router", "plans_router", "debug_router"]
\ No newline at end of file
@@ -1,24 +1,58 @@
-import os
+import asyncio
+import io
+import json
+import sqlite3
 import sys
-import uuid
+import time
+import zipfile
+from typing import List, Optional, Tuple
+import httpx
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from app.services import get_ai_client, validate_blueprint
-from app.services.elevenlabs_client import transcribe_audio
-from app.models import BlueprintResponse
+from app.services.ai_client import normalize_style
+from app.services.blueprint_store import store_blueprint
+from app.services.validator import validate_segment, warning_messages
+from app.services.elevenlabs_client import transcribe_audio_cached
+from app.services.image_pipeline import prepare_upload_image
+from app.services.provider_limits import ProviderBusyError
+from app.services.provider_router import ProviderStatusError, ProvidersUnavailableError, is_transient_status
+from app.models import Blueprint, BlueprintResponse
 from app.config import get_settings
-from app.utils import resize_image_for_ai
+from app.utils import PreparedImage
 
 router = APIRouter(prefix="/blueprint", tags=["blueprint"])
 
-MAX_IMAGE_DIMENSION = 1024
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
 
+# Failures worth another paid attempt: the provider was busy or unreachable, not wrong
+# (HTTP error statuses are judged by code, see _is_transient)
+TRANSIENT_ERRORS = (ProviderBusyError, ProvidersUnavailableError, httpx.TransportError, httpx.TimeoutException)
 
-@router.post("", response_model=BlueprintResponse)
-async def create_blueprint(
-    image: UploadFile = File(...),
-    style: str = Form("ghibli")
-):
-    """Generate a blueprint from an uploaded image."""
+# Uploads are read in chunks so an oversized one is refused without reading it all
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+async def _read_upload(upload: UploadFile, limit: int, too_large: str) -> bytes:
+    """Read an upload into memory, raising 400 (too_large) as soon as it passes limit bytes."""
+    if upload.size is not None and upload.size > limit:
+        raise HTTPException(status_code=400, detail=too_large)
+    chunks = []
+    total = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > limit:
+            raise HTTPException(status_code=400, detail=too_large)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def _prepare_upload(image: UploadFile) -> PreparedImage:
+    """Validate an uploaded image and resize it for the AI, in memory and off the event loop."""
     settings = get_settings()
 
     # Validate file type
@@ -29,28 +63,48 @@ async def create_blueprint(
         )
 
     # Validate file size
-    content = await image.read()
-    if len(content) > settings.max_upload_size:
+    content = await _read_upload(image, settings.max_upload_size, "Image is too large. Maximum size is 10MB.")
+
+    try:
+        return await prepare_upload_image(content)
+    except ValueError:
         raise HTTPException(
             status_code=400,
-            detail="Image is too large. Maximum size is 10MB."
+            detail="We couldn't read this image. Please upload a PNG, JPG, or WebP file."
         )
 
-    # Save uploaded file
-    os.makedirs(settings.upload_dir, exist_ok=True)
-    file_id = str(uuid.uuid4())
-    file_path = os.path.join(settings.upload_dir, f"{file_id}_{image.filename}")
 
-    with open(file_path, "wb") as f:
-        f.write(content)
+async def _store(blueprint: Blueprint, source: str) -> Optional[str]:
+    """Save a validated blueprint in the blueprint store; its id, or None if not stored."""
+    try:
+        return await run_in_threadpool(store_blueprint, blueprint, source)
+    except sqlite3.Error as e:
+        # The blueprint is still returned, it just can't be fetched or built by id
+        print(f"[WARN] Blueprint store write failed: {e}", file=sys.stderr)
+        return None
+
 
+def _checked_style(style: str) -> str:
+    """The palette key of the style form field; 400 for unknown styles."""
     try:
-        # Resize to max 1024px before AI to reduce payload and cost
-        resize_image_for_ai(file_path, max_dimension=MAX_IMAGE_DIMENSION)
+        return normalize_style(style)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
+@router.post("", response_model=BlueprintResponse)
+async def create_blueprint(
+    image: UploadFile = File(...),
+    style: str = Form("ghibli")
+):
+    """Generate a blueprint from an uploaded image."""
+    style = _checked_style(style)
+    prepared = await _prepare_upload(image)
+
+    try:
         # Call AI to analyze image
         ai_client = get_ai_client()
-        raw_blueprint = await ai_client.analyze_image(file_path, style)
+        raw_blueprint, cached = await ai_client.analyze_image_cached(prepared, style)
 
         # Validate and clamp the blueprint
         validated_blueprint, warnings = validate_blueprint(raw_blueprint)
@@ -58,12 +112,20 @@ async def create_blueprint(
         return BlueprintResponse(
             success=True,
             blueprint=validated_blueprint,
-            warnings=warnings,
-            raw_ai_json=raw_blueprint
+            warnings=warning_messages(warnings),
+            warning_details=warnings,
+            raw_ai_json=raw_blueprint,
+            cached=cached,
+            blueprint_id=await _store(validated_blueprint, "image"),
         )
 
     except HTTPException:
         raise
+    except (ProviderBusyError, ProvidersUnavailableError):
+        raise HTTPException(
+            status_code=503,
+            detail="The AI service is busy right now. Please try again in a few seconds."
+        )
     except Exception as e:
         # Log full error details for debugging
         import traceback
@@ -75,11 +137,228 @@ async def create_blueprint(
             detail="We couldn't analyze this image. Try a clearer photo, a front-view sketch, or a different style."
         )
 
-    finally:
+
+@router.post("/stream")
+async def stream_blueprint(
+    image: UploadFile = File(...),
+    style: str = Form("ghibli")
+):
+    """
+    Generate a blueprint from an uploaded image as NDJSON events: each validated segment
+    ("segment") and the style ("style") as soon as the model has written them, then the
+    full response ("done") or an error ("error").
+    """
+    style = _checked_style(style)
+    prepared = await _prepare_upload(image)
+    return StreamingResponse(_blueprint_events(prepared, style), media_type="application/x-ndjson")
+
+
+async def _blueprint_events(prepared: PreparedImage, style: str):
+    started = time.perf_counter()
+
+    def event(payload: dict) -> str:
+        payload["elapsed_ms"] = int((time.perf_counter() - started) * 1000)
+        return json.dumps(payload) + "\n"
+
+    try:
+        async for kind, index, part in get_ai_client().stream_blueprint(prepared, style):
+            if kind == "result":
+                validated_blueprint, warnings = validate_blueprint(part["raw"])
+                response = BlueprintResponse(
+                    success=True,
+                    blueprint=validated_blueprint,
+                    warnings=warning_messages(warnings),
+                    warning_details=warnings,
+                    raw_ai_json=part["raw"],
+                    cached=part["cached"],
+                    blueprint_id=await _store(validated_blueprint, "image"),
+                )
+                yield event({"event": "done", **response.model_dump(mode="json")})
+            elif kind == "style":
+                yield event({"event": "style", "style": part})
+            else:
+                segment, warnings = validate_segment(part)
+                if segment is not None:
+                    yield event({
+                        "event": "segment",
+                        "index": index or 0,
+                        "segment": segment.model_dump(mode="json"),
+                        "warnings": warning_messages(warnings),
+                        "warning_details": [w.model_dump(mode="json") for w in warnings],
+                    })
+    except (ProviderBusyError, ProvidersUnavailableError):
+        yield event({"event": "error", "detail": "The AI service is busy right now. Please try again in a few seconds."})
+    except Exception:
+        import traceback
+        print(f"[ERROR] Streaming blueprint generation failed:\n{traceback.format_exc()}", file=sys.stderr)
+        yield event({
+            "event": "error",
+            "detail": "We couldn't analyze this image. Try a clearer photo, a front-view sketch, or a different style.",
+        })
+
+
+@router.post("/batch")
+async def create_blueprint_batch(
+    images: List[UploadFile] = File(default=[]),
+    archive: Optional[UploadFile] = File(None),
+    style: str = Form("ghibli"),
+    concurrency: Optional[int] = Form(None),
+):
+    """
+    Generate blueprints for many images: multipart `images`, and/or a zip `archive` of
+    PNG/JPG/WebP files. Items run through resize -> AI -> validate with at most
+    `concurrency` in flight (default BATCH_CONCURRENCY) and are retried on failure.
+    Streams NDJSON: one "item" event per image in completion order, then "done".
+    """
+    settings = get_settings()
+    style = _checked_style(style)
+    items = await _batch_items(images, archive)
+    if not items:
+        raise HTTPException(status_code=400, detail="Upload images or a zip archive of PNG, JPG, or WebP files.")
+    limit = max(1, min(concurrency or settings.batch_concurrency, settings.batch_max_concurrency))
+    return StreamingResponse(_batch_events(items, style, limit), media_type="application/x-ndjson")
+
+
+async def _batch_items(images: List[UploadFile], archive: Optional[UploadFile]) -> List[Tuple[str, bytes]]:
+    """(name, bytes) of every image in the request, checked against the batch limits."""
+    settings = get_settings()
+    items: List[Tuple[str, bytes]] = []
+    total = 0
+
+    def add(name: str, content: bytes) -> None:
+        nonlocal total
+        if len(content) > settings.max_upload_size:
+            raise HTTPException(status_code=400, detail=f"{name} is too large. Maximum size is 10MB per image.")
+        total += len(content)
+        if len(items) >= settings.batch_max_items or total > settings.batch_max_bytes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch too large: at most {settings.batch_max_items} images and {settings.batch_max_bytes // (1024 * 1024)}MB.",
+            )
+        items.append((name, content))
+
+    for image in images:
+        if not image.content_type or not image.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"{image.filename} is not an image (PNG, JPG, or WebP).")
+        name = image.filename or f"image_{len(items)}"
+        add(name, await _read_upload(image, settings.max_upload_size, f"{name} is too large. Maximum size is 10MB per image."))
+
+    if archive is not None and archive.filename:
+        data = await _read_upload(
+            archive,
+            settings.batch_max_bytes,
+            f"Batch too large: at most {settings.batch_max_bytes // (1024 * 1024)}MB.",
+        )
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                for info in zf.infolist():
+                    name = info.filename
+                    if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    if info.file_size > settings.max_upload_size:
+                        raise HTTPException(status_code=400, detail=f"{name} is too large. Maximum size is 10MB per image.")
+                    add(name, zf.read(info))
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="The archive is not a valid zip file.")
+    return items
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Whether a failure (or the httpx error it wraps) may succeed on retry."""
+    while error is not None:
+        if isinstance(error, TRANSIENT_ERRORS):
+            return True
+        if isinstance(error, ProviderStatusError):
+            return is_transient_status(error.status_code)
+        if isinstance(error, httpx.HTTPStatusError):
+            return is_transient_status(error.response.status_code)
+        error = error.__cause__
+    return False
+
+
+async def _batch_item(index: int, name: str, content: bytes, style: str, semaphore: asyncio.Semaphore) -> dict:
+    """Run one batch image through the pipeline with retries; returns its NDJSON event."""
+    settings = get_settings()
+    queued = time.perf_counter()
+    await semaphore.acquire()
+    holding = True
+    try:
+        started = time.perf_counter()
+        attempts = 0
+        result: dict = {}
+        # Resized once; retries only repeat the AI call
         try:
-            os.remove(file_path)
-        except OSError:
-            pass
+            prepared: Optional[PreparedImage] = await prepare_upload_image(content)
+        except ValueError:
+            prepared = None
+            result = {"success": False, "error": "This file is not a readable image."}
+        while prepared is not None:
+            attempts += 1
+            try:
+                raw_blueprint, cached = await get_ai_client().analyze_image_cached(prepared, style)
+                validated_blueprint, warnings = validate_blueprint(raw_blueprint)
+                result = {
+                    "success": True,
+                    "blueprint": validated_blueprint.model_dump(mode="json"),
+                    "warnings": warning_messages(warnings),
+                    "warning_details": [w.model_dump(mode="json") for w in warnings],
+                    "cached": cached,
+                    "blueprint_id": await _store(validated_blueprint, "batch"),
+                }
+                break
+            except Exception as e:
+                # Invalid JSON or a blueprint that fails validation would fail the same way again
+                if attempts > settings.batch_max_retries or not _is_transient(e):
+                    print(f"[ERROR] Batch item {name} failed after {attempts} attempts: {e}", file=sys.stderr)
+                    result = {"success": False, "error": "We couldn't analyze this image."}
+                    break
+            # Back off without holding a concurrency slot, so other items can use it meanwhile
+            semaphore.release()
+            holding = False
+            await asyncio.sleep(settings.batch_retry_backoff_seconds * 2 ** (attempts - 1))
+            await semaphore.acquire()
+            holding = True
+        finished = time.perf_counter()
+    finally:
+        if holding:
+            semaphore.release()
+    return {
+        "event": "item",
+        "index": index,
+        "name": name,
+        "attempts": attempts,
+        "queue_ms": int((started - queued) * 1000),
+        "duration_ms": int((finished - started) * 1000),
+        **result,
+    }
+
+
+async def _batch_events(items: List[Tuple[str, bytes]], style: str, concurrency: int):
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [
+        asyncio.ensure_future(_batch_item(i, name, content, style, semaphore))
+        for i, (name, content) in enumerate(items)
+    ]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            event = await next_done
+            succeeded += event["success"]
+            event["elapsed_ms"] = int((time.perf_counter() - started) * 1000)
+            yield json.dumps(event) + "\n"
+        yield json.dumps({
+            "event": "done",
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "concurrency": concurrency,
+            "elapsed_ms": int((time.perf_counter() - started) * 1000),
+        }) + "\n"
+    finally:
+        # Client went away: stop the remaining items
+        for task in tasks:
+            task.cancel()
 
 
 @router.post("/from-audio", response_model=BlueprintResponse)
@@ -87,8 +366,13 @@ async def create_blueprint_from_audio(
     audio: UploadFile = File(...),
     style: str = Form("ghibli"),
 ):
-    """Generate a blueprint from a voice recording (transcribed via ElevenLabs, then Gemini)."""
+    """
+    Generate a blueprint from a voice recording (transcribed via ElevenLabs, then Gemini).
+    Transcripts are cached per recording and blueprints per normalized transcript, so a
+    repeated request makes no upstream call.
+    """
     settings = get_settings()
+    style = _checked_style(style)
 
     content_type = (audio.content_type or "").strip().lower()
     if not content_type or not content_type.startswith("audio/"):
@@ -97,40 +381,45 @@ async def create_blueprint_from_audio(
             detail="Please upload an audio file (e.g. WebM, MP3, WAV) or use the record button.",
         )
 
-    content = await audio.read()
-    if len(content) > settings.max_upload_size:
-        raise HTTPException(
-            status_code=400,
-            detail="Audio file is too large. Maximum size is 10MB.",
-        )
-    if len(content) < 100:
-        raise HTTPException(
-            status_code=400,
-            detail="Audio file is too short. Record at least a second or two of speech.",
-        )
-
+    ai_client = get_ai_client()
+    # The text prompt (and its Gemini cached context) is prepared while the audio is read and transcribed
+    warmup = asyncio.ensure_future(ai_client.warm_text_prompt(style))
     try:
-        transcript = await transcribe_audio(content, content_type or "audio/webm")
+        content = await _read_upload(audio, settings.max_upload_size, "Audio file is too large. Maximum size is 10MB.")
+        if len(content) < 100:
+            raise HTTPException(
+                status_code=400,
+                detail="Audio file is too short. Record at least a second or two of speech.",
+            )
+
+        transcript, _ = await transcribe_audio_cached(content, content_type or "audio/webm")
         if not (transcript and transcript.strip()):
             raise HTTPException(
                 status_code=400,
                 detail="We couldn't hear any speech in the recording. Try again in a quieter place or speak clearly.",
             )
 
-        ai_client = get_ai_client()
-        raw_blueprint = await ai_client.analyze_text(transcript.strip(), style)
+        raw_blueprint, cached = await ai_client.analyze_text_cached(transcript.strip(), style)
 
         validated_blueprint, warnings = validate_blueprint(raw_blueprint)
 
         return BlueprintResponse(
             success=True,
             blueprint=validated_blueprint,
-            warnings=warnings,
+            warnings=warning_messages(warnings),
+            warning_details=warnings,
             raw_ai_json=raw_blueprint,
+            cached=cached,
+            blueprint_id=await _store(validated_blueprint, "audio"),
         )
 
     except HTTPException:
         raise
+    except (ProviderBusyError, ProvidersUnavailableError):
+        raise HTTPException(
+            status_code=503,
+            detail="The AI service is busy right now. Please try again in a few seconds."
+        )
     except ValueError as e:
         msg = str(e)
         if "API key" in msg or "not configured" in msg:
@@ -144,4 +433,7 @@ async def create_blueprint_from_audio(
         raise HTTPException(
             status_code=500,
             detail="We couldn't create a blueprint from this recording. Try again or use an image instead.",
-        )
\ No newline at end of file
+        )
+    finally:
+        # Only still running when the request failed early (or the cache answered first)
+        warmup.cancel()
@@ -0,0 +1,53 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from app.services.blueprint_store import get_blueprint_store, BlueprintStore
+
+router = APIRouter(prefix="/blueprints", tags=["blueprints"])
+
+# An id names its content, so a fetched blueprint never goes stale
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _store() -> BlueprintStore:
+    store = get_blueprint_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="The blueprint store is disabled.")
+    return store
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """"exact" if If-None-Match names this ETag, "*" if it only has a wildcard, else None."""
+    if not if_none_match:
+        return None
+    tags = [t.strip() for t in if_none_match.split(",")]
+    if any(t.removeprefix("W/") == etag for t in tags):
+        return "exact"
+    return "*" if "*" in tags else None
+
+
+@router.get("")
+async def list_blueprints(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """List stored blueprints, newest first, with the total and the offset of the next page."""
+    return await run_in_threadpool(_store().list, limit, offset)
+
+
+@router.get("/{blueprint_id}")
+async def get_blueprint(blueprint_id: str, if_none_match: Optional[str] = Header(None)):
+    """A stored blueprint as its canonical JSON; 304 if the client already has it (If-None-Match)."""
+    store = _store()
+    etag = f'"{blueprint_id}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    match = _etag_matches(if_none_match, etag)
+    if match == "exact":
+        # Same id, same content: no need to read it
+        return Response(status_code=304, headers=headers)
+    if match == "*":
+        # A wildcard only matches a blueprint that is actually stored
+        if not await run_in_threadpool(store.has, blueprint_id):
+            raise HTTPException(status_code=404, detail=f"Blueprint {blueprint_id} not found.")
+        return Response(status_code=304, headers=headers)
+    body = await run_in_threadpool(store.get_json, blueprint_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail=f"Blueprint {blueprint_id} not found.")
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,36 +1,198 @@
 import json
+import sqlite3
+import sys
 import time
+from typing import Callable, Iterator, List, Optional, Tuple
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from app.models import BuildRequest, BuildStatus
+from app.models import Blueprint, BuildRequest, BuildStatus, SiteBuildRequest
 from app.services import BlockPlanner, get_block_count, get_rcon_client
+from app.services.block_planner import BlockPlacement, render_commands
+from app.services.command_scheduler import (
+    schedule_placements,
+    order_by_block_type,
+    forceload_area_commands,
+    get_footprint,
+    estimate_server_cost,
+    chunk_of,
+)
+from app.services.site_planner import plan_site, SiteCollisionError
+from app.services.blueprint_store import get_blueprint_store, store_blueprint
+from app.services.plan_store import get_plan_store, plan_key, StoredPlan
 from app.config import get_settings
 
 router = APIRouter(prefix="/build", tags=["build"])
 
 
+class BuildJob:
+    """What a build sends: commands in order, how many, the footprint to forceload and a schedule summary."""
+
+    __slots__ = ("commands", "total", "footprint", "schedule_log")
+
+    def __init__(self, commands: Iterator[str], total: int, footprint: Optional[Tuple[int, int, int, int]], schedule_log: str):
+        self.commands = commands
+        self.total = total
+        self.footprint = footprint
+        self.schedule_log = schedule_log
+
+
 @router.post("")
 async def build_structure(request: BuildRequest):
-    """Build a blueprint in Minecraft via RCON."""
-    
-    async def generate_status():
-        blueprint = request.blueprint
-        origin = request.origin
-        
-        # Initialize planner
+    """Build a blueprint in Minecraft via RCON, posted in full or by blueprint store id."""
+    blueprint, blueprint_id = await _resolve_blueprint(request)
+    origin = request.origin
+
+    def plan() -> Tuple[List[BlockPlacement], List[str]]:
+        # Generate placements at the requested origin and order them chunk by chunk, bottom-up
         planner = BlockPlanner()
-        
-        # Generate placements
-        placements = planner.generate_placements(blueprint)
-        total_blocks = len(placements)
-        
-        # Update settings with custom origin if provided
+        placements = planner.generate_placements(blueprint, origin)
+        return schedule_placements(placements), planner.warnings
+
+    # Keyed by the blueprint id when there is one: no need to dump and hash the blueprint again
+    payload = {"blueprint": blueprint.model_dump(mode="json")} if blueprint_id is None else {"blueprint_id": blueprint_id}
+    plan_id, job, warnings = await _load_or_plan(
+        {**payload, "origin": origin.model_dump()},
+        "structure",
+        plan,
+        {"blueprint_id": blueprint_id} if blueprint_id else {},
+    )
+    return StreamingResponse(
+        _stream_build(
+            job,
+            warnings,
+            f"Structure built at X:{origin.x}, Y:{origin.y}, Z:{origin.z}",
+            plan_id,
+            blueprint_id,
+        ),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.post("/site")
+async def build_site(request: SiteBuildRequest):
+    """Build several blueprints at their own origins as one job (one clear pass, chunk-ordered)."""
+    structures = [(s.blueprint, s.origin) for s in request.structures]
+
+    def plan() -> Tuple[List[BlockPlacement], List[str]]:
+        site = plan_site(structures)
+        return site.placements, site.warnings
+
+    try:
+        plan_id, job, warnings = await _load_or_plan(
+            {"structures": [s.model_dump(mode="json") for s in request.structures]},
+            "site",
+            plan,
+        )
+    except SiteCollisionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        _stream_build(
+            job,
+            warnings,
+            f"Site of {len(structures)} structures built",
+            plan_id,
+        ),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.post("/plan/{plan_id}")
+async def build_stored_plan(plan_id: str):
+    """Replay a stored plan without re-planning, streaming its commands from the memory-mapped file."""
+    store = get_plan_store()
+    stored = await run_in_threadpool(store.get, plan_id) if store is not None else None
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"Plan {plan_id} not found.")
+    job = await run_in_threadpool(_job_from_plan, stored)
+    return StreamingResponse(
+        _stream_build(job, stored.meta.get("warnings", []), f"Plan {plan_id} replayed", plan_id),
+        media_type="application/x-ndjson"
+    )
+
+
+async def _resolve_blueprint(request: BuildRequest) -> Tuple[Blueprint, Optional[str]]:
+    """
+    (blueprint, store id) of a build request. A posted blueprint is added to the store, so
+    builds of it key off its id like builds by id do (None when the store is disabled).
+    """
+    if request.blueprint_id is None:
+        try:
+            return request.blueprint, await run_in_threadpool(store_blueprint, request.blueprint, "build")
+        except sqlite3.Error as e:
+            print(f"[WARN] Blueprint store write failed: {e}", file=sys.stderr)
+            return request.blueprint, None
+    store = get_blueprint_store()
+    blueprint = await run_in_threadpool(store.get, request.blueprint_id) if store is not None else None
+    if blueprint is None:
+        raise HTTPException(status_code=404, detail=f"Blueprint {request.blueprint_id} not found.")
+    return blueprint, request.blueprint_id
+
+
+async def _load_or_plan(
+    payload: dict,
+    kind: str,
+    plan: Callable[[], Tuple[List[BlockPlacement], List[str]]],
+    meta: Optional[dict] = None,
+) -> Tuple[str, BuildJob, List[str]]:
+    """
+    Return (plan_id, build job, warnings). A stored plan for the same input is streamed
+    from disk; a new plan is built in memory and saved.
+    """
+    plan_id = plan_key(payload)
+    store = get_plan_store()
+    if store is not None:
+        stored = await run_in_threadpool(store.get, plan_id)
+        if stored is not None:
+            job = await run_in_threadpool(_job_from_plan, stored)
+            return plan_id, job, stored.meta.get("warnings", [])
+    scheduled, warnings = await run_in_threadpool(plan)
+    job = await run_in_threadpool(_job_from_placements, scheduled)
+    if store is not None:
+        meta = {"kind": kind, "warnings": warnings, "schedule_log": job.schedule_log, **(meta or {})}
+        await run_in_threadpool(store.save, plan_id, scheduled, meta)
+    return plan_id, job, warnings
+
+
+def _job_from_placements(scheduled: List[BlockPlacement]) -> BuildJob:
+    """A job for placements planned in this request, with the estimated server cost of their order."""
+    use_forceload = get_settings().build_forceload
+    cost_before = estimate_server_cost(order_by_block_type(scheduled))
+    cost_after = estimate_server_cost(scheduled, forceloaded=use_forceload)
+    chunk_count = len({chunk_of(p.x, p.z) for p in scheduled})
+    schedule_log = (
+        f"Scheduled {len(scheduled)} commands over {chunk_count} chunks "
+        f"(est. server tick time {cost_after['tick_ms']:.0f} ms vs {cost_before['tick_ms']:.0f} ms type-ordered, "
+        f"{cost_after['chunk_loads']} vs {cost_before['chunk_loads']} chunk loads)"
+    )
+    footprint = get_footprint(scheduled) if scheduled else None
+    return BuildJob(render_commands(scheduled), len(scheduled), footprint, schedule_log)
+
+
+def _job_from_plan(stored: StoredPlan) -> BuildJob:
+    """
+    A job streaming a stored plan's rendered commands from its memory-mapped file; the
+    footprint and chunk count come from the voxel array, no placements are built.
+    """
+    total = len(stored)
+    schedule_log = stored.meta.get("schedule_log") or f"Replaying {total} commands over {stored.chunk_count()} chunks"
+    return BuildJob(stored.iter_commands(), total, stored.footprint() if total else None, schedule_log)
+
+
+def _stream_build(
+    job: BuildJob,
+    warnings: List[str],
+    location_log: str,
+    plan_id: str,
+    blueprint_id: Optional[str] = None,
+):
+    """Send a job's commands over RCON, yielding NDJSON BuildStatus updates."""
+
+    async def generate_status():
         settings = get_settings()
-        if origin:
-            settings.build_origin_x = origin.x
-            settings.build_origin_y = origin.y
-            settings.build_origin_z = origin.z
-        
+        total_blocks = job.total
+
         # Connect to RCON
         yield json.dumps({
             "status": "building",
@@ -38,9 +200,14 @@ async def build_structure(request: BuildRequest):
             "blocks_placed": 0,
             "total_blocks": total_blocks,
             "current_action": "Connecting to Minecraft server...",
-            "logs": ["Initializing build process...", "Connecting to RCON..."]
+            "logs": ["Initializing build process...", f"Plan {plan_id}", "Connecting to RCON..."],
+            "plan_id": plan_id,
+            "blueprint_id": blueprint_id
         }) + "\n"
-        
+
+        use_forceload = settings.build_forceload and job.footprint is not None
+        forceload_add, forceload_remove = forceload_area_commands(*job.footprint) if use_forceload else ([], [])
+
         rcon = get_rcon_client()
         if not rcon.connect():
             yield json.dumps({
@@ -53,7 +220,9 @@ async def build_structure(request: BuildRequest):
                 "error": "Could not connect to Minecraft server. Make sure RCON is enabled."
             }) + "\n"
             return
-        
+
+        blocks_placed = 0
+        progress = 0
         try:
             # Test connection
             if not rcon.test_connection():
@@ -67,28 +236,29 @@ async def build_structure(request: BuildRequest):
                     "error": "RCON connection test failed. Check server settings."
                 }) + "\n"
                 return
-            
+
             yield json.dumps({
                 "status": "building",
                 "progress": 2,
                 "blocks_placed": 0,
                 "total_blocks": total_blocks,
                 "current_action": "Connected! Starting build...",
-                "logs": ["Connected to Minecraft server", f"Building {total_blocks} blocks..."]
+                "logs": ["Connected to Minecraft server", *warnings, job.schedule_log, f"Building {total_blocks} blocks..."]
             }) + "\n"
-            
-            # Generate and execute commands
-            commands = list(planner.generate_commands(placements))
-            blocks_placed = 0
-            
-            for i, command in enumerate(commands):
+
+            # Keep the footprint loaded for the duration of the job
+            for command in forceload_add:
+                rcon.send_command(command)
+
+            # Execute commands
+            for i, command in enumerate(job.commands):
                 try:
                     response = rcon.send_command(command)
                     blocks_placed += 1
-                    
+
                     # Calculate progress
-                    progress = min(100, int((i + 1) / len(commands) * 100))
-                    
+                    progress = min(100, int((i + 1) / total_blocks * 100))
+
                     # Determine current action
                     if "air" in command:
                         action = "Clearing area..."
@@ -102,7 +272,7 @@ async def build_structure(request: BuildRequest):
                         action = "Building roof..."
                     else:
                         action = f"Placing blocks... ({blocks_placed}/{total_blocks})"
-                    
+
                     # Yield status update every 10 blocks or on important milestones
                     if i % 10 == 0 or progress >= 100:
                         yield json.dumps({
@@ -113,10 +283,10 @@ async def build_structure(request: BuildRequest):
                             "current_action": action,
                             "logs": [f"{action} ({progress}%)"]
                         }) + "\n"
-                    
+
                     # Small delay to prevent overwhelming the server
                     time.sleep(0.02)
-                    
+
                 except Exception as e:
                     yield json.dumps({
                         "status": "building",
@@ -126,7 +296,7 @@ async def build_structure(request: BuildRequest):
                         "current_action": f"Error on block {blocks_placed}: {str(e)}",
                         "logs": [f"Warning: {str(e)}"]
                     }) + "\n"
-            
+
             # Build complete
             yield json.dumps({
                 "status": "completed",
@@ -136,10 +306,10 @@ async def build_structure(request: BuildRequest):
                 "current_action": "Build complete!",
                 "logs": [
                     f"Build complete! Placed {blocks_placed} blocks.",
-                    f"Structure built at X:{origin.x}, Y:{origin.y}, Z:{origin.z}"
+                    location_log
                 ]
             }) + "\n"
-            
+
         except Exception as e:
             yield json.dumps({
                 "status": "error",
@@ -150,11 +320,13 @@ async def build_structure(request: BuildRequest):
                 "logs": [f"Error: {str(e)}"],
                 "error": str(e)
             }) + "\n"
-            
+
         finally:
+            for command in forceload_remove:
+                try:
+                    rcon.send_command(command)
+                except Exception:
+                    pass
             rcon.disconnect()
-    
-    return StreamingResponse(
-        generate_status(),
-        media_type="application/x-ndjson"
-    )
\ No newline at end of file
+
+    return generate_status()
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.config import get_settings
+from app.services.debug_log import get_response_ring
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+def _require_debug() -> None:
+    # Hidden unless DEBUG_ENDPOINTS_ENABLED: the responses belong to other users
+    if not get_settings().debug_endpoints_enabled:
+        raise HTTPException(status_code=404, detail="Not found.")
+
+
+@router.get("/responses")
+async def list_responses(limit: int = Query(50, ge=1, le=500)):
+    """Request ids with buffered raw provider responses, most recent first."""
+    _require_debug()
+    return get_response_ring().recent(limit)
+
+
+@router.get("/responses/{request_id}")
+async def get_responses(request_id: str):
+    """Raw provider responses (and errors) recorded while handling one request."""
+    _require_debug()
+    entries = get_response_ring().get(request_id)
+    if entries is None:
+        raise HTTPException(status_code=404, detail=f"No responses buffered for request {request_id}.")
+    return {"request_id": request_id, "responses": entries}
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.services.plan_store import get_plan_store, diff_plans, PlanStore, StoredPlan
+
+router = APIRouter(prefix="/plans", tags=["plans"])
+
+
+def _store() -> PlanStore:
+    store = get_plan_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="The plan store is disabled.")
+    return store
+
+
+def _open_plan(plan_id: str) -> StoredPlan:
+    plan = _store().get(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail=f"Plan {plan_id} not found.")
+    return plan
+
+
+@router.get("")
+async def list_plans(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """List stored plans, most recently used first."""
+    return await run_in_threadpool(_store().list, limit, offset)
+
+
+@router.get("/{plan_id}")
+async def get_plan(plan_id: str):
+    """Metadata of a stored plan."""
+    plan = await run_in_threadpool(_open_plan, plan_id)
+    return {
+        "id": plan.plan_id,
+        "commands": len(plan),
+        "palette": plan.palette,
+        "meta": plan.meta,
+    }
+
+
+@router.get("/{plan_id}/commands")
+async def export_plan_commands(plan_id: str):
+    """
+    Export a stored plan as a function file (streamed from the memory-mapped file): one
+    command per line, without the leading slash that functions reject.
+    """
+    plan = await run_in_threadpool(_open_plan, plan_id)
+    return StreamingResponse(
+        plan.iter_function_bytes(),
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{plan_id}.mcfunction"'},
+    )
+
+
+@router.get("/{plan_id}/diff/{other_id}")
+async def diff_plan(plan_id: str, other_id: str, limit: int = Query(100, ge=0, le=10000)):
+    """Block-by-block difference between two stored plans."""
+    a = await run_in_threadpool(_open_plan, plan_id)
+    b = await run_in_threadpool(_open_plan, other_id)
+    return await run_in_threadpool(diff_plans, a, b, limit)
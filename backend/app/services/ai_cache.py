@@ -0,0 +1,202 @@
+"""
+Content-addressed cache for AI blueprint results.
+
+Entries are keyed by SHA-256 of the normalized image + style + provider + model +
+prompt version and hold the raw blueprint JSON returned by the model. Backed by a
+single SQLite file (WAL) so it survives restarts and is shared by all workers;
+entries expire after a TTL and the least recently used ones are evicted above a size cap.
+
+Each image entry also records a perceptual hash, so a re-scan or re-photo of a sketch
+(different bytes, same drawing) can reuse the closest earlier result within a Hamming
+distance threshold.
+
+The voice pipeline stores two more kinds of entry in the same table: transcripts keyed
+by the SHA-256 of the recording, and blueprints keyed by the normalized transcript.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.config import get_settings
+from app.utils.hash_index import HammingIndex
+
+_HASH_MASK = (1 << 64) - 1
+
+
+def cache_key(image_digest: str, style: str, provider: str, model: str, prompt_version: str) -> str:
+    """Stable cache key for one analysis request."""
+    parts = ["image", image_digest, style, provider, model, str(prompt_version)]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def transcript_cache_key(audio_digest: str, stt_model: str) -> str:
+    """Cache key of the transcript of one recording."""
+    parts = ["transcript", audio_digest, stt_model]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def normalize_transcript(text: str) -> str:
+    """Case, punctuation and spacing folded away: "A red house, two windows." == "a red house two windows"."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def text_cache_key(transcript: str, style: str, provider: str, model: str, prompt_version: str) -> str:
+    """Cache key of a blueprint generated from a transcript (normalized, see normalize_transcript)."""
+    parts = ["text", normalize_transcript(transcript), style, provider, model, str(prompt_version)]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def similarity_scope(style: str, provider: str, model: str, prompt_version: str) -> str:
+    """Group of entries a near-duplicate may be taken from (everything in the key but the image)."""
+    parts = ["scope", style, provider, model, str(prompt_version)]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def _to_sqlite_int(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class AICache:
+    def __init__(self, path: str, ttl_seconds: int, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, created_at REAL, last_access REAL,"
+                " size_bytes INTEGER, value TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_hashes ("
+                " id INTEGER PRIMARY KEY, scope TEXT, phash INTEGER, key TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS image_hashes_scope ON image_hashes (scope, id)")
+        # In-memory hash index per scope, with the last image_hashes row id loaded into it
+        self._indexes: Dict[str, Tuple[HammingIndex, int]] = {}
+        self._index_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached raw blueprint (or transcript entry), or None if missing or expired."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT created_at, value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl_seconds > 0 and now - row[0] > self.ttl_seconds:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        try:
+            return json.loads(row[1])
+        except ValueError:
+            return None
+
+    def put(self, key: str, value: dict) -> None:
+        """Store a raw blueprint, then drop expired entries and evict LRU entries above the size cap."""
+        text = json.dumps(value, separators=(",", ":"))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (key, now, now, len(text.encode("utf-8")), text),
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Delete expired entries and least recently used ones until the cache fits max_bytes."""
+        removed = 0
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.ttl_seconds > 0:
+                    removed += conn.execute(
+                        "DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                    ).rowcount
+                total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM results").fetchone()[0]
+                if total > self.max_bytes:
+                    for key, size in conn.execute(
+                        "SELECT key, size_bytes FROM results ORDER BY last_access ASC"
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                        total -= size
+                        removed += 1
+                if removed:
+                    conn.execute("DELETE FROM image_hashes WHERE key NOT IN (SELECT key FROM results)")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    def add_hash(self, scope: str, phash: int, key: str) -> None:
+        """Record the perceptual hash of the image behind entry key."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO image_hashes (scope, phash, key) VALUES (?, ?, ?)",
+                (scope, _to_sqlite_int(phash), key),
+            )
+
+    def _hash_index(self, scope: str) -> HammingIndex:
+        """The scope's hash index, topped up with rows added since the last call (also by other workers)."""
+        with self._index_lock:
+            index, last_id = self._indexes.get(scope, (None, 0))
+            if index is None:
+                index = HammingIndex()
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, phash, key FROM image_hashes WHERE scope = ? AND id > ? ORDER BY id",
+                    (scope, last_id),
+                ).fetchall()
+            for row_id, phash, key in rows:
+                index.add(phash & _HASH_MASK, key)
+                last_id = row_id
+            self._indexes[scope] = (index, last_id)
+            return index
+
+    def find_similar(self, scope: str, phash: int, max_distance: int) -> Optional[Tuple[dict, int]]:
+        """Closest live entry whose image hash is within max_distance bits: (raw blueprint, distance)."""
+        for distance, key in self._hash_index(scope).search(phash, max_distance):
+            value = self.get(key)
+            if value is not None:
+                return value, distance
+        return None
+
+
+# Singleton instance
+_ai_cache: Optional[AICache] = None
+
+
+def get_ai_cache() -> Optional[AICache]:
+    """The shared cache, or None when caching is disabled."""
+    global _ai_cache
+    settings = get_settings()
+    if not settings.ai_cache_enabled:
+        return None
+    if _ai_cache is None:
+        _ai_cache = AICache(settings.ai_cache_path, settings.ai_cache_ttl_seconds, settings.ai_cache_max_bytes)
+    return _ai_cache
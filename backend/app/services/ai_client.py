@@ -1,19 +1,33 @@
 import asyncio
-import ast
-import base64
+import copy
 import json
-import os
-import re
-from typing import Optional
+import random
+import time
+from functools import lru_cache
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
 import httpx
 from app.config import get_settings
-
-# #region agent log
-# Calculate workspace root: go up from backend/app/services/ai_client.py -> backend -> workspace root
-_backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # backend/
-_workspace_root = os.path.dirname(_backend_dir)  # workspace root
-DEBUG_LOG_PATH = os.path.join(_workspace_root, ".cursor", "debug.log")
-# #endregion
+from app.services.ai_cache import cache_key, similarity_scope, text_cache_key, get_ai_cache
+from app.services.ai_usage import record_ai_usage
+from app.services.blueprint_schema import gemini_response_schema, openai_response_format
+from app.services.debug_log import get_response_ring, logger, request_id_var
+from app.services.gemini_context import get_gemini_context_cache
+from app.services.http_clients import ProviderClients, get_provider_clients
+from app.services.image_pipeline import compact_image_payload
+from app.services.provider_limits import get_provider_limiter
+from app.services.provider_router import (
+    ProviderSpec,
+    ProviderStatusError,
+    ProvidersUnavailableError,
+    call_with_failover,
+    configured_providers,
+    get_provider_health,
+)
+from app.services.single_flight import get_single_flight
+from app.services.sketch_analyzer import analyze_sketch
+from app.utils.image import PreparedImage, image_digest, perceptual_hash
+from app.utils.json_repair import parse_json_tolerant
+from app.utils.json_stream import BlueprintStreamParser
 
 STYLE_PALETTES = {
     "ghibli": {
@@ -50,224 +64,59 @@ STYLE_PALETTES = {
     },
 }
 
-def _log_debug(message: str, data: dict):
-    """Write debug log entry."""
-    import sys
-    log_entry = {
-        "location": "ai_client.py",
-        "message": message,
-        "data": data,
-        "timestamp": int(__import__("time").time() * 1000)
-    }
-    try:
-        os.makedirs(os.path.dirname(DEBUG_LOG_PATH), exist_ok=True)
-        with open(DEBUG_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry) + "\n")
-    except Exception as e:
-        # Fallback: also try writing to backend directory and stderr
-        try:
-            fallback_path = os.path.join(_backend_dir, "debug.log")
-            with open(fallback_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry) + "\n")
-        except:
-            try:
-                print(f"[DEBUG] {message}: {json.dumps(data)}", file=sys.stderr)
-            except:
-                pass  # Don't fail on logging errors
-
-
-def _extract_outer_json_object(text: str) -> Optional[str]:
-    """Find the outermost {...} in text by bracket matching. Handles nested braces."""
-    start = text.find("{")
-    if start < 0:
-        return None
-    depth = 0
-    in_string = False
-    escape = False
-    quote_char = None
-    i = start
-    while i < len(text):
-        c = text[i]
-        if escape:
-            escape = False
-            i += 1
-            continue
-        if c == "\\" and in_string:
-            escape = True
-            i += 1
-            continue
-        if not in_string:
-            if c == "{":
-                depth += 1
-            elif c == "}":
-                depth -= 1
-                if depth == 0:
-                    return text[start : i + 1]
-            elif c in ('"', "'"):
-                in_string = True
-                quote_char = c
-        else:
-            if c == quote_char:
-                in_string = False
-        i += 1
-    return None
-
-
-def _remove_trailing_commas(json_str: str) -> str:
-    """Remove trailing commas before ] or } (invalid in JSON but common in LLM output)."""
-    return re.sub(r",(\s*[}\]])", r"\1", json_str)
-
-
-def _repair_truncated_json(json_str: str) -> str:
-    """Attempt to repair JSON truncated mid-output (e.g. 'y':  with no value)."""
-    s = json_str.rstrip()
-    if not s:
-        return s
-    # If ends with ": " or "," (incomplete value), append 0 so we have a value
-    if re.search(r':\s*$', s) or (s.endswith(",") and '"' not in s[-10:]):
-        s = re.sub(r',\s*$', '', s)
-        s = re.sub(r':\s*$', ': 0', s)
-    # Count unclosed brackets (ignore inside strings)
-    depth_curly = 0
-    depth_square = 0
-    in_string = False
-    escape = False
-    quote_char = None
-    i = 0
-    while i < len(s):
-        c = s[i]
-        if escape:
-            escape = False
-            i += 1
-            continue
-        if c == '\\' and in_string:
-            escape = True
-            i += 1
-            continue
-        if not in_string:
-            if c == '{':
-                depth_curly += 1
-            elif c == '}':
-                depth_curly -= 1
-            elif c == '[':
-                depth_square += 1
-            elif c == ']':
-                depth_square -= 1
-            elif c in ('"', "'"):
-                in_string = True
-                quote_char = c
-        else:
-            if c == quote_char:
-                in_string = False
-        i += 1
-    # Close any open arrays then objects
-    s += ']' * depth_square + '}' * depth_curly
-    return s
 
+def normalize_style(style: str) -> str:
+    """
+    The STYLE_PALETTES key for a client-supplied style ("Medieval " -> "medieval").
+    Raises ValueError for anything else: the style ends up in the prompt and in cache keys.
+    """
+    key = (style or "").strip().lower()
+    if key not in STYLE_PALETTES:
+        raise ValueError(f"Unknown style '{style}'. Choose one of: {', '.join(STYLE_PALETTES)}.")
+    return key
 
 def _extract_json_from_content(content: str) -> dict:
-    """Extract and parse JSON from model output, handling various formats."""
-    # #region agent log
-    _log_debug("_extract_json_from_content: raw input", {"content_length": len(content), "content_preview": content[:200]})
-    # #endregion
-    
-    # Normalize: strip BOM and whitespace
-    content = content.strip().lstrip("\ufeff")
-    
-    # Strategy 1: Direct parsing
+    """Extract and parse the blueprint JSON object from model output (see parse_json_tolerant)."""
+    logger.debug("_extract_json_from_content: raw input", extra={"data": {"content_length": len(content), "content_preview": content[:200]}})
     try:
-        result = json.loads(content)
-        # #region agent log
-        _log_debug("_extract_json_from_content: direct json.loads success", {})
-        # #endregion
-        return result
-    except json.JSONDecodeError:
-        pass
-    
-    # Strategy 2: Extract from markdown code blocks
-    extracted = content
-    if "```json" in content:
-        parts = content.split("```json")
-        if len(parts) > 1:
-            extracted = parts[1].split("```")[0].strip().lstrip("\ufeff")
-    elif "```" in content:
-        parts = content.split("```")
-        if len(parts) > 1:
-            extracted = parts[1].split("```")[0].strip().lstrip("\ufeff")
-    
-    # #region agent log
-    _log_debug("_extract_json_from_content: after markdown strip", {"content_length": len(extracted), "content_preview": extracted[:200]})
-    # #endregion
-    
-    # Strategy 3: Bracket-matching extract (find outermost { ... })
-    json_error = None
-    bracket_extracted = _extract_outer_json_object(extracted)
-    candidates = [extracted]
-    if bracket_extracted and bracket_extracted != extracted:
-        candidates.append(bracket_extracted)
-    
-    for candidate in candidates:
-        # Strategy 3a: Try as-is
-        try:
-            result = json.loads(candidate)
-            # #region agent log
-            _log_debug("_extract_json_from_content: json.loads success", {})
-            # #endregion
-            return result
-        except json.JSONDecodeError as e:
-            json_error = e
-        # Strategy 3b: Remove trailing commas then parse
-        try:
-            fixed = _remove_trailing_commas(candidate)
-            result = json.loads(fixed)
-            # #region agent log
-            _log_debug("_extract_json_from_content: json.loads after trailing comma fix success", {})
-            # #endregion
-            return result
-        except json.JSONDecodeError:
-            pass
-        # Strategy 3c: Python literal eval (single quotes)
-        try:
-            result = ast.literal_eval(candidate)
-            if isinstance(result, dict):
-                # #region agent log
-                _log_debug("_extract_json_from_content: ast.literal_eval success", {})
-                # #endregion
-                return result
-        except (ValueError, SyntaxError):
-            pass
-        # Strategy 3d: Repair truncated JSON (close brackets, complete incomplete "key": )
-        try:
-            repaired = _repair_truncated_json(candidate)
-            result = json.loads(repaired)
-            # #region agent log
-            _log_debug("_extract_json_from_content: repair_truncated then json.loads success", {})
-            # #endregion
-            return result
-        except json.JSONDecodeError:
-            pass
-    
-    # All strategies failed - write full content to file for debugging
-    dump_path = os.path.join(_backend_dir, "last_gemini_response.txt")
-    try:
-        with open(dump_path, "w", encoding="utf-8") as f:
-            f.write(extracted)
-    except Exception:
-        pass
-    preview = extracted[:500] if len(extracted) > 500 else extracted
-    json_err_msg = str(json_error) if json_error else "N/A"
-    # #region agent log
-    _log_debug("_extract_json_from_content: all strategies failed", {"full_content": extracted[:1000]})
-    # #endregion
-    raise ValueError(
-        f"AI returned invalid JSON. Full response saved to {dump_path}. "
-        f"Preview: {preview[:200]}... JSON error: {json_err_msg}"
-    ) from None
-
-
-def _get_blueprint_prompt(style: str) -> str:
+        return parse_json_tolerant(content)
+    except ValueError as json_error:
+        logger.warning("_extract_json_from_content: parse failed", extra={"data": {"content_preview": content[:1000]}})
+        raise ValueError(
+            f"AI returned invalid JSON. Full response: /api/debug/responses/{request_id_var.get()}. "
+            f"Preview: {content[:200]}... JSON error: {json_error}"
+        ) from None
+
+
+# Size of the text chunks the mock provider streams
+MOCK_STREAM_CHUNK = 64
+
+# Bump whenever the blueprint prompts change, so cached results from older prompts are not reused
+PROMPT_VERSION = 1
+
+
+# Prompts are pure functions of (style, mode); each is built once and reused
+PROMPT_CACHE_SIZE = 64
+
+# Leading instruction of every Gemini prompt
+GEMINI_JSON_PREAMBLE = (
+    "You are a blueprint extraction engine. Your response must be exactly one JSON object, "
+    "no other text, no markdown code blocks, no explanation. Use double quotes for all keys and strings.\n\n"
+)
+OPENAI_SYSTEM_PROMPT = "You are a blueprint extraction engine. Return ONLY valid JSON that matches the schema exactly."
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _get_blueprint_prompt(style: str, structured: bool = False) -> str:
+    """Image prompt; in structured mode the schema goes to the provider, so the examples are left out."""
+    if structured:
+        return _get_blueprint_instructions(style)
+    return _get_blueprint_instructions(style) + _get_blueprint_examples(style)
+
+
+def _get_blueprint_instructions(style: str) -> str:
     palette = STYLE_PALETTES.get(style, STYLE_PALETTES["ghibli"])
-    
+
     return f"""
     Analyze the uploaded image of a front-view building outline (pen on white paper). Infer a parametric building or compound. The drawing is always with ground at the bottom and sky at the top; do not invert. Order segments strictly left-to-right as they appear in the image so the build is not mirrored.
 
@@ -301,7 +150,13 @@ Rules:
   window:     {palette['window']}
   door:       {palette['door']}
 - Return ONLY JSON. No markdown. No extra keys.
+"""
+
+
+def _get_blueprint_examples(style: str) -> str:
+    palette = STYLE_PALETTES.get(style, STYLE_PALETTES["ghibli"])
 
+    return f"""
 JSON Schema:
 {{
   "view": "front",
@@ -375,8 +230,15 @@ Example castle-style (tower + flat connector + center + flat connector + tower)
 }}"""
 
 
-def _get_blueprint_from_text_prompt(style: str) -> str:
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _get_blueprint_from_text_prompt(style: str, structured: bool = False) -> str:
     """Prompt for generating blueprint JSON from a verbal description (same schema as image path)."""
+    if structured:
+        return _get_text_instructions(style)
+    return _get_text_instructions(style) + _get_text_examples(style)
+
+
+def _get_text_instructions(style: str) -> str:
     palette = STYLE_PALETTES.get(style, STYLE_PALETTES["ghibli"])
     return f"""
 You are a blueprint generator for Minecraft buildings. The user will provide a verbal description of a building they want. Your job is to output a single JSON object that describes that building in the exact schema below.
@@ -392,7 +254,12 @@ RULES:
 - Use ONLY these block names (no others):
   foundation: {palette['foundation']}, wall: {palette['wall']}, trim: {palette['trim']}, roof: {palette['roof']}, window: {palette['window']}, door: {palette['door']}
 - Return ONLY the JSON object. No markdown, no code fences, no explanation.
+"""
+
 
+def _get_text_examples(style: str) -> str:
+    palette = STYLE_PALETTES.get(style, STYLE_PALETTES["ghibli"])
+    return f"""
 JSON Schema (same as image-based blueprint):
 {{
   "view": "front",
@@ -438,237 +305,657 @@ Example multi-segment (castle-style):
 """
 
 
+def _gemini_image_part(image: PreparedImage) -> dict:
+    """Gemini inline image part."""
+    return {"inline_data": {"mime_type": image.mime_type, "data": image.base64}}
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _gemini_image_prompt(style: str, structured: bool = False) -> str:
+    return GEMINI_JSON_PREAMBLE + _get_blueprint_prompt(style, structured)
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _gemini_text_prompt(style: str, structured: bool = False) -> str:
+    return GEMINI_JSON_PREAMBLE + _get_blueprint_from_text_prompt(style, structured)
+
+
+def compile_prompts() -> None:
+    """Build every style's prompts up front (called at startup)."""
+    for style in STYLE_PALETTES:
+        for structured in (False, True):
+            _gemini_image_prompt(style, structured)
+            _gemini_text_prompt(style, structured)
+
+
+def _gemini_error_message(response: httpx.Response) -> str:
+    try:
+        message = response.json().get("error", {}).get("message", response.text)
+    except ValueError:
+        message = response.text
+    return f"Gemini API error: {response.status_code} {message}"
+
+
+def _gemini_response_text(data: dict) -> str:
+    """Text of a generateContent response (or one streamed chunk). Raises ValueError if blocked."""
+    block_reason = (data.get("promptFeedback") or {}).get("blockReason")
+    if block_reason:
+        raise ValueError(f"Gemini blocked the request: {block_reason}")
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return ""
+    content_parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(p.get("text", "") or "" for p in content_parts)
+
+
+class _StaleContextError(ValueError):
+    """The cached context a request referenced is gone (expired or deleted)."""
+
+
+def _gemini_usage(data: dict) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    usage = data.get("usageMetadata") or {}
+    return usage.get("promptTokenCount"), usage.get("candidatesTokenCount"), usage.get("cachedContentTokenCount")
+
+
+def _openai_usage(data: dict) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    usage = data.get("usage") or {}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    return usage.get("prompt_tokens"), usage.get("completion_tokens"), cached
+
+
+def _require_blueprint(raw: dict) -> dict:
+    """Reject output with neither a building nor segments, so failover can try another provider."""
+    if not isinstance(raw, dict) or not (isinstance(raw.get("building"), dict) or isinstance(raw.get("segments"), list)):
+        raise ValueError("AI response has neither 'building' nor 'segments'")
+    return raw
+
+
+def _style_block(style: str) -> dict:
+    """Style section for blueprints made without the model (the theme's palette)."""
+    return {
+        "theme": style,
+        "materials": dict(STYLE_PALETTES.get(style, STYLE_PALETTES["ghibli"])),
+        "decor": ["lantern", "leaves"],
+        "variation": 0.15,
+    }
+
+
+def _blueprint_parts(raw: dict) -> Iterator[Tuple[str, Optional[int], dict]]:
+    """The parts of a complete blueprint in the order a streamed one would produce them."""
+    segments = raw.get("segments")
+    if isinstance(segments, list) and segments:
+        for i, segment in enumerate(segments):
+            if isinstance(segment, dict):
+                yield "segment", i, segment
+    elif isinstance(raw.get("building"), dict):
+        yield "building", None, raw["building"]
+    if isinstance(raw.get("style"), dict):
+        yield "style", None, raw["style"]
+
+
 class AIClient:
-    def __init__(self):
+    def __init__(
+        self,
+        clients: Optional[ProviderClients] = None,
+        structured: Optional[bool] = None,
+        providers: Optional[List[ProviderSpec]] = None,
+    ):
         self.settings = get_settings()
-        self.api_key = self.settings.ai_api_key
-        self.model = self.settings.ai_model
-        self.provider = (self.settings.ai_provider or "openai").strip().lower()
+        # Ordered providers for hedging/failover; empty means the built-in mock blueprint
+        self.providers = configured_providers(self.settings) if providers is None else providers
+        primary = self.providers[0] if self.providers else None
+        self.spec = primary
+        self.api_key = primary.api_key if primary else None
+        self.model = primary.model if primary else self.settings.ai_model
+        self.provider = primary.name if primary else (self.settings.ai_provider or "openai").strip().lower()
+        # Pooled provider clients; None means the app-wide ones owned by the lifespan
+        self._clients = clients
+        # Structured output: send the Blueprint schema as the provider's response schema
+        self.structured = self.settings.ai_structured_output if structured is None else structured
+
+    @property
+    def clients(self) -> ProviderClients:
+        return self._clients or get_provider_clients()
+
+    @property
+    def live(self) -> bool:
+        """Whether any configured provider is a real API (only their results are cached)."""
+        return any(spec.kind != "mock" for spec in self.providers)
+
+    def _is_primary(self, spec: Optional[ProviderSpec]) -> bool:
+        """
+        Whether a result came from the primary provider. Cache keys and similarity scopes name
+        the primary, so a hedged or failed-over answer from another model is not cached under it.
+        """
+        return spec is not None and spec is self.spec
+
+    def _for_provider(self, spec: ProviderSpec) -> "AIClient":
+        """A view of this client bound to one provider of the list."""
+        view = copy.copy(self)
+        view.spec = spec
+        view.provider = spec.name
+        view.api_key = spec.api_key
+        view.model = spec.model
+        return view
+
+    @property
+    def mode(self) -> str:
+        return "structured" if self.structured else "prompt"
+
+    @property
+    def prompt_version(self) -> str:
+        """Part of the cache key: prompts (and the schema) differ between modes."""
+        return f"{PROMPT_VERSION}-structured" if self.structured else str(PROMPT_VERSION)
+
+    def _prompt_key(self, kind: str, style: str) -> str:
+        """Identifies a static prompt prefix (kind = "image" or "text")."""
+        return f"blockprint-{kind}-{style}-{self.mode}-v{PROMPT_VERSION}"
+
+    async def _gemini_contents(self, key: str, prefix: str, parts: list, inline_parts: list) -> Tuple[list, Optional[str]]:
+        """
+        Parts to send and the cached context to reference: just `parts` when the static
+        prefix is held in a Gemini cached context, otherwise `inline_parts` (prefix included).
+        """
+        context_cache = get_gemini_context_cache()
+        if context_cache is not None:
+            name = await context_cache.context_for(self.clients.gemini, self.api_key, self.model, key, prefix)
+            if name is not None:
+                return parts, name
+        return inline_parts, None
+
+    def _gemini_body(self, parts: list, cached_content: Optional[str] = None) -> dict:
+        generation_config = {"temperature": 0.2, "maxOutputTokens": 4096}
+        if self.structured:
+            generation_config["responseMimeType"] = "application/json"
+            generation_config["responseSchema"] = gemini_response_schema()
+        body = {
+            "contents": [{"role": "user", "parts": parts}],
+            "generationConfig": generation_config,
+        }
+        if cached_content:
+            body["cachedContent"] = cached_content
+        return body
 
-    def _analyze_image_gemini_sync(self, image_path: str, style: str) -> dict:
-        """Synchronous Gemini API call (run in thread from async)."""
-        for base in (_backend_dir, os.getcwd()):
-            try:
-                with open(os.path.join(base, "last_gemini_response.txt"), "w", encoding="utf-8") as f:
-                    f.write("GEMINI_CALL_STARTED")
-            except Exception:
-                pass
-        from google import genai
-        from google.genai import types
-
-        with open(image_path, "rb") as f:
-            image_bytes = f.read()
-
-        # Determine MIME type from extension
-        mime_type = "image/jpeg"
-        if image_path.lower().endswith(".png"):
-            mime_type = "image/png"
-        elif image_path.lower().endswith(".webp"):
-            mime_type = "image/webp"
-
-        client = genai.Client(api_key=self.api_key)
-        image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
-        prompt = (
-            "You are a blueprint extraction engine. Your response must be exactly one JSON object, "
-            "no other text, no markdown code blocks, no explanation. Use double quotes for all keys and strings.\n\n"
-            + _get_blueprint_prompt(style)
+    async def _gemini_generate(self, parts: list, cached_content: Optional[str] = None) -> str:
+        """Call Gemini generateContent over the pooled client and return the response text."""
+        started = time.perf_counter()
+        try:
+            response = await self.clients.gemini.post(
+                f"/models/{self.model}:generateContent",
+                headers={"x-goog-api-key": self.api_key},
+                json=self._gemini_body(parts, cached_content),
+            )
+        except httpx.HTTPError as api_error:
+            get_response_ring().record("gemini", self.model, error=f"{type(api_error).__name__}: {api_error}")
+            raise ValueError(f"Gemini API error: {type(api_error).__name__}: {api_error}") from api_error
+        if response.status_code >= 400:
+            message = _gemini_error_message(response)
+            get_response_ring().record("gemini", self.model, content=response.text, error=message)
+            if cached_content and response.status_code in (403, 404):
+                raise _StaleContextError(message)
+            raise ProviderStatusError(message, response.status_code)
+        data = response.json()
+        record_ai_usage("gemini", self.mode, time.perf_counter() - started, *_gemini_usage(data))
+        text = _gemini_response_text(data)
+        get_response_ring().record("gemini", self.model, content=text)
+        return text
+
+    async def _gemini_generate_prompted(self, key: str, prefix: str, parts: list, inline_parts: list) -> str:
+        """_gemini_generate with the static prefix taken from a cached context when possible."""
+        send_parts, context = await self._gemini_contents(key, prefix, parts, inline_parts)
+        try:
+            return await self._gemini_generate(send_parts, context)
+        except _StaleContextError:
+            get_gemini_context_cache().invalidate(self.model, key)
+            return await self._gemini_generate(inline_parts)
+
+    async def _gemini_stream(self, parts: list, cached_content: Optional[str] = None) -> AsyncIterator[str]:
+        """Call Gemini streamGenerateContent (SSE) and yield text deltas as they arrive."""
+        started = time.perf_counter()
+        usage: Tuple[Optional[int], Optional[int], Optional[int]] = (None, None, None)
+        try:
+            async with self.clients.gemini.stream(
+                "POST",
+                f"/models/{self.model}:streamGenerateContent",
+                params={"alt": "sse"},
+                headers={"x-goog-api-key": self.api_key},
+                json=self._gemini_body(parts, cached_content),
+            ) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    if cached_content and response.status_code in (403, 404):
+                        raise _StaleContextError(_gemini_error_message(response))
+                    raise ProviderStatusError(_gemini_error_message(response), response.status_code)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = json.loads(line[5:])
+                    if data.get("usageMetadata"):
+                        usage = _gemini_usage(data)
+                    text = _gemini_response_text(data)
+                    if text:
+                        yield text
+        except httpx.HTTPError as api_error:
+            raise ValueError(f"Gemini API error: {type(api_error).__name__}: {api_error}") from api_error
+        record_ai_usage("gemini", self.mode, time.perf_counter() - started, *usage)
+
+    async def _openai_stream(self, body: dict) -> AsyncIterator[str]:
+        """Call chat completions with stream=true and yield content deltas as they arrive."""
+        started = time.perf_counter()
+        usage: Tuple[Optional[int], Optional[int], Optional[int]] = (None, None, None)
+        async with self.clients.openai.stream(
+            "POST",
+            "/chat/completions",
+            headers=self._openai_headers(),
+            json={**body, "stream": True, "stream_options": {"include_usage": True}},
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                data = json.loads(payload)
+                if data.get("usage"):
+                    usage = _openai_usage(data)
+                choices = data.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    yield delta
+        record_ai_usage("openai", self.mode, time.perf_counter() - started, *usage)
+
+    async def _openai_complete(self, body: dict) -> str:
+        """Call chat completions over the pooled client and return the message content."""
+        started = time.perf_counter()
+        response = await self.clients.openai.post(
+            "/chat/completions",
+            headers=self._openai_headers(),
+            json=body,
         )
+        if response.status_code >= 400:
+            get_response_ring().record("openai", self.model, content=response.text, error=f"HTTP {response.status_code}")
+        response.raise_for_status()
+        data = response.json()
+        record_ai_usage("openai", self.mode, time.perf_counter() - started, *_openai_usage(data))
+        content = data["choices"][0]["message"]["content"]
+        get_response_ring().record("openai", self.model, content=content)
+        return content
+
+    def _openai_headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
 
+    def _openai_image_request(self, image: PreparedImage, style: str) -> dict:
+        """Chat completions body for the image prompt."""
+        # Static prompt first, image last: OpenAI caches the repeated prefix automatically
+        user_prompt = _get_blueprint_prompt(style, self.structured)
+
+        body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": user_prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{image.mime_type};base64,{image.base64}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.2,
+        }
+        if self.structured:
+            body["response_format"] = openai_response_format()
+        return body
+
+    async def _analyze_image_gemini(self, image: PreparedImage, style: str) -> dict:
+        """Gemini vision call over the shared keep-alive client."""
         try:
-            response = client.models.generate_content(
-                model=self.model,
-                contents=[image_part, prompt],
-                config=types.GenerateContentConfig(
-                    temperature=0.2,
-                    max_output_tokens=4096,
-                ),
-            )
-        except Exception as api_error:
-            # #region agent log
-            _log_debug("_analyze_image_gemini_sync: API call failed", {"error": str(api_error), "error_type": type(api_error).__name__})
-            # #endregion
-            for base in (_backend_dir, os.getcwd()):
-                try:
-                    with open(os.path.join(base, "last_gemini_response.txt"), "w", encoding="utf-8") as f:
-                        f.write(f"API_ERROR: {type(api_error).__name__}: {api_error}")
-                except Exception:
-                    pass
-            raise ValueError(f"Gemini API error: {str(api_error)}") from api_error
-        
-        # Check for errors in response
-        if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-            if hasattr(response.prompt_feedback, 'block_reason') and response.prompt_feedback.block_reason:
-                raise ValueError(f"Gemini blocked the request: {response.prompt_feedback.block_reason}")
-        
-        content = response.text
-        # #region agent log
-        _log_debug("_analyze_image_gemini_sync: raw response", {"has_content": bool(content), "content_length": len(content) if content else 0, "content_preview": content[:300] if content else None, "response_type": type(response).__name__})
-        # #endregion
+            content = await self._gemini_generate_image(image, style)
+        except ValueError as api_error:
+            logger.debug("_analyze_image_gemini: API call failed", extra={"data": {"error": str(api_error), "error_type": type(api_error).__name__}})
+            raise
+
+        logger.debug("_analyze_image_gemini: raw response", extra={"data": {"content_length": len(content), "content_preview": content[:300]}})
         if not content:
-            # Check if there are candidates with content
-            if hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and candidate.content:
-                    if hasattr(candidate.content, 'parts'):
-                        parts_text = []
-                        for part in candidate.content.parts:
-                            if hasattr(part, 'text'):
-                                parts_text.append(part.text)
-                        if parts_text:
-                            content = "".join(parts_text)
-                            # #region agent log
-                            _log_debug("_analyze_image_gemini_sync: extracted from candidates", {"content_preview": content[:300]})
-                            # #endregion
-            
-            if not content:
-                for base in (_backend_dir, os.getcwd()):
-                    try:
-                        with open(os.path.join(base, "last_gemini_response.txt"), "w", encoding="utf-8") as f:
-                            f.write("EMPTY_RESPONSE")
-                    except Exception:
-                        pass
-                raise ValueError("Gemini returned empty response")
-        
-        # Always write last response to file for debugging (overwritten each request)
-        for base in (_backend_dir, os.getcwd()):
-            try:
-                with open(os.path.join(base, "last_gemini_response.txt"), "w", encoding="utf-8") as f:
-                    f.write(content)
-            except Exception:
-                pass
-        
+            raise ValueError("Gemini returned empty response")
+
         return _extract_json_from_content(content)
 
-    async def analyze_image(self, image_path: str, style: str = "ghibli") -> dict:
-        """Analyze building image and return blueprint JSON."""
-        if not self.api_key:
-            return self._get_mock_blueprint(style)
+    def _gemini_image_request(self, image: PreparedImage, style: str) -> Tuple[str, str, list, list]:
+        """(prefix key, prefix, per-request parts, inline parts) for the image prompt."""
+        key = self._prompt_key("image", style)
+        prefix = _gemini_image_prompt(style, self.structured)
+        part = _gemini_image_part(image)
+        return key, prefix, [part], [part, {"text": prefix}]
 
-        if self.provider == "gemini":
-            return await asyncio.to_thread(
-                self._analyze_image_gemini_sync,
-                image_path,
-                style,
-            )
+    async def _gemini_generate_image(self, image: PreparedImage, style: str) -> str:
+        return await self._gemini_generate_prompted(*self._gemini_image_request(image, style))
 
-        # OpenAI
-        with open(image_path, "rb") as f:
-            image_data = base64.b64encode(f.read()).decode("utf-8")
-
-        system_prompt = "You are a blueprint extraction engine. Return ONLY valid JSON that matches the schema exactly."
-        user_prompt = _get_blueprint_prompt(style)
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": user_prompt},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{image_data}"
-                                    }
-                                }
-                            ]
-                        }
-                    ],
-                    "max_tokens": 1000,
-                    "temperature": 0.2,
-                },
-                timeout=60.0,
-            )
-            response.raise_for_status()
-            data = response.json()
-            content = data["choices"][0]["message"]["content"]
-            return _extract_json_from_content(content)
-
-    def _analyze_text_gemini_sync(self, transcript: str, style: str) -> dict:
-        """Synchronous Gemini API call for text-to-blueprint (no image)."""
-        from google import genai
-        from google.genai import types
-
-        client = genai.Client(api_key=self.api_key)
-        text_prompt = (
-            "You are a blueprint extraction engine. Your response must be exactly one JSON object, "
-            "no other text, no markdown code blocks, no explanation. Use double quotes for all keys and strings.\n\n"
-            + _get_blueprint_from_text_prompt(style)
-            + "\n\n---\nUser's description:\n"
-            + transcript
+    async def _gemini_stream_image(self, image: PreparedImage, style: str) -> AsyncIterator[str]:
+        key, prefix, parts, inline_parts = self._gemini_image_request(image, style)
+        send_parts, context = await self._gemini_contents(key, prefix, parts, inline_parts)
+        try:
+            async for chunk in self._gemini_stream(send_parts, context):
+                yield chunk
+        except _StaleContextError:
+            # Raised before the first chunk, so nothing has been yielded yet
+            get_gemini_context_cache().invalidate(self.model, key)
+            async for chunk in self._gemini_stream(inline_parts):
+                yield chunk
+
+    async def _cache_lookup(self, image: PreparedImage, style: str) -> Tuple[str, str, Optional[int], Optional[dict]]:
+        """
+        Look the image up in the result cache: exact match on the normalized image first,
+        then the nearest earlier image within ai_near_duplicate_threshold bits of perceptual hash.
+        Returns (key, scope, phash, cached raw blueprint or None).
+        """
+        digest = await asyncio.to_thread(image_digest, image.image)
+        key = cache_key(digest, style, self.provider, self.model, self.prompt_version)
+        scope = similarity_scope(style, self.provider, self.model, self.prompt_version)
+        cache = get_ai_cache()
+        if cache is None:
+            return key, scope, None, None
+
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return key, scope, None, cached
+
+        threshold = self.settings.ai_near_duplicate_threshold
+        phash = await asyncio.to_thread(perceptual_hash, image.image) if threshold >= 0 else None
+        if phash is not None:
+            similar = await asyncio.to_thread(cache.find_similar, scope, phash, threshold)
+            if similar is not None:
+                return key, scope, phash, similar[0]
+        return key, scope, phash, None
+
+    async def _cache_store(self, key: str, scope: str, phash: Optional[int], raw: dict) -> None:
+        cache = get_ai_cache()
+        if cache is None:
+            return
+        await asyncio.to_thread(cache.put, key, raw)
+        if phash is not None:
+            await asyncio.to_thread(cache.add_hash, scope, phash, key)
+
+    async def _local_blueprint(self, image: PreparedImage, style: str) -> Optional[dict]:
+        """Blueprint from the local sketch analyzer, or None when it is off or not confident enough."""
+        if not self.settings.sketch_analyzer_enabled:
+            return None
+        analysis = await asyncio.to_thread(analyze_sketch, image.image)
+        accepted = analysis.geometry is not None and analysis.confidence >= self.settings.sketch_confidence_threshold
+        record_ai_usage("sketch", "local" if accepted else "fallback", analysis.elapsed)
+        logger.debug(
+            "sketch analysis",
+            extra={"data": {"confidence": round(analysis.confidence, 3), "reason": analysis.reason, "accepted": accepted}},
         )
+        if not accepted:
+            return None
+        return {**analysis.geometry, "style": _style_block(style)}
+
+    async def analyze_image_cached(self, image: PreparedImage, style: str = "ghibli") -> Tuple[dict, bool]:
+        """
+        analyze_image with the content-addressed result cache (see _cache_lookup).
+        Identical requests arriving while the upstream call runs share that one call.
+        Returns (raw blueprint, cached). Mock results (no API key) are never cached.
+        Clean sketches are converted locally first (see _local_blueprint).
+        """
+        local = await self._local_blueprint(image, style)
+        if local is not None:
+            return local, False
+        if not self.live:
+            return (await self.analyze_image(image, style))[0], False
+
+        key, scope, phash, cached = await self._cache_lookup(image, style)
+        if cached is not None:
+            return cached, True
+
+        async def fetch() -> dict:
+            raw, spec = await self.analyze_image(image, style)
+            if self._is_primary(spec):
+                await self._cache_store(key, scope, phash, raw)
+            return raw
+
+        raw_blueprint, _ = await get_single_flight().do(key, fetch)
+        return raw_blueprint, False
+
+    async def stream_image(self, image: PreparedImage, style: str = "ghibli") -> AsyncIterator[str]:
+        """
+        Yield the model's raw text output for an image as it is generated. A provider that
+        fails before its first chunk is replaced by the next one (no hedging: a stream
+        cannot be raced without paying for both).
+        """
+        async for _, chunk in self._stream_image_chunks(image, style):
+            yield chunk
+
+    async def _stream_image_chunks(self, image: PreparedImage, style: str) -> AsyncIterator[Tuple[Optional[ProviderSpec], str]]:
+        """stream_image, each chunk paired with the provider producing it (None for the built-in mock)."""
+        if not self.providers:
+            text = json.dumps(self._get_mock_blueprint(style), indent=2)
+            for i in range(0, len(text), MOCK_STREAM_CHUNK):
+                yield None, text[i:i + MOCK_STREAM_CHUNK]
+            return
+        await compact_image_payload(image, self.providers[0].kind)
+
+        last_error: Optional[Exception] = None
+        for spec in self.providers:
+            health = get_provider_health(spec.name)
+            if not health.acquire():
+                continue
+            client = self._for_provider(spec)
+            started = time.perf_counter()
+            chunks: List[str] = []
+            yielded = finished = False
+            try:
+                async with get_provider_limiter(spec.name).slot():
+                    async for chunk in client._stream_image_provider(image, style):
+                        yielded = True
+                        chunks.append(chunk)
+                        yield spec, chunk
+                finished = True
+            except Exception as e:
+                finished = True
+                get_response_ring().record(spec.kind, spec.model, content="".join(chunks), error=str(e))
+                health.record_failure(e)
+                if yielded:
+                    raise
+                last_error = e
+                continue
+            finally:
+                if not finished:
+                    # The consumer went away mid-stream
+                    health.record_cancelled()
+            get_response_ring().record(spec.kind, spec.model, content="".join(chunks))
+            health.record_success(time.perf_counter() - started)
+            return
+        raise last_error or ProvidersUnavailableError([p.name for p in self.providers])
+
+    async def _stream_image_provider(self, image: PreparedImage, style: str) -> AsyncIterator[str]:
+        if self.spec.kind == "mock":
+            text = await self._mock_generate(style, len(image.data))
+            for i in range(0, len(text), MOCK_STREAM_CHUNK):
+                yield text[i:i + MOCK_STREAM_CHUNK]
+            return
+        if self.spec.kind == "gemini":
+            stream = self._gemini_stream_image(image, style)
+        else:
+            stream = self._openai_stream(self._openai_image_request(image, style))
+        async for chunk in stream:
+            yield chunk
+
+    async def stream_blueprint(self, image: PreparedImage, style: str = "ghibli") -> AsyncIterator[Tuple[str, Optional[int], dict]]:
+        """
+        Stream a blueprint for an image part by part: ("segment", i, dict), ("building", None, dict)
+        and ("style", None, dict) as soon as each object closes in the model output, then
+        ("result", None, {"raw": blueprint, "cached": bool}) once the whole output is parsed.
+        Cached and locally analyzed results are replayed the same way.
+        """
+        local = await self._local_blueprint(image, style)
+        if local is not None:
+            for part in _blueprint_parts(local):
+                yield part
+            yield "result", None, {"raw": local, "cached": False}
+            return
+
+        key = scope = phash = None
+        if self.live:
+            key, scope, phash, cached = await self._cache_lookup(image, style)
+            if cached is not None:
+                for part in _blueprint_parts(cached):
+                    yield part
+                yield "result", None, {"raw": cached, "cached": True}
+                return
+
+        parser = BlueprintStreamParser()
+        spec: Optional[ProviderSpec] = None
+        async for spec, chunk in self._stream_image_chunks(image, style):
+            for part in parser.feed(chunk):
+                yield part
+        raw = _extract_json_from_content(parser.text)
+        if key is not None and self._is_primary(spec):
+            await self._cache_store(key, scope, phash, raw)
+        yield "result", None, {"raw": raw, "cached": False}
+
+    async def analyze_image(self, image: PreparedImage, style: str = "ghibli") -> Tuple[dict, Optional[ProviderSpec]]:
+        """
+        Analyze building image and return (blueprint JSON, provider that produced it), hedged
+        across the configured providers. The provider is None for the built-in mock.
+        """
+        if not self.providers:
+            return self._get_mock_blueprint(style), None
+        await compact_image_payload(image, self.providers[0].kind)
+
+        async def call(spec: ProviderSpec) -> dict:
+            async with get_provider_limiter(spec.name).slot():
+                return _require_blueprint(await self._for_provider(spec)._analyze_image_provider(image, style))
+
+        return await call_with_failover(self.providers, call, hedge=self.settings.ai_hedge_enabled)
+
+    async def _analyze_image_provider(self, image: PreparedImage, style: str) -> dict:
+        if self.spec.kind == "mock":
+            return await self._mock_complete(style, len(image.data))
+        if self.spec.kind == "gemini":
+            return await self._analyze_image_gemini(image, style)
 
-        try:
-            response = client.models.generate_content(
-                model=self.model,
-                contents=[text_prompt],
-                config=types.GenerateContentConfig(
-                    temperature=0.2,
-                    max_output_tokens=4096,
-                ),
-            )
-        except Exception as api_error:
-            raise ValueError(f"Gemini API error: {str(api_error)}") from api_error
+        # OpenAI
+        content = await self._openai_complete(self._openai_image_request(image, style))
+        return _extract_json_from_content(content)
 
-        if hasattr(response, "prompt_feedback") and response.prompt_feedback:
-            if getattr(response.prompt_feedback, "block_reason", None):
-                raise ValueError(f"Gemini blocked the request: {response.prompt_feedback.block_reason}")
+    async def _analyze_text_gemini(self, transcript: str, style: str) -> dict:
+        """Gemini text-to-blueprint call (no image) over the shared keep-alive client."""
+        prefix = _gemini_text_prompt(style, self.structured)
+        description = "\n\n---\nUser's description:\n" + transcript
 
-        content = response.text
-        if not content and hasattr(response, "candidates") and response.candidates:
-            parts = getattr(response.candidates[0].content, "parts", [])
-            content = "".join(getattr(p, "text", "") or "" for p in parts)
+        content = await self._gemini_generate_prompted(
+            self._prompt_key("text", style),
+            prefix,
+            [{"text": description}],
+            [{"text": prefix + description}],
+        )
         if not content:
             raise ValueError("Gemini returned empty response")
 
         return _extract_json_from_content(content)
 
-    async def analyze_text(self, transcript: str, style: str = "ghibli") -> dict:
-        """Generate blueprint JSON from a verbal description (transcript)."""
-        if not self.api_key:
-            return self._get_mock_blueprint(style)
+    async def analyze_text(self, transcript: str, style: str = "ghibli") -> Tuple[dict, Optional[ProviderSpec]]:
+        """Generate (blueprint JSON, provider that produced it) from a verbal description (transcript)."""
+        if not self.providers:
+            return self._get_mock_blueprint(style), None
+
+        async def call(spec: ProviderSpec) -> dict:
+            async with get_provider_limiter(spec.name).slot():
+                return _require_blueprint(await self._for_provider(spec)._analyze_text_provider(transcript, style))
+
+        return await call_with_failover(self.providers, call, hedge=self.settings.ai_hedge_enabled)
+
+    async def analyze_text_cached(self, transcript: str, style: str = "ghibli") -> Tuple[dict, bool]:
+        """
+        analyze_text with the result cache, keyed by the normalized transcript (see
+        normalize_transcript): the same description spoken again costs no provider call.
+        Returns (raw blueprint, cached). Mock results are never cached.
+        """
+        if not self.live:
+            return (await self.analyze_text(transcript, style))[0], False
+        key = text_cache_key(transcript, style, self.provider, self.model, self.prompt_version)
+        cache = get_ai_cache()
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                return cached, True
+
+        async def fetch() -> dict:
+            raw, spec = await self.analyze_text(transcript, style)
+            if cache is not None and self._is_primary(spec):
+                await asyncio.to_thread(cache.put, key, raw)
+            return raw
+
+        raw_blueprint, _ = await get_single_flight().do(key, fetch)
+        return raw_blueprint, False
+
+    async def warm_text_prompt(self, style: str) -> None:
+        """
+        Get the text prompt ready before the transcript is: compiled, and registered as a
+        Gemini cached context for every Gemini provider. Meant to run while the recording
+        is transcribed; never raises.
+        """
+        prefix = _gemini_text_prompt(style, self.structured)
+        _get_blueprint_from_text_prompt(style, self.structured)
+        for spec in self.providers:
+            if spec.kind != "gemini":
+                continue
+            try:
+                await self._for_provider(spec)._gemini_contents(self._prompt_key("text", style), prefix, [], [])
+            except Exception as e:
+                logger.debug("warm_text_prompt failed", extra={"data": {"provider": spec.name, "error": str(e)}})
 
-        if self.provider == "gemini":
-            return await asyncio.to_thread(
-                self._analyze_text_gemini_sync,
-                transcript,
-                style,
-            )
+    async def _analyze_text_provider(self, transcript: str, style: str) -> dict:
+        if self.spec.kind == "mock":
+            return await self._mock_complete(style, len(transcript.encode("utf-8")))
+        if self.spec.kind == "gemini":
+            return await self._analyze_text_gemini(transcript, style)
 
         # OpenAI: text-only chat
-        system_prompt = "You are a blueprint extraction engine. Return ONLY valid JSON that matches the schema exactly."
-        user_prompt = _get_blueprint_from_text_prompt(style) + "\n\n---\nUser's description:\n" + transcript
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt},
-                    ],
-                    "max_tokens": 4096,
-                    "temperature": 0.2,
-                },
-                timeout=60.0,
-            )
-            response.raise_for_status()
-            data = response.json()
-            content = data["choices"][0]["message"]["content"]
-            return _extract_json_from_content(content)
+        user_prompt = _get_blueprint_from_text_prompt(style, self.structured) + "\n\n---\nUser's description:\n" + transcript
+
+        body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+            "max_tokens": 4096,
+            "temperature": 0.2,
+        }
+        if self.structured:
+            body["response_format"] = openai_response_format()
+        content = await self._openai_complete(body)
+        return _extract_json_from_content(content)
+
+    async def _mock_generate(self, style: str, payload_bytes: int = 0) -> str:
+        """
+        Local mock provider: the mock blueprint as text after the configured latency (+-20%)
+        plus ms_per_kb for each KB of request payload, failing at error_rate.
+        """
+        latency_ms = self.spec.latency_ms * random.uniform(0.8, 1.2) + self.spec.ms_per_kb * payload_bytes / 1024
+        await asyncio.sleep(latency_ms / 1000)
+        if random.random() < self.spec.error_rate:
+            raise ValueError(f"{self.spec.name}: injected error")
+        return json.dumps(self._get_mock_blueprint(style), indent=2)
+
+    async def _mock_complete(self, style: str, payload_bytes: int = 0) -> dict:
+        content = await self._mock_generate(style, payload_bytes)
+        get_response_ring().record(self.spec.kind, self.spec.model, content=content)
+        return _extract_json_from_content(content)
 
     def _get_mock_blueprint(self, style: str) -> dict:
         """Return a mock blueprint for testing."""
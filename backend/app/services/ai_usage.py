@@ -0,0 +1,78 @@
+"""
+Token usage and latency of AI provider calls, per provider and prompt mode.
+
+Providers report token counts with every response (Gemini `usageMetadata`, OpenAI
+`usage`, including how many prompt tokens were served from a cached prefix); they
+are summed here together with call latency so the prompt+examples mode and the
+structured output mode can be compared in /api/metrics.
+"""
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# Latencies kept for percentile reporting
+LATENCY_WINDOW = 1000
+
+
+class UsageStats:
+    def __init__(self):
+        self.calls = 0
+        self.calls_with_usage = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cached_prompt_tokens = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(
+        self,
+        latency: float,
+        prompt_tokens: Optional[int],
+        output_tokens: Optional[int],
+        cached_tokens: Optional[int] = None,
+    ) -> None:
+        self.calls += 1
+        self._latencies.append(latency)
+        if prompt_tokens is not None or output_tokens is not None:
+            self.calls_with_usage += 1
+            self.prompt_tokens += prompt_tokens or 0
+            self.output_tokens += output_tokens or 0
+            self.cached_prompt_tokens += cached_tokens or 0
+
+    def snapshot(self) -> dict:
+        times = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            return round(times[min(len(times) - 1, int(p * len(times)))] * 1000, 1) if times else 0.0
+
+        counted = self.calls_with_usage
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / counted, 1) if counted else None,
+            "avg_output_tokens": round(self.output_tokens / counted, 1) if counted else None,
+            "latency_ms_p50": percentile(0.50),
+            "latency_ms_p95": percentile(0.95),
+        }
+
+
+# Keyed by (provider, mode)
+_usage: Dict[Tuple[str, str], UsageStats] = {}
+
+
+def record_ai_usage(
+    provider: str,
+    mode: str,
+    latency: float,
+    prompt_tokens: Optional[int] = None,
+    output_tokens: Optional[int] = None,
+    cached_tokens: Optional[int] = None,
+) -> None:
+    stats = _usage.get((provider, mode))
+    if stats is None:
+        stats = _usage[(provider, mode)] = UsageStats()
+    stats.record(latency, prompt_tokens, output_tokens, cached_tokens)
+
+
+def ai_usage_metrics() -> dict:
+    return {f"{provider}/{mode}": stats.snapshot() for (provider, mode), stats in sorted(_usage.items())}
@@ -0,0 +1,266 @@
+"""
+Client-side block connectivity and support ordering.
+
+Computes the states the server would otherwise derive from neighbours (stair shapes,
+pane connections, door halves, lantern hanging) and orders attachment-dependent blocks
+after the blocks that support them, so nothing pops off or triggers extra shape updates.
+"""
+import copy
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from app.services.block_planner import BlockPlacement
+
+Pos = Tuple[int, int, int]
+
+DIRECTIONS: Dict[str, Pos] = {
+    "north": (0, 0, -1),
+    "south": (0, 0, 1),
+    "east": (1, 0, 0),
+    "west": (-1, 0, 0),
+}
+CLOCKWISE = {"north": "east", "east": "south", "south": "west", "west": "north"}
+COUNTER_CLOCKWISE = {v: k for k, v in CLOCKWISE.items()}
+OPPOSITE = {"north": "south", "south": "north", "east": "west", "west": "east"}
+AXIS = {"north": "z", "south": "z", "east": "x", "west": "x"}
+
+DOOR_DEFAULTS = {"facing": "north", "hinge": "left", "open": "false", "powered": "false"}
+
+# Blocks whose faces are never full, in addition to the suffix rules below
+_NON_FULL_BLOCKS = {"air", "cave_air", "lantern", "soul_lantern", "iron_bars", "flower_pot", "torch", "chain"}
+_NON_FULL_SUFFIXES = (
+    "_stairs", "_slab", "_door", "_trapdoor", "_pane", "_fence", "_fence_gate", "_wall",
+    "_button", "_pressure_plate", "_carpet", "_sign", "_torch", "_lantern",
+)
+# Full cubes that panes refuse to connect to
+_PANE_EXCEPTIONS_SUFFIXES = ("_leaves", "_shulker_box")
+_PANE_EXCEPTIONS = {"barrier", "pumpkin", "carved_pumpkin", "jack_o_lantern", "melon"}
+
+
+@lru_cache(maxsize=4096)
+def parse_block_state(block: str) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """Split 'name[k=v,...]' into (name, sorted property pairs)."""
+    if "[" not in block:
+        return block, ()
+    name, _, rest = block.partition("[")
+    props = []
+    for item in rest.rstrip("]").split(","):
+        if "=" in item:
+            k, _, v = item.partition("=")
+            props.append((k.strip(), v.strip()))
+    return name, tuple(sorted(props))
+
+
+def format_block_state(name: str, props: Dict[str, str]) -> str:
+    if not props:
+        return name
+    return f"{name}[{','.join(f'{k}={v}' for k, v in sorted(props.items()))}]"
+
+
+def is_door(name: str) -> bool:
+    return name.endswith("_door")
+
+
+def is_stairs(name: str) -> bool:
+    return name.endswith("_stairs")
+
+
+def is_pane(name: str) -> bool:
+    return name.endswith("_pane") or name == "iron_bars"
+
+
+def is_lantern(name: str) -> bool:
+    return name in ("lantern", "soul_lantern")
+
+
+def is_attachment(name: str) -> bool:
+    """Blocks that need a neighbour to survive or to take their final shape."""
+    return is_door(name) or is_pane(name) or is_stairs(name) or is_lantern(name)
+
+
+def is_full_block(name: str) -> bool:
+    return name not in _NON_FULL_BLOCKS and not name.endswith(_NON_FULL_SUFFIXES)
+
+
+def _offset(pos: Pos, direction: str) -> Pos:
+    dx, dy, dz = DIRECTIONS[direction]
+    return pos[0] + dx, pos[1] + dy, pos[2] + dz
+
+
+class _World:
+    """Final block states of a plan keyed by position."""
+
+    def __init__(self, placements: List["BlockPlacement"]):
+        self.blocks: Dict[Pos, Tuple[str, Dict[str, str]]] = {}
+        for p in placements:
+            name, props = parse_block_state(p.block_type)
+            self.blocks[(p.x, p.y, p.z)] = (name, dict(props))
+
+    def get(self, pos: Pos) -> Optional[Tuple[str, Dict[str, str]]]:
+        return self.blocks.get(pos)
+
+    def is_sturdy(self, pos: Pos, face: str) -> bool:
+        """Whether the block at pos has a full face pointing towards `face`."""
+        block = self.get(pos)
+        if block is None:
+            return False
+        name, props = block
+        if is_full_block(name):
+            return True
+        if name.endswith("_slab"):
+            slab_type = props.get("type", "bottom")
+            return slab_type == "double" or (face == "up" and slab_type == "top") or (face == "down" and slab_type == "bottom")
+        if is_stairs(name):
+            half = props.get("half", "bottom")
+            if face in ("up", "down"):
+                return (face == "down") == (half == "bottom")
+            return props.get("facing") == face and props.get("shape", "straight") == "straight"
+        return False
+
+    def stair_shape(self, pos: Pos, props: Dict[str, str]) -> str:
+        """Vanilla stair shape rule: outer corner from the block behind, inner from the block in front."""
+        facing = props.get("facing", "north")
+        half = props.get("half", "bottom")
+        behind = self.get(_offset(pos, facing))
+        if behind and is_stairs(behind[0]) and behind[1].get("half", "bottom") == half:
+            other = behind[1].get("facing", "north")
+            if AXIS[other] != AXIS[facing] and self._can_take_shape(pos, facing, half, OPPOSITE[other]):
+                return "outer_left" if other == COUNTER_CLOCKWISE[facing] else "outer_right"
+        front = self.get(_offset(pos, OPPOSITE[facing]))
+        if front and is_stairs(front[0]) and front[1].get("half", "bottom") == half:
+            other = front[1].get("facing", "north")
+            if AXIS[other] != AXIS[facing] and self._can_take_shape(pos, facing, half, other):
+                return "inner_left" if other == COUNTER_CLOCKWISE[facing] else "inner_right"
+        return "straight"
+
+    def _can_take_shape(self, pos: Pos, facing: str, half: str, side: str) -> bool:
+        neighbour = self.get(_offset(pos, side))
+        if not neighbour or not is_stairs(neighbour[0]):
+            return True
+        return neighbour[1].get("facing") != facing or neighbour[1].get("half", "bottom") != half
+
+    def pane_attaches(self, pos: Pos, direction: str) -> bool:
+        neighbour = self.get(_offset(pos, direction))
+        if neighbour is None:
+            return False
+        name = neighbour[0]
+        if is_pane(name) or name.endswith("_wall"):
+            return True
+        if name in _PANE_EXCEPTIONS or name.endswith(_PANE_EXCEPTIONS_SUFFIXES):
+            return False
+        return self.is_sturdy(_offset(pos, direction), OPPOSITE[direction])
+
+
+def connect_states(placements: List["BlockPlacement"]) -> List["BlockPlacement"]:
+    """
+    Return placements with neighbour-dependent states filled in: stair shapes, pane
+    connections, complete door states on both halves and lantern hanging.
+    Expects final placements (one per position). Changed placements are copied, not mutated.
+    """
+    world = _World(placements)
+    # Stair shapes depend only on neighbour facing/half, so they are computed from the
+    # original states and applied afterwards.
+    resolved: Dict[Pos, str] = {}
+    for pos, (name, props) in world.blocks.items():
+        if is_stairs(name):
+            resolved[pos] = format_block_state(name, {**props, "shape": world.stair_shape(pos, props)})
+        elif is_door(name):
+            half = props.get("half", "lower")
+            lower_pos = pos if half == "lower" else (pos[0], pos[1] - 1, pos[2])
+            lower = world.get(lower_pos)
+            # Both halves must agree, or the lower half copies the upper half's state
+            base = dict(DOOR_DEFAULTS)
+            if lower and is_door(lower[0]):
+                base.update({k: v for k, v in lower[1].items() if k != "half"})
+            resolved[pos] = format_block_state(name, {**base, "half": half})
+    for pos, (name, props) in world.blocks.items():
+        if is_pane(name):
+            sides = {d: "true" if world.pane_attaches(pos, d) else "false" for d in DIRECTIONS}
+            resolved[pos] = format_block_state(name, {**props, **sides})
+        elif is_lantern(name):
+            below = (pos[0], pos[1] - 1, pos[2])
+            above = (pos[0], pos[1] + 1, pos[2])
+            hanging = props.get("hanging", "false")
+            if world.is_sturdy(below, "up"):
+                hanging = "false"
+            elif world.is_sturdy(above, "down"):
+                hanging = "true"
+            resolved[pos] = format_block_state(name, {**props, "hanging": hanging})
+
+    out: List["BlockPlacement"] = []
+    for p in placements:
+        block = resolved.get((p.x, p.y, p.z))
+        if block is not None and block != p.block_type:
+            p = copy.copy(p)
+            p.block_type = block
+        out.append(p)
+    return out
+
+
+def _supports(p: "BlockPlacement") -> List[Pos]:
+    """Positions a placement must not be sent before."""
+    name, props = parse_block_state(p.block_type)
+    pos = (p.x, p.y, p.z)
+    if is_door(name):
+        # Lower half rests on the block below; the upper half on the lower half
+        return [(p.x, p.y - 1, p.z)]
+    if is_lantern(name):
+        return [(p.x, p.y + 1, p.z) if dict(props).get("hanging") == "true" else (p.x, p.y - 1, p.z)]
+    if is_pane(name):
+        return [_offset(pos, d) for d in DIRECTIONS]
+    return []
+
+
+def order_by_support(placements: List["BlockPlacement"]) -> List["BlockPlacement"]:
+    """
+    Stable topological ordering: keep the given order, but hold back each attachment-dependent
+    block until the solid blocks it rests on or connects to have been sent.
+    Door halves are emitted back to back.
+    """
+    present: Dict[Pos, "BlockPlacement"] = {(p.x, p.y, p.z): p for p in placements}
+    waiting: Dict[Pos, List["BlockPlacement"]] = {}
+    pending: Dict[int, int] = {}
+    emitted: set = set()
+    out: List["BlockPlacement"] = []
+
+    def emit(p: "BlockPlacement") -> None:
+        pos = (p.x, p.y, p.z)
+        if pos in emitted:
+            return
+        emitted.add(pos)
+        out.append(p)
+        name, props = parse_block_state(p.block_type)
+        if is_door(name) and dict(props).get("half") == "lower":
+            upper = present.get((p.x, p.y + 1, p.z))
+            if upper is not None and is_door(parse_block_state(upper.block_type)[0]):
+                emit(upper)
+        for dependant in waiting.pop(pos, []):
+            pending[id(dependant)] -= 1
+            if pending[id(dependant)] == 0:
+                emit(dependant)
+
+    for p in placements:
+        name = parse_block_state(p.block_type)[0]
+        deps = []
+        if is_attachment(name):
+            # Only wait for supports in this plan and in the same or an earlier phase.
+            # Attachments never wait on each other (except door halves), so there are no cycles.
+            for dep in _supports(p):
+                if dep in emitted or dep not in present or present[dep].phase > p.phase:
+                    continue
+                dep_name = parse_block_state(present[dep].block_type)[0]
+                if dep_name == "air" or (is_attachment(dep_name) and not (is_door(name) and is_door(dep_name))):
+                    continue
+                deps.append(dep)
+        if deps:
+            pending[id(p)] = len(deps)
+            for dep in deps:
+                waiting.setdefault(dep, []).append(p)
+        else:
+            emit(p)
+    # Anything still waiting depends on a position that was never emitted; send it last.
+    for p in placements:
+        if (p.x, p.y, p.z) not in emitted:
+            emit(p)
+    return out
@@ -1,14 +1,26 @@
-from typing import List, Dict, Tuple, Generator
-from app.models import Blueprint
+from typing import List, Dict, Optional, Tuple, Generator
+from app.models import Blueprint, Origin
 from app.config import get_settings
+from app.services.block_registry import get_block_registry
+from app.services.validator import repair_materials
+from app.services.command_scheduler import (
+    PHASE_CLEAR,
+    PHASE_STRUCTURE,
+    PHASE_FIXTURES,
+    PHASE_DECOR,
+    CLEAR_PREFIX,
+    schedule_placements,
+    order_by_block_type,
+)
 
 
 class BlockPlacement:
-    def __init__(self, x: int, y: int, z: int, block_type: str):
+    def __init__(self, x: int, y: int, z: int, block_type: str, phase: int = PHASE_STRUCTURE):
         self.x = x
         self.y = y
         self.z = z
         self.block_type = block_type
+        self.phase = phase
     
     def __repr__(self):
         return f"Block({self.x}, {self.y}, {self.z}, {self.block_type})"
@@ -17,29 +29,27 @@ class BlockPlacement:
 class BlockPlanner:
     def __init__(self):
         self.settings = get_settings()
+        self.blocks = get_block_registry()
         self.placements: List[BlockPlacement] = []
+        self.warnings: List[str] = []
     
-    def generate_placements(self, blueprint: Blueprint) -> List[BlockPlacement]:
-        """Generate all block placements from blueprint (single or multi-segment)."""
+    def generate_placements(self, blueprint: Blueprint, origin: Optional[Origin] = None) -> List[BlockPlacement]:
+        """Generate all block placements from blueprint (single or multi-segment) at origin (default: settings)."""
         self.placements = []
         style = blueprint.style
-        materials = style.materials
+        # Repair unknown block ids at plan time instead of failing once per command on the server
+        materials = style.materials.model_copy()
+        self.warnings = repair_materials(materials, style.theme)
         segments = blueprint.get_segments()
 
-        ox = self.settings.build_origin_x
-        oy = self.settings.build_origin_y
-        oz = self.settings.build_origin_z
-
-        total_width = sum(s.width_blocks for s in segments)
-        max_height = max(s.wall_height_blocks for s in segments)
-        segments_with_roof = [s for s in segments if s.roof]
-        max_roof = max((s.roof.height_blocks for s in segments_with_roof), default=0)
-        max_overhang = max((s.roof.overhang for s in segments_with_roof), default=0)
-        depth = segments[0].depth_blocks if segments else 10
+        if origin is not None:
+            ox, oy, oz = origin.x, origin.y, origin.z
+        else:
+            ox = self.settings.build_origin_x
+            oy = self.settings.build_origin_y
+            oz = self.settings.build_origin_z
 
-        self._add_clear_command(
-            ox, oy, oz, total_width, max_height, max_roof, depth, max_overhang
-        )
+        self._add_clear_command(*get_build_bounds(blueprint, ox, oy, oz))
 
         # Place segments in reverse order so image-left builds on build-left (AI returns left-to-right as first-to-last)
         segment_offset_x = 0
@@ -77,14 +87,15 @@ class BlockPlanner:
             segment_offset_x += W
         return self.placements
     
-    def _add_clear_command(self, ox: int, oy: int, oz: int, W: int, H: int, R: int, D: int, overhang: int):
+    def _add_clear_command(self, x1: int, y1: int, z1: int, x2: int, y2: int, z2: int):
         """Add clear area command."""
         # We'll use a fill command for clearing
         self.placements.append(BlockPlacement(
-            x=ox - overhang - 1,
-            y=oy,
-            z=oz - overhang - 1,
-            block_type=f"CLEAR:{ox + W + overhang + 1},{oy + H + R + 5},{oz + D + overhang + 1}"
+            x=x1,
+            y=y1,
+            z=z1,
+            block_type=f"{CLEAR_PREFIX}{x2},{y2},{z2}",
+            phase=PHASE_CLEAR
         ))
     
     def _add_floor(self, ox: int, oy: int, oz: int, W: int, D: int, material: str):
@@ -177,14 +188,16 @@ class BlockPlanner:
             x=ox + left_x,
             y=oy + 1,
             z=oz,
-            block_type=f"{material}[half=lower]"
+            block_type=self.blocks.state(material, half="lower").rendered,
+            phase=PHASE_FIXTURES
         ))
         if opening.h > 1:
             self.placements.append(BlockPlacement(
                 x=ox + left_x,
                 y=oy + 2,
                 z=oz,
-                block_type=f"{material}[half=upper]"
+                block_type=self.blocks.state(material, half="upper").rendered,
+                phase=PHASE_FIXTURES
             ))
 
     def _place_window(self, ox: int, oy: int, oz: int, segment_width: int, opening, material: str):
@@ -196,9 +209,21 @@ class BlockPlanner:
                     x=ox + left_x + dx,
                     y=oy + 1 + opening.y + dy,
                     z=oz,
-                    block_type=material
+                    block_type=material,
+                    phase=PHASE_FIXTURES
                 ))
     
+    def _roof_edge_blocks(self, material: str) -> Dict[str, str]:
+        """Rendered roof edge block per facing: stairs for stair materials, bottom slabs for slabs."""
+        kind = self.blocks.kind(material)
+        if kind == "stairs":
+            return {
+                facing: self.blocks.state(material, facing=facing, half="bottom", shape="straight").rendered
+                for facing in ("north", "south", "east", "west")
+            }
+        edge = self.blocks.state(material, type="bottom").rendered if kind == "slab" else material
+        return {facing: edge for facing in ("north", "south", "east", "west")}
+
     def _add_gable_roof(self, ox: int, oy: int, oz: int, W: int, H: int, D: int, R: int, overhang: int, material: str, mirror: bool = False):
         """Add a gable roof with correctly oriented stair blocks. Ensures enough layers so the roof comes to a tip (stairs at peak)."""
         span = W + 2 * overhang
@@ -207,6 +232,10 @@ class BlockPlanner:
         R_effective = min(max(R, r_min), r_max)
         x_right = ox + W - 1 + overhang
         x_left = ox - overhang
+        edge = self._roof_edge_blocks(material)
+        fill_block = self.blocks.full_block_for(material)
+        # Mirroring swaps east- and west-facing stairs
+        east, west = ("west", "east") if mirror else ("east", "west")
 
         for i in range(R_effective):
             y = oy + H + 1 + i
@@ -225,30 +254,17 @@ class BlockPlanner:
                     on_south = (z == z2)
 
                     if on_west:
-                        block = f"{material}[facing=east,half=bottom,shape=straight]"
+                        block = edge[east]
                     elif on_east:
-                        block = f"{material}[facing=west,half=bottom,shape=straight]"
+                        block = edge[west]
                     elif on_north:
-                        block = f"{material}[facing=north,half=bottom,shape=straight]"
+                        block = edge["north"]
                     elif on_south:
-                        block = f"{material}[facing=south,half=bottom,shape=straight]"
+                        block = edge["south"]
                     else:
-                        SOLID_OVERRIDES = {
-                            "spruce_stairs": "spruce_planks", "oak_stairs": "oak_planks",
-                            "stone_brick_stairs": "stone_bricks", "purpur_stairs": "purpur_block",
-                            "smooth_stone_slab": "smooth_stone",
-                        }
-                        fill_block = SOLID_OVERRIDES.get(material, material.replace("_stairs", "_planks"))
                         block = fill_block
 
-                    if mirror:
-                        x_out = x_left + x_right - x
-                        if "facing=east" in block:
-                            block = block.replace("facing=east", "facing=west")
-                        elif "facing=west" in block:
-                            block = block.replace("facing=west", "facing=east")
-                    else:
-                        x_out = x
+                    x_out = x_left + x_right - x if mirror else x
                     self.placements.append(BlockPlacement(x=x_out, y=y, z=z, block_type=block))
     
     def _add_decorations(self, ox: int, oy: int, oz: int, W: int, H: int, D: int, decor: List[str]):
@@ -260,13 +276,15 @@ class BlockPlanner:
                 x=ox - 1,
                 y=oy + 2,
                 z=oz - 1,
-                block_type="lantern[hanging=false]"
+                block_type="lantern[hanging=false]",
+                phase=PHASE_DECOR
             ))
             self.placements.append(BlockPlacement(
                 x=ox + W,
                 y=oy + 2,
                 z=oz - 1,
-                block_type="lantern[hanging=false]"
+                block_type="lantern[hanging=false]",
+                phase=PHASE_DECOR
             ))
         
         # Add leaves around the building
@@ -279,33 +297,18 @@ class BlockPlanner:
                     x=lx,
                     y=oy + 1,
                     z=lz,
-                    block_type="oak_leaves[persistent=true]"
+                    block_type="oak_leaves[persistent=true]",
+                    phase=PHASE_DECOR
                 ))
     
-    def generate_commands(self, placements: List[BlockPlacement]) -> Generator[str, None, None]:
-        """Generate Minecraft commands from placements."""
-        # Group placements by block type for optimization
-        by_type: Dict[str, List[BlockPlacement]] = {}
-        clear_command = None
-        
-        for p in placements:
-            if p.block_type.startswith("CLEAR:"):
-                clear_command = p.block_type
-                continue
-            
-            if p.block_type not in by_type:
-                by_type[p.block_type] = []
-            by_type[p.block_type].append(p)
-        
-        # Yield clear command first
-        if clear_command:
-            coords = clear_command.replace("CLEAR:", "").split(",")
-            yield f"/fill {placements[0].x} {placements[0].y} {placements[0].z} {coords[0]} {coords[1]} {coords[2]} air"
-        
-        # Yield setblock commands
-        for block_type, blocks in by_type.items():
-            for block in blocks:
-                yield f"/setblock {block.x} {block.y} {block.z} {block_type}"
+    def generate_commands(self, placements: List[BlockPlacement], schedule: bool = True) -> Generator[str, None, None]:
+        """
+        Generate Minecraft commands from placements.
+        With schedule=True commands are ordered chunk by chunk and bottom-up within each phase
+        (see command_scheduler); otherwise they are grouped by block type.
+        """
+        ordered = schedule_placements(placements) if schedule else order_by_block_type(placements)
+        return render_commands(ordered)
 
     def _add_shed_roof(self, ox: int, oy: int, oz: int, W: int, H: int, D: int, R: int, overhang: int, material: str, wall_material: str, mirror: bool = False):
         """
@@ -316,17 +319,12 @@ class BlockPlanner:
 
         span = W + 2 * overhang
         R = max(R, (span + 1) // 2)  # Ensure enough layers to reach a tip  
-        slab_material = material.replace("_stairs", "_slab")
-        SOLID_OVERRIDES = {
-            "spruce_stairs":      "spruce_slab[type=double]",  # matches spruce stair color
-            "oak_stairs":         "oak_slab[type=double]",
-            "dark_oak_stairs":    "dark_oak_slab[type=double]",
-            "stone_brick_stairs": "stone_brick_slab[type=double]",
-            "purpur_stairs":      "purpur_slab[type=double]",
-            "smooth_stone_slab":  "smooth_stone",
-        }
-        solid_material = material.replace("_stairs", "_slab[type=double]")  # default fallback
-        solid_material = SOLID_OVERRIDES.get(material, solid_material)
+        slab_material = self.blocks.slab_for(material)
+        slab_block = self.blocks.state(slab_material, type="bottom").rendered if slab_material else material
+        if self.blocks.kind(material) == "stairs" and slab_material:
+            solid_material = self.blocks.state(slab_material, type="double").rendered  # matches the stair colour
+        else:
+            solid_material = self.blocks.full_block_for(material)
 
         z1 = oz - overhang
         z2 = oz + D - 1 + overhang
@@ -345,7 +343,7 @@ class BlockPlanner:
             for z in range(z1, z2 + 1):
                 self.placements.append(BlockPlacement(
                     x=x_slab, y=y, z=z,
-                    block_type=f"{slab_material}[type=bottom]"
+                    block_type=slab_block
                 ))
 
             if mirror:
@@ -375,6 +373,35 @@ class BlockPlanner:
                             block_type=solid_material  
                         ))
 
+def render_commands(placements: List[BlockPlacement]) -> Generator[str, None, None]:
+    """Turn already ordered placements into /fill and /setblock commands."""
+    for p in placements:
+        if p.block_type.startswith(CLEAR_PREFIX):
+            coords = p.block_type[len(CLEAR_PREFIX):].split(",")
+            yield f"/fill {p.x} {p.y} {p.z} {coords[0]} {coords[1]} {coords[2]} air"
+        else:
+            yield f"/setblock {p.x} {p.y} {p.z} {p.block_type}"
+
+
+def get_build_bounds(blueprint: Blueprint, ox: int, oy: int, oz: int) -> Tuple[int, int, int, int, int, int]:
+    """Return (x1, y1, z1, x2, y2, z2) of the volume cleared before building at (ox, oy, oz)."""
+    segments = blueprint.get_segments()
+    total_width = sum(s.width_blocks for s in segments)
+    max_height = max(s.wall_height_blocks for s in segments)
+    segments_with_roof = [s for s in segments if s.roof]
+    max_roof = max((s.roof.height_blocks for s in segments_with_roof), default=0)
+    max_overhang = max((s.roof.overhang for s in segments_with_roof), default=0)
+    depth = segments[0].depth_blocks if segments else 10
+    return (
+        ox - max_overhang - 1,
+        oy,
+        oz - max_overhang - 1,
+        ox + total_width + max_overhang + 1,
+        oy + max_height + max_roof + 5,
+        oz + depth + max_overhang + 1,
+    )
+
+
 def get_block_count(blueprint) -> int:
     """Estimate total block count for a blueprint (single or multi-segment)."""
     segments = blueprint.get_segments()
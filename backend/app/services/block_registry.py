@@ -0,0 +1,141 @@
+"""Vanilla block/state registry: validation, interned block states and material fallbacks."""
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "vanilla_blocks.json")
+
+
+class BlockState:
+    """An immutable, interned block state. Compare with `is`; `rendered` is the command form."""
+
+    __slots__ = ("block", "properties", "kind", "rendered")
+
+    def __init__(self, block: str, properties: Tuple[Tuple[str, str], ...], kind: str):
+        self.block = block
+        self.properties = properties
+        self.kind = kind
+        if properties:
+            self.rendered = f"{block}[{','.join(f'{k}={v}' for k, v in properties)}]"
+        else:
+            self.rendered = block
+
+    def __repr__(self):
+        return f"BlockState({self.rendered})"
+
+
+class BlockStateRegistry:
+    def __init__(self, table: dict):
+        self.version: str = table.get("version", "")
+        self._properties: Dict[str, Dict[str, frozenset]] = {
+            kind: {prop: frozenset(values) for prop, values in props.items()}
+            for kind, props in table["properties"].items()
+        }
+        self._blocks: Dict[str, str] = dict(table["blocks"])
+        # Family lookups: stairs/slab/full block -> the family it belongs to
+        self._families: Dict[str, Dict[str, str]] = {}
+        for family in table.get("families", []):
+            for member in family.values():
+                self._families.setdefault(member, family)
+        self._interned: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], BlockState] = {}
+        self._parsed: Dict[str, BlockState] = {}
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_TABLE_PATH) -> "BlockStateRegistry":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def normalize_id(name: str) -> str:
+        """Lowercase, strip the minecraft: namespace and turn spaces into underscores."""
+        name = name.strip().lower().replace(" ", "_")
+        if name.startswith("minecraft:"):
+            name = name[len("minecraft:"):]
+        return name
+
+    def is_valid_block(self, name: str) -> bool:
+        return name in self._blocks
+
+    def kind(self, name: str) -> Optional[str]:
+        """Property set name of a block ('stairs', 'slab', 'door', ...), '' for plain blocks, None if unknown."""
+        return self._blocks.get(name)
+
+    def state(self, block: str, **properties: str) -> BlockState:
+        """Return the interned state for block + properties. Raises ValueError if invalid."""
+        props = tuple(sorted((k, str(v)) for k, v in properties.items()))
+        key = (block, props)
+        cached = self._interned.get(key)
+        if cached is not None:
+            return cached
+        kind = self._blocks.get(block)
+        if kind is None:
+            raise ValueError(f"Unknown block id: {block}")
+        allowed = self._properties.get(kind, {})
+        for prop, value in props:
+            values = allowed.get(prop)
+            if values is None:
+                raise ValueError(f"Block {block} has no property '{prop}'")
+            if value not in values:
+                raise ValueError(f"Invalid value '{value}' for {block}[{prop}]")
+        state = BlockState(block, props, kind)
+        self._interned[key] = state
+        return state
+
+    def parse(self, text: str) -> BlockState:
+        """Parse 'name[k=v,...]' (optionally namespaced) into an interned state. Raises ValueError if invalid."""
+        cached = self._parsed.get(text)
+        if cached is not None:
+            return cached
+        name, _, rest = text.partition("[")
+        properties: Dict[str, str] = {}
+        if rest:
+            for item in rest.rstrip("]").split(","):
+                if item.strip():
+                    k, sep, v = item.partition("=")
+                    if not sep:
+                        raise ValueError(f"Malformed block state: {text}")
+                    properties[k.strip()] = v.strip()
+        state = self.state(self.normalize_id(name), **properties)
+        self._parsed[text] = state
+        return state
+
+    def is_valid(self, text: str) -> bool:
+        try:
+            self.parse(text)
+            return True
+        except ValueError:
+            return False
+
+    def slab_for(self, name: str) -> Optional[str]:
+        """Slab block of the material's family, if any."""
+        if self.kind(name) == "slab":
+            return name
+        return self._families.get(name, {}).get("slab")
+
+    def full_block_for(self, name: str) -> str:
+        """
+        Rendered full block matching a material: stairs -> planks/base block -> double slab.
+        Returns the name unchanged when it already is a full block or has no family.
+        """
+        kind = self.kind(name)
+        if kind not in ("stairs", "slab"):
+            return name
+        family = self._families.get(name, {})
+        full = family.get("full")
+        if full and self.is_valid_block(full):
+            return full
+        slab = family.get("slab")
+        if slab and self.is_valid_block(slab):
+            return self.state(slab, type="double").rendered
+        return name
+
+
+# Singleton instance
+_block_registry: Optional[BlockStateRegistry] = None
+
+
+def get_block_registry() -> BlockStateRegistry:
+    global _block_registry
+    if _block_registry is None:
+        _block_registry = BlockStateRegistry.load()
+    return _block_registry
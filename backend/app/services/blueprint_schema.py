@@ -0,0 +1,91 @@
+"""
+Provider response schemas derived from the Blueprint model (structured output mode).
+
+The Pydantic JSON schema is rewritten into each provider's dialect: Gemini takes an
+OpenAPI subset (no $ref, `nullable` instead of a union with null, upper-case types);
+OpenAI strict json_schema needs every property listed as required and no additional
+properties. Fields with a non-null default stay non-nullable, so the model has to
+fill them in; fields whose default is None remain nullable.
+"""
+from functools import lru_cache
+from typing import Any, Dict
+
+from app.models import Blueprint
+
+_KEPT_KEYWORDS = ("enum", "minimum", "maximum", "description")
+
+
+def _resolve(node: Any, defs: Dict[str, dict]) -> Any:
+    """Inline every $ref and drop titles/defaults."""
+    if isinstance(node, list):
+        return [_resolve(item, defs) for item in node]
+    if not isinstance(node, dict):
+        return node
+    if "$ref" in node:
+        return _resolve(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+    return {
+        key: _resolve(value, defs)
+        for key, value in node.items()
+        if key not in ("$defs", "title", "default")
+    }
+
+
+@lru_cache()
+def blueprint_json_schema() -> dict:
+    """The Blueprint JSON schema with all definitions inlined."""
+    schema = Blueprint.model_json_schema()
+    return _resolve(schema, schema.get("$defs", {}))
+
+
+def _to_gemini(node: dict) -> dict:
+    if "anyOf" in node:
+        options = [option for option in node["anyOf"] if option.get("type") != "null"]
+        out = _to_gemini(options[0])
+        if len(options) < len(node["anyOf"]):
+            out["nullable"] = True
+        return out
+    if "const" in node:
+        return {"type": "STRING", "enum": [node["const"]]}
+    out = {"type": node["type"].upper()}
+    out.update({key: node[key] for key in _KEPT_KEYWORDS if key in node})
+    if node["type"] == "object":
+        properties = node.get("properties", {})
+        out["properties"] = {name: _to_gemini(prop) for name, prop in properties.items()}
+        out["propertyOrdering"] = list(properties)
+        if node.get("required"):
+            out["required"] = list(node["required"])
+    elif node["type"] == "array":
+        out["items"] = _to_gemini(node["items"])
+    return out
+
+
+def _to_openai(node: dict) -> dict:
+    if "anyOf" in node:
+        return {"anyOf": [_to_openai(option) for option in node["anyOf"]]}
+    if "const" in node:
+        return {"type": "string", "enum": [node["const"]]}
+    out = {"type": node["type"]}
+    out.update({key: node[key] for key in _KEPT_KEYWORDS if key in node})
+    if node["type"] == "object":
+        properties = node.get("properties", {})
+        out["properties"] = {name: _to_openai(prop) for name, prop in properties.items()}
+        out["required"] = list(properties)
+        out["additionalProperties"] = False
+    elif node["type"] == "array":
+        out["items"] = _to_openai(node["items"])
+    return out
+
+
+@lru_cache()
+def gemini_response_schema() -> dict:
+    """generationConfig.responseSchema for Gemini."""
+    return _to_gemini(blueprint_json_schema())
+
+
+@lru_cache()
+def openai_response_format() -> dict:
+    """Chat completions response_format (strict json_schema) for OpenAI."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "blueprint", "strict": True, "schema": _to_openai(blueprint_json_schema())},
+    }
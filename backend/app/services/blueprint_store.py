@@ -0,0 +1,171 @@
+"""
+Persistent store of validated blueprints, keyed by their canonical content hash.
+
+A blueprint's id is the SHA-256 of its canonical JSON: the full model dump (defaults
+filled in) with sorted keys and no whitespace, so the same blueprint always gets the
+same id however the AI or the client spelled it. Entries hold that canonical JSON in a
+single SQLite file (WAL), shared by all workers; re-fetching one returns the stored text
+as is. Builds can reference a blueprint by id instead of posting it back, and plans,
+exports and diffs key off the id instead of re-hashing the payload. Since an id names
+its content, an entry never changes; the least recently used ones are evicted above a
+size cap.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.config import get_settings
+from app.models import Blueprint
+
+# Bumped if the canonical form changes (new ids for the same blueprints)
+CANONICAL_VERSION = 1
+
+
+def canonical_json(blueprint: Blueprint) -> str:
+    """The canonical JSON text of a blueprint."""
+    return json.dumps(blueprint.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+
+
+def blueprint_id(canonical: str) -> str:
+    """Stable id of a blueprint from its canonical JSON."""
+    parts = ["blueprint", str(CANONICAL_VERSION), canonical]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+class BlueprintStore:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blueprints ("
+                " id TEXT PRIMARY KEY, created_at REAL, last_access REAL,"
+                " size_bytes INTEGER, source TEXT, segments INTEGER, body TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS blueprints_created_at ON blueprints (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS blueprints_last_access ON blueprints (last_access)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def put(self, blueprint: Blueprint, source: str = "") -> str:
+        """Store a blueprint (a no-op if it is already stored) and return its id."""
+        body = canonical_json(blueprint)
+        key = blueprint_id(body)
+        now = time.time()
+        with self._connect() as conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO blueprints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, now, now, len(body.encode("utf-8")), source, len(blueprint.get_segments()), body),
+            ).rowcount
+            if not inserted:
+                conn.execute("UPDATE blueprints SET last_access = ? WHERE id = ?", (now, key))
+        if inserted:
+            self.evict()
+        return key
+
+    def get_json(self, key: str) -> Optional[str]:
+        """The canonical JSON of a stored blueprint, or None if it is not stored."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT body FROM blueprints WHERE id = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE blueprints SET last_access = ? WHERE id = ?", (time.time(), key))
+        return row[0]
+
+    def has(self, key: str) -> bool:
+        """Whether a blueprint is stored (without reading it)."""
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM blueprints WHERE id = ?", (key,)).fetchone() is not None
+
+    def get(self, key: str) -> Optional[Blueprint]:
+        """A stored blueprint, or None if it is not stored."""
+        body = self.get_json(key)
+        if body is None:
+            return None
+        return Blueprint.model_validate_json(body)
+
+    def list(self, limit: int = 50, offset: int = 0) -> dict:
+        """One page of stored blueprints, newest first, plus the total count."""
+        with self._connect() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM blueprints").fetchone()[0]
+            rows = conn.execute(
+                "SELECT id, created_at, last_access, size_bytes, source, segments FROM blueprints"
+                " ORDER BY created_at DESC, id LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return {
+            "items": [
+                {
+                    "id": r[0],
+                    "created_at": r[1],
+                    "last_access": r[2],
+                    "size_bytes": r[3],
+                    "source": r[4],
+                    "segments": r[5],
+                }
+                for r in rows
+            ],
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "next_offset": offset + len(rows) if offset + len(rows) < total else None,
+        }
+
+    def evict(self) -> int:
+        """Delete least recently used blueprints until the store fits max_bytes."""
+        removed = 0
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM blueprints").fetchone()[0]
+                if total > self.max_bytes:
+                    for key, size in conn.execute(
+                        "SELECT id, size_bytes FROM blueprints ORDER BY last_access ASC"
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute("DELETE FROM blueprints WHERE id = ?", (key,))
+                        total -= size
+                        removed += 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return removed
+
+
+# Singleton instance
+_blueprint_store: Optional[BlueprintStore] = None
+
+
+def get_blueprint_store() -> Optional[BlueprintStore]:
+    """The shared store, or None when it is disabled."""
+    global _blueprint_store
+    settings = get_settings()
+    if not settings.blueprint_store_enabled:
+        return None
+    if _blueprint_store is None:
+        _blueprint_store = BlueprintStore(settings.blueprint_store_path, settings.blueprint_store_max_bytes)
+    return _blueprint_store
+
+
+def store_blueprint(blueprint: Blueprint, source: str) -> Optional[str]:
+    """Store a blueprint if the store is enabled; returns its id (None when disabled)."""
+    store = get_blueprint_store()
+    if store is None:
+        return None
+    return store.put(blueprint, source)
@@ -0,0 +1,170 @@
+"""Chunk- and layer-ordered scheduling of block placements for RCON builds."""
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
+
+from app.services.block_connectivity import connect_states, order_by_support
+
+if TYPE_CHECKING:
+    from app.services.block_planner import BlockPlacement
+
+# Build phases. Every placement of a phase is sent before any placement of the next one.
+PHASE_CLEAR = 0
+PHASE_STRUCTURE = 1  # floor, walls, carved openings, roof
+PHASE_FIXTURES = 2   # doors and windows set into the structure
+PHASE_DECOR = 3      # lanterns, leaves and other loose decoration
+
+CLEAR_PREFIX = "CLEAR:"
+
+# /forceload refuses requests covering more than 256 chunks at once.
+MAX_FORCELOAD_CHUNKS = 256
+
+# Server cost model (milliseconds of tick time), used to compare command orderings.
+COST_SETBLOCK_MS = 0.05
+COST_CHUNK_LOAD_MS = 2.5
+COST_RELIGHT_MS = 0.4
+HOT_CHUNK_CAPACITY = 4
+
+
+def is_clear(p: "BlockPlacement") -> bool:
+    return p.block_type.startswith(CLEAR_PREFIX)
+
+
+def chunk_of(x: int, z: int) -> Tuple[int, int]:
+    """Chunk coordinates containing block (x, z)."""
+    return x >> 4, z >> 4
+
+
+def resolve_final_placements(placements: Iterable["BlockPlacement"]) -> List["BlockPlacement"]:
+    """
+    Drop placements that a later placement overwrites at the same position.
+    Survivors keep the relative order of their last write, so the built result is unchanged.
+    """
+    latest: "OrderedDict[Tuple[int, int, int], BlockPlacement]" = OrderedDict()
+    for p in placements:
+        if is_clear(p):
+            continue
+        key = (p.x, p.y, p.z)
+        if key in latest:
+            del latest[key]
+        latest[key] = p
+    return list(latest.values())
+
+
+def _schedule_key(p: "BlockPlacement") -> Tuple[int, int, int, int, int, int]:
+    cx, cz = chunk_of(p.x, p.z)
+    # Serpentine walk over chunk rows so consecutive chunks are always neighbours
+    cz_walk = cz if cx % 2 == 0 else -cz
+    return (p.phase, cx, cz_walk, p.y, p.z, p.x)
+
+
+def schedule_placements(placements: List["BlockPlacement"], resolved: bool = False) -> List["BlockPlacement"]:
+    """
+    Order placements for sending: clear commands first, then each phase chunk by chunk,
+    bottom layer first inside every chunk. Neighbour-dependent states are resolved up front
+    (skipped when resolved=True, i.e. placements are already final and connected) and
+    attachments are held back until their supports have been sent.
+    """
+    clears = [p for p in placements if is_clear(p)]
+    if resolved:
+        final = [p for p in placements if not is_clear(p)]
+    else:
+        final = connect_states(resolve_final_placements(placements))
+    return clears + order_by_support(sorted(final, key=_schedule_key))
+
+
+def order_by_block_type(placements: List["BlockPlacement"]) -> List["BlockPlacement"]:
+    """Legacy ordering: clear commands, then placements grouped by block type in insertion order."""
+    clears: List["BlockPlacement"] = []
+    by_type: Dict[str, List["BlockPlacement"]] = {}
+    for p in placements:
+        if is_clear(p):
+            clears.append(p)
+        else:
+            by_type.setdefault(p.block_type, []).append(p)
+    return clears + [p for blocks in by_type.values() for p in blocks]
+
+
+def get_footprint(placements: List["BlockPlacement"]) -> Tuple[int, int, int, int]:
+    """Return (min_x, min_z, max_x, max_z) covered by placements, including clear volumes."""
+    xs: List[int] = []
+    zs: List[int] = []
+    for p in placements:
+        xs.append(p.x)
+        zs.append(p.z)
+        if is_clear(p):
+            x2, _, z2 = (int(c) for c in p.block_type[len(CLEAR_PREFIX):].split(","))
+            xs.append(x2)
+            zs.append(z2)
+    if not xs:
+        return 0, 0, 0, 0
+    return min(xs), min(zs), max(xs), max(zs)
+
+
+def forceload_commands(placements: List["BlockPlacement"]) -> Tuple[List[str], List[str]]:
+    """
+    Return (add, remove) /forceload commands covering the build footprint.
+    The footprint is split into chunk strips so no single command exceeds the server limit.
+    """
+    if not placements:
+        return [], []
+    return forceload_area_commands(*get_footprint(placements))
+
+
+def forceload_area_commands(min_x: int, min_z: int, max_x: int, max_z: int) -> Tuple[List[str], List[str]]:
+    """(add, remove) /forceload commands covering a footprint, in chunk strips (see forceload_commands)."""
+    cx1, cz1 = chunk_of(min_x, min_z)
+    cx2, cz2 = chunk_of(max_x, max_z)
+    rows_per_cmd = max(1, MAX_FORCELOAD_CHUNKS // (cx2 - cx1 + 1))
+    add: List[str] = []
+    remove: List[str] = []
+    cz = cz1
+    while cz <= cz2:
+        cz_end = min(cz2, cz + rows_per_cmd - 1)
+        area = f"{cx1 * 16} {cz * 16} {cx2 * 16 + 15} {cz_end * 16 + 15}"
+        add.append(f"/forceload add {area}")
+        remove.append(f"/forceload remove {area}")
+        cz = cz_end + 1
+    return add, remove
+
+
+def estimate_server_cost(placements: List["BlockPlacement"], forceloaded: bool = False) -> Dict[str, float]:
+    """
+    Estimate server tick time spent applying placements in the given order.
+    The server keeps a few recently touched chunks hot; touching a cold chunk costs a load
+    unless the footprint is forceloaded.
+    Placing a block below an already placed block in the same column forces a relight.
+    """
+    hot: "OrderedDict[Tuple[int, int], None]" = OrderedDict()
+    column_top: Dict[Tuple[int, int], int] = {}
+    chunk_loads = 0
+    relights = 0
+    setblocks = 0
+    for p in placements:
+        if is_clear(p):
+            continue
+        setblocks += 1
+        chunk = chunk_of(p.x, p.z)
+        if chunk in hot:
+            hot.move_to_end(chunk)
+        else:
+            # Forceloaded chunks are loaded once and never unloaded during the job
+            chunk_loads += 1
+            hot[chunk] = None
+            if not forceloaded and len(hot) > HOT_CHUNK_CAPACITY:
+                hot.popitem(last=False)
+        top = column_top.get((p.x, p.z))
+        if top is not None and p.y < top:
+            relights += 1
+        else:
+            column_top[(p.x, p.z)] = p.y
+    tick_ms = (
+        setblocks * COST_SETBLOCK_MS
+        + chunk_loads * COST_CHUNK_LOAD_MS
+        + relights * COST_RELIGHT_MS
+    )
+    return {
+        "setblocks": setblocks,
+        "chunk_loads": chunk_loads,
+        "relights": relights,
+        "tick_ms": round(tick_ms, 2),
+    }
@@ -0,0 +1,240 @@
+"""
+Debug logging and raw provider responses, kept off the request path.
+
+Log records go through a QueueHandler; a QueueListener thread formats them as JSON lines
+into a rotating file, so a request never touches the disk. Raw provider responses are
+kept in an in-memory ring buffer keyed by request id (X-Request-ID, or one generated per
+request) and served by /api/debug/responses/{id}; a sampled fraction is also written to
+disk by the same listener thread.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger("blockprint")
+_responses_logger = logging.getLogger("blockprint.responses")
+_responses_logger.propagate = False
+
+# Request id of the HTTP request being handled ("-" outside a request)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Client-supplied ids are used in file names, so only these are accepted
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: take X-Request-ID (or generate one), expose it to logging, echo it back."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = ""
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not _VALID_REQUEST_ID.match(request_id) or request_id.strip(".") == "":
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": int(record.created * 1000),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data is not None:
+            entry["data"] = data
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Runs in the caller (before the queue), where the context variable is visible
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _ResponseFileHandler(logging.Handler):
+    """Writes sampled raw responses to <dir>/<request id>-<n>.json (listener thread only)."""
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+
+    def emit(self, record: logging.LogRecord) -> None:
+        entry = getattr(record, "entry", None)
+        if entry is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{entry['request_id']}-{entry['seq']}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+        except OSError:
+            self.handleError(record)
+
+
+class ResponseRing:
+    """The last `capacity` raw provider responses, grouped by request id."""
+
+    def __init__(self, capacity: int, sample_rate: float):
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self._by_request: "OrderedDict[str, List[dict]]" = OrderedDict()
+        self._count = 0
+        self._seq = 0
+        self.persisted = 0
+
+    def record(
+        self,
+        provider: str,
+        model: Optional[str],
+        content: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        if self.capacity <= 0:
+            return
+        request_id = request_id_var.get()
+        self._seq += 1
+        entry = {
+            "request_id": request_id,
+            "seq": self._seq,
+            "timestamp": int(time.time() * 1000),
+            "provider": provider,
+            "model": model,
+            "content": content,
+            "error": error,
+        }
+        entries = self._by_request.get(request_id)
+        if entries is None:
+            entries = self._by_request[request_id] = []
+        else:
+            self._by_request.move_to_end(request_id)
+        entries.append(entry)
+        self._count += 1
+        while self._count > self.capacity:
+            _, evicted = self._by_request.popitem(last=False)
+            self._count -= len(evicted)
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            self.persisted += 1
+            _responses_logger.info("raw response", extra={"entry": entry})
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"buffered_responses": self._count, "requests": len(self._by_request), "persisted": self.persisted}
+
+    def get(self, request_id: str) -> Optional[List[dict]]:
+        entries = self._by_request.get(request_id)
+        return list(entries) if entries is not None else None
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        """Most recent request ids first, without the response bodies."""
+        out = []
+        for request_id in reversed(self._by_request):
+            entries = self._by_request[request_id]
+            out.append({
+                "request_id": request_id,
+                "responses": len(entries),
+                "errors": sum(1 for e in entries if e["error"]),
+                "last_timestamp": entries[-1]["timestamp"],
+            })
+            if len(out) >= limit:
+                break
+        return out
+
+
+# Background listener owning every log file handle (started in the app lifespan)
+_listener: Optional[logging.handlers.QueueListener] = None
+_response_ring: Optional[ResponseRing] = None
+
+
+def setup_logging() -> None:
+    """Route blockprint logs through a queue to a background writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+    settings = get_settings()
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+    handlers: List[logging.Handler] = []
+    if settings.debug_log_path:
+        os.makedirs(os.path.dirname(os.path.abspath(settings.debug_log_path)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            settings.debug_log_path,
+            maxBytes=settings.debug_log_max_bytes,
+            backupCount=settings.debug_log_backups,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(_JsonFormatter())
+        file_handler.addFilter(lambda record: record.name != _responses_logger.name)
+        handlers.append(file_handler)
+    response_handler = _ResponseFileHandler(settings.debug_response_dir)
+    response_handler.addFilter(lambda record: record.name == _responses_logger.name)
+    handlers.append(response_handler)
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_RequestIdFilter())
+    for target in (logger, _responses_logger):
+        target.addHandler(queue_handler)
+    logger.setLevel(logging.DEBUG if settings.debug else logging.INFO)
+    _responses_logger.setLevel(logging.INFO)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush the queue and stop the writer thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    for target in (logger, _responses_logger):
+        for handler in list(target.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                target.removeHandler(handler)
+
+
+def get_response_ring() -> ResponseRing:
+    global _response_ring
+    if _response_ring is None:
+        settings = get_settings()
+        _response_ring = ResponseRing(settings.debug_response_buffer_size, settings.debug_response_sample_rate)
+    return _response_ring
+
@@ -1,8 +1,115 @@
-"""ElevenLabs Speech-to-Text client for transcribing voice to text."""
-import httpx
+"""
+ElevenLabs Speech-to-Text client for transcribing voice to text.
+
+WAV recordings are shrunk before upload (app.utils.audio.prepare_audio: silence
+trimmed, mono, 16 kHz); bytes and seconds saved are reported in /api/metrics.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Tuple
+
 from app.config import get_settings
+from app.services.ai_cache import get_ai_cache, transcript_cache_key
+from app.services.debug_log import logger
+from app.services.http_clients import get_provider_clients
+from app.services.provider_limits import get_provider_limiter
+from app.services.single_flight import get_single_flight
+from app.utils.audio import PreparedAudio, prepare_audio
+
+ELEVENLABS_STT_PATH = "/speech-to-text"
+
+
+class AudioStats:
+    """What preprocessing saved on the recordings sent to speech-to-text."""
+
+    def __init__(self):
+        self.recordings = 0
+        self.preprocessed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.seconds_before = 0.0
+        self.seconds_after = 0.0
+        self.preprocess_seconds = 0.0
+        self.transcribe_seconds = 0.0
+
+    def record(self, audio: PreparedAudio, size: int, transcribe_elapsed: float) -> None:
+        self.recordings += 1
+        self.transcribe_seconds += transcribe_elapsed
+        stats = audio.stats
+        self.bytes_before += stats.get("bytes_before", size)
+        self.bytes_after += len(audio.data)
+        if stats:
+            self.preprocessed += 1
+            self.seconds_before += stats["seconds_before"]
+            self.seconds_after += stats["seconds_after"]
+            self.preprocess_seconds += stats["elapsed"]
+
+    def snapshot(self) -> dict:
+        return {
+            "recordings": self.recordings,
+            "preprocessed": self.preprocessed,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "seconds_trimmed": round(self.seconds_before - self.seconds_after, 1),
+            "avg_preprocess_ms": round(self.preprocess_seconds / self.preprocessed * 1000, 1) if self.preprocessed else None,
+            "avg_transcribe_ms": round(self.transcribe_seconds / self.recordings * 1000, 1) if self.recordings else None,
+        }
+
+
+_audio_stats = AudioStats()
+
+
+def audio_metrics() -> dict:
+    return _audio_stats.snapshot()
+
+
+async def _prepare_recording(audio_bytes: bytes, content_type: str | None) -> PreparedAudio:
+    """prepare_audio off the event loop; the original recording if disabled or it fails."""
+    settings = get_settings()
+    if settings.audio_preprocess_enabled:
+        try:
+            return await asyncio.to_thread(prepare_audio, audio_bytes, content_type, settings.audio_target_rate)
+        except Exception:
+            # The original recording still transcribes; never fail a request over the optimization
+            logger.exception("audio preprocessing failed")
+    return PreparedAudio(audio_bytes, content_type or "audio/webm", {})
+
+
+async def transcribe_audio_cached(audio_bytes: bytes, content_type: str | None = None) -> Tuple[str, bool]:
+    """
+    transcribe_audio with the result cache, keyed by the SHA-256 of the recording: the
+    same recording uploaded again is not sent to ElevenLabs. Concurrent uploads of one
+    recording share a single call. On a miss the recording is preprocessed
+    (_prepare_recording) before upload. Returns (transcript, cached); empty transcripts
+    are not cached.
+    """
+    settings = get_settings()
+    cache = get_ai_cache()
+    digest = await asyncio.to_thread(lambda: hashlib.sha256(audio_bytes).hexdigest())
+    key = transcript_cache_key(digest, settings.elevenlabs_stt_model)
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None and isinstance(cached.get("text"), str):
+            return cached["text"], True
+
+    async def fetch() -> str:
+        audio = await _prepare_recording(audio_bytes, content_type)
+        started = time.perf_counter()
+        text = await transcribe_audio(audio.data, audio.content_type)
+        elapsed = time.perf_counter() - started
+        _audio_stats.record(audio, len(audio_bytes), elapsed)
+        if audio.stats:
+            logger.debug("voice audio", extra={"data": {
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in audio.stats.items()},
+                "transcribe_ms": round(elapsed * 1000, 1),
+            }})
+        if cache is not None and text:
+            await asyncio.to_thread(cache.put, key, {"text": text})
+        return text
 
-ELEVENLABS_STT_URL = "https://api.elevenlabs.io/v1/speech-to-text"
+    transcript, _ = await get_single_flight().do(key, fetch)
+    return transcript, False
 
 
 async def transcribe_audio(audio_bytes: bytes, content_type: str | None = None) -> str:
@@ -28,9 +135,9 @@ async def transcribe_audio(audio_bytes: bytes, content_type: str | None = None)
     files = {"file": (f"audio.{ext}", audio_bytes, content_type or "audio/webm")}
     data = {"model_id": settings.elevenlabs_stt_model}
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            ELEVENLABS_STT_URL,
+    async with get_provider_limiter("elevenlabs").slot():
+        response = await get_provider_clients().elevenlabs.post(
+            ELEVENLABS_STT_PATH,
             headers=headers,
             files=files,
             data=data,
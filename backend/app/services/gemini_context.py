@@ -0,0 +1,164 @@
+"""
+Gemini context caching for the static prompt prefix.
+
+The instructions and examples of a prompt are identical for every request with the
+same style and mode, so they are registered once as a Gemini cachedContents resource
+and generateContent requests reference it by name, sending only the image or
+transcript. Entries are created lazily, their TTL is extended when a request uses one
+close to expiry, and they are deleted at shutdown. When creation fails (model without
+caching support, prefix below the provider's minimum size) the prefix is sent inline
+and creation is not retried until RETRY_AFTER_SECONDS have passed.
+"""
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from app.config import get_settings
+
+# After a failed create, send the prefix inline for this long before trying again
+RETRY_AFTER_SECONDS = 600
+
+# Most (model, prompt) keys tracked at once; beyond that, new prefixes are sent inline.
+# Each cached context is billed storage, so this also caps what one process can create.
+MAX_CONTEXTS = 64
+
+
+class _Entry:
+    __slots__ = ("name", "expires_at")
+
+    def __init__(self, name: str, expires_at: float):
+        self.name = name
+        self.expires_at = expires_at
+
+
+class GeminiContextCache:
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        # Extend the TTL when a request finds less than this much of it left
+        self.refresh_margin = min(300.0, ttl_seconds / 2)
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._failed_until: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.hits = 0
+        self.created = 0
+        self.refreshed = 0
+        self.failures = 0
+        self.invalidated = 0
+
+    async def context_for(
+        self, http: httpx.AsyncClient, api_key: str, model: str, key: str, prefix: str
+    ) -> Optional[str]:
+        """Name of the cached context holding prefix (created or refreshed as needed), or None to send it inline."""
+        cache_key = (model, key)
+        if self._failed_until.get(cache_key, 0.0) > time.time():
+            return None
+        if cache_key not in self._locks and not self._make_room():
+            return None
+        lock = self._locks.setdefault(cache_key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(cache_key)
+            now = time.time()
+            if entry is not None and entry.expires_at - now > self.refresh_margin:
+                self.hits += 1
+                return entry.name
+            try:
+                if entry is not None and entry.expires_at > now:
+                    await self._refresh(http, api_key, entry)
+                    self.refreshed += 1
+                else:
+                    entry = await self._create(http, api_key, model, key, prefix)
+                    self._entries[cache_key] = entry
+                    self.created += 1
+            except (httpx.HTTPError, ValueError):
+                self.failures += 1
+                self._entries.pop(cache_key, None)
+                self._locks.pop(cache_key, None)
+                self._failed_until[cache_key] = time.time() + RETRY_AFTER_SECONDS
+                return None
+            return entry.name
+
+    def _make_room(self) -> bool:
+        """Whether another key can be tracked, after dropping expired failures and idle locks."""
+        if len(self._locks) + len(self._failed_until) < MAX_CONTEXTS:
+            return True
+        now = time.time()
+        self._failed_until = {k: t for k, t in self._failed_until.items() if t > now}
+        for k in [k for k, lock in self._locks.items() if k not in self._entries and not lock.locked()]:
+            del self._locks[k]
+        return len(self._locks) + len(self._failed_until) < MAX_CONTEXTS
+
+    def invalidate(self, model: str, key: str) -> None:
+        """Forget an entry the provider no longer knows (expired or deleted)."""
+        if self._entries.pop((model, key), None) is not None:
+            self.invalidated += 1
+
+    async def _create(self, http: httpx.AsyncClient, api_key: str, model: str, key: str, prefix: str) -> _Entry:
+        response = await http.post(
+            "/cachedContents",
+            headers={"x-goog-api-key": api_key},
+            json={
+                "model": f"models/{model}",
+                "displayName": key,
+                "contents": [{"role": "user", "parts": [{"text": prefix}]}],
+                "ttl": f"{self.ttl_seconds}s",
+            },
+        )
+        if response.status_code >= 400:
+            raise ValueError(f"cachedContents create failed: {response.status_code} {response.text[:200]}")
+        name = response.json().get("name")
+        if not name:
+            raise ValueError("cachedContents create returned no name")
+        return _Entry(name, time.time() + self.ttl_seconds)
+
+    async def _refresh(self, http: httpx.AsyncClient, api_key: str, entry: _Entry) -> None:
+        response = await http.patch(
+            f"/{entry.name}",
+            params={"updateMask": "ttl"},
+            headers={"x-goog-api-key": api_key},
+            json={"ttl": f"{self.ttl_seconds}s"},
+        )
+        if response.status_code >= 400:
+            raise ValueError(f"cachedContents refresh failed: {response.status_code} {response.text[:200]}")
+        entry.expires_at = time.time() + self.ttl_seconds
+
+    async def aclose(self, http: httpx.AsyncClient, api_key: Optional[str]) -> None:
+        """Delete every context this process created (storage is billed per hour)."""
+        entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            try:
+                await http.delete(f"/{entry.name}", headers={"x-goog-api-key": api_key or ""})
+            except httpx.HTTPError:
+                pass
+
+    def snapshot(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+            "invalidated": self.invalidated,
+        }
+
+
+# Singleton instance (None when disabled)
+_context_cache: Optional[GeminiContextCache] = None
+
+
+def get_gemini_context_cache() -> Optional[GeminiContextCache]:
+    global _context_cache
+    settings = get_settings()
+    if not settings.gemini_context_cache_enabled:
+        return None
+    if _context_cache is None:
+        _context_cache = GeminiContextCache(settings.gemini_context_cache_ttl_seconds)
+    return _context_cache
+
+
+async def close_gemini_context_cache(http: httpx.AsyncClient) -> None:
+    global _context_cache
+    if _context_cache is not None:
+        await _context_cache.aclose(http, get_settings().ai_api_key)
+        _context_cache = None
@@ -0,0 +1,257 @@
+"""
+Geometry checks of the openings in a validated blueprint.
+
+The AI places doors and windows by eye: windows overlap, run past the segment edge or
+up into the roof, and doors float above the ground. The planner builds them anyway,
+as block writes that are overwritten, carve holes into the neighbouring segment or end
+up in mid-air. Each segment's front face gets an interval index of the cells already
+taken (doors first, then windows in order); openings are clipped to the wall face,
+doors moved to the ground, overlapping windows merged when their union is a rectangle
+and otherwise clipped to the largest free part. Every fix is reported as a
+ValidationWarning, with the block placements it saves.
+
+Commands can only drop where an opening reached outside its wall face (inside it,
+the scheduler already collapses repeated writes to one command per block). The cells
+clipped off outside the face are counted as an upper bound: a cell the roof or a
+neighbouring segment writes anyway costs no extra command. The exact count needs the
+blueprint planned twice, which is too slow for the request path;
+benchmarks/bench_geometry_lint.py measures it.
+"""
+from bisect import bisect_right, insort
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.models import Blueprint, Building, Opening, OpeningType, ValidationWarning
+
+# (x0, y0, x1, y1) in face cells, end-exclusive; x from the image left, y from the ground
+Rect = Tuple[int, int, int, int]
+
+
+class FaceIndex:
+    """Cells taken on one wall face: per row, sorted non-overlapping [x0, x1) intervals and their owners."""
+
+    def __init__(self):
+        self._rows: Dict[int, List[Tuple[int, int, int]]] = {}
+
+    def owners(self, rect: Rect) -> Set[int]:
+        """Owners of the intervals overlapping rect."""
+        x0, y0, x1, y1 = rect
+        found: Set[int] = set()
+        for row in range(y0, y1):
+            intervals = self._rows.get(row)
+            if not intervals:
+                continue
+            # Stored as (end, start, owner): the first interval ending after x0
+            i = bisect_right(intervals, (x0, float("inf"), 0))
+            while i < len(intervals) and intervals[i][1] < x1:
+                found.add(intervals[i][2])
+                i += 1
+        return found
+
+    def add(self, rect: Rect, owner: int) -> None:
+        x0, y0, x1, y1 = rect
+        for row in range(y0, y1):
+            insort(self._rows.setdefault(row, []), (x1, x0, owner))
+
+    def remove(self, rect: Rect, owner: int) -> None:
+        x0, y0, x1, y1 = rect
+        for row in range(y0, y1):
+            self._rows[row].remove((x1, x0, owner))
+
+
+class GeometryStats:
+    """Totals of the geometry fixes, reported in /api/metrics."""
+
+    def __init__(self):
+        self.blueprints = 0
+        self.openings_fixed = 0
+        self.placements_saved = 0
+        self.cells_clipped = 0
+
+    def record(self, fixed: int, placements_saved: int, cells_clipped: int) -> None:
+        self.blueprints += 1
+        self.openings_fixed += fixed
+        self.placements_saved += placements_saved
+        self.cells_clipped += cells_clipped
+
+    def snapshot(self) -> dict:
+        return {
+            "blueprints": self.blueprints,
+            "openings_fixed": self.openings_fixed,
+            "placements_saved": self.placements_saved,
+            "cells_clipped": self.cells_clipped,
+        }
+
+
+_geometry_stats = GeometryStats()
+
+
+def geometry_metrics() -> dict:
+    return _geometry_stats.snapshot()
+
+
+def lint_blueprint(blueprint: Blueprint) -> List[ValidationWarning]:
+    """Fix the openings of every segment in place; returns the fixes plus a savings summary."""
+    warnings: List[ValidationWarning] = []
+    if blueprint.segments:
+        buildings = [(f"segments.{i}", b) for i, b in enumerate(blueprint.segments)]
+    else:
+        buildings = [("building", blueprint.building)] if blueprint.building else []
+    cells_clipped = sum(_cells_outside(b.openings, b.width_blocks, b.wall_height_blocks) for _, b in buildings)
+    placements_saved = sum(lint_building(building, path, warnings) for path, building in buildings)
+    fixed = len({w.path for w in warnings})
+    _geometry_stats.record(fixed, placements_saved, cells_clipped)
+    if warnings:
+        warnings.append(ValidationWarning(
+            path="",
+            code="geometry_savings",
+            message=(
+                f"Fixed {fixed} opening(s): {placements_saved} block placements saved, "
+                f"{cells_clipped} cells outside the wall faces no longer written"
+            ),
+            value={"placements_saved": placements_saved, "cells_clipped": cells_clipped},
+        ))
+    return warnings
+
+
+def lint_building(building: Building, path: str, warnings: List[ValidationWarning]) -> int:
+    """Fix the openings of one segment in place, appending a warning per fix. Returns the block placements saved."""
+    width, height = building.width_blocks, building.wall_height_blocks
+    face = FaceIndex()
+    rects: Dict[int, Rect] = {}
+    before = [_rect(o) for o in building.openings]
+
+    def warn(i: int, code: str, message: str, repaired: Optional[Rect]) -> None:
+        warnings.append(ValidationWarning(
+            path=f"{path}.openings.{i}",
+            code=code,
+            message=f"{path}.openings.{i}: {message}",
+            value=_rect_dict(before[i]),
+            repaired=_rect_dict(repaired) if repaired else None,
+        ))
+
+    doors = [i for i, o in enumerate(building.openings) if o.type == OpeningType.DOOR]
+    windows = [i for i, o in enumerate(building.openings) if o.type != OpeningType.DOOR]
+    for i in doors:
+        x0, y0, x1, y1 = before[i]
+        # The planner always sets doors on the ground, one block wide
+        rect = (min(x0, width - 1), 0, min(x0, width - 1) + 1, 2)
+        if rect[0] != x0:
+            warn(i, "opening_out_of_bounds", f"door outside the {width}-block wall moved inside", rect)
+        elif y0 != 0:
+            warn(i, "door_above_ground", f"door at y={y0} moved to the ground", rect)
+        if face.owners(rect):
+            warn(i, "opening_overlap", "door on top of another door removed", None)
+            continue
+        face.add(rect, i)
+        rects[i] = rect
+
+    for i in windows:
+        x0, y0, x1, y1 = before[i]
+        rect = (x0, y0, min(x1, width), min(y1, height))
+        if rect[0] >= rect[2] or rect[1] >= rect[3]:
+            code = "opening_out_of_bounds" if x0 >= width else "opening_above_roof_line"
+            warn(i, code, f"window outside the {width}x{height} wall face removed", None)
+            continue
+        if rect != before[i]:
+            where = " and ".join(w for w, out in (("past the wall edge", x1 > width), ("into the roof", y1 > height)) if out)
+            code = "opening_out_of_bounds" if x1 > width else "opening_above_roof_line"
+            warn(i, code, f"window reaching {where} clipped", rect)
+        rect = _place_window(face, rects, i, rect, doors, warn)
+        if rect is not None:
+            face.add(rect, i)
+            rects[i] = rect
+
+    if len(rects) < len(before) or any(rect != before[i] for i, rect in rects.items()):
+        openings = []
+        for i, opening in enumerate(building.openings):
+            if i in rects:
+                x0, y0, x1, y1 = rect = rects[i]
+                # Copy only what changes
+                openings.append(opening if rect == before[i] else opening.model_copy(update={"x": x0, "y": y0, "w": x1 - x0, "h": y1 - y0}))
+        building.openings = openings
+    return sum(_placements(r) for r in before) - sum(_placements(r) for r in rects.values())
+
+
+def _cells_outside(openings: List[Opening], width: int, height: int) -> int:
+    """Distinct face cells the openings cover beyond the width x height wall face."""
+    cells: Set[Tuple[int, int]] = set()
+    for opening in openings:
+        x0, y0, x1, y1 = _rect(opening)
+        if x1 <= width and y1 <= height:
+            continue
+        cells.update(
+            (x, y) for x in range(x0, x1) for y in range(y0, y1) if x >= width or y >= height
+        )
+    return len(cells)
+
+
+def _place_window(face: FaceIndex, rects: Dict[int, Rect], i: int, rect: Rect, doors: List[int], warn) -> Optional[Rect]:
+    """Merge rect with overlapping windows or clip it against them; None if nothing is left."""
+    while True:
+        others = face.owners(rect)
+        if not others:
+            return rect
+        merged = False
+        for j in sorted(others):
+            if j in doors:
+                continue
+            union = _union(rect, rects[j])
+            if union == rects[j]:
+                warn(i, "opening_overlap", f"window inside opening {j} removed", None)
+                return None
+            if union is not None:
+                # The earlier window (j) is absorbed into this one
+                face.remove(rects[j], j)
+                del rects[j]
+                warn(i, "opening_merged", f"window overlapping opening {j} merged into one window", union)
+                rect = union
+                merged = True
+                break
+        if merged:
+            continue
+        blocker = rects[min(others)]
+        clipped = _largest_free_part(rect, blocker)
+        if clipped is None:
+            warn(i, "opening_overlap", f"window inside opening {min(others)} removed", None)
+            return None
+        warn(i, "opening_overlap", f"window overlapping opening {min(others)} clipped", clipped)
+        rect = clipped
+
+
+def _rect(opening: Opening) -> Rect:
+    return opening.x, opening.y, opening.x + opening.w, opening.y + opening.h
+
+
+def _rect_dict(rect: Rect) -> dict:
+    return {"x": rect[0], "y": rect[1], "w": rect[2] - rect[0], "h": rect[3] - rect[1]}
+
+
+def _placements(rect: Rect) -> int:
+    """Block placements of an opening in the planner: carved to air, then filled with glass or a door."""
+    return 2 * (rect[2] - rect[0]) * (rect[3] - rect[1])
+
+
+def _union(a: Rect, b: Rect) -> Optional[Rect]:
+    """The union of two overlapping rects if it is a rect itself."""
+    if a[0] <= b[0] and a[1] <= b[1] and a[2] >= b[2] and a[3] >= b[3]:
+        return a
+    if b[0] <= a[0] and b[1] <= a[1] and b[2] >= a[2] and b[3] >= a[3]:
+        return b
+    if (a[1], a[3]) == (b[1], b[3]) or (a[0], a[2]) == (b[0], b[2]):
+        return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+    return None
+
+
+def _largest_free_part(rect: Rect, blocker: Rect) -> Optional[Rect]:
+    """The largest part of rect left, right, below or above blocker."""
+    x0, y0, x1, y1 = rect
+    parts = [
+        (x0, y0, min(x1, blocker[0]), y1),
+        (max(x0, blocker[2]), y0, x1, y1),
+        (x0, y0, x1, min(y1, blocker[1])),
+        (x0, max(y0, blocker[3]), x1, y1),
+    ]
+    parts = [p for p in parts if p[0] < p[2] and p[1] < p[3]]
+    if not parts:
+        return None
+    return max(parts, key=lambda p: (p[2] - p[0]) * (p[3] - p[1]))
@@ -0,0 +1,120 @@
+"""
+Shared, long-lived HTTP clients for the AI and speech providers.
+
+One keep-alive (HTTP/2 when `h2` is installed) httpx.AsyncClient per provider, with
+explicit pool limits and timeouts, created once and closed in the app lifespan. Each
+client records how many requests reused a pooled connection versus opened a new one.
+"""
+from typing import Dict, Optional
+
+import httpx
+
+from app.config import get_settings
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+ELEVENLABS_BASE_URL = "https://api.elevenlabs.io/v1"
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ConnectionStats:
+    """Request/connection counters for one provider client, fed by httpcore trace events."""
+
+    def __init__(self):
+        self.requests = 0
+        self.responses = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.http_versions: Dict[str, int] = {}
+
+    async def on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def on_response(self, response: httpx.Response) -> None:
+        self.responses += 1
+        self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+        if response.status_code >= 400:
+            self.errors += 1
+
+    async def _trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    def snapshot(self) -> dict:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "responses": self.responses,
+            "errors": self.errors,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+            "tls_handshakes": self.tls_handshakes,
+            "http_versions": dict(self.http_versions),
+        }
+
+
+def _create_client(base_url: str, stats: ConnectionStats) -> httpx.AsyncClient:
+    settings = get_settings()
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=settings.http2_enabled and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+        event_hooks={"request": [stats.on_request], "response": [stats.on_response]},
+    )
+
+
+class ProviderClients:
+    """The pooled clients, one per provider host."""
+
+    def __init__(self):
+        self.stats: Dict[str, ConnectionStats] = {
+            "openai": ConnectionStats(),
+            "gemini": ConnectionStats(),
+            "elevenlabs": ConnectionStats(),
+        }
+        self.openai = _create_client(OPENAI_BASE_URL, self.stats["openai"])
+        self.gemini = _create_client(GEMINI_BASE_URL, self.stats["gemini"])
+        self.elevenlabs = _create_client(get_settings().elevenlabs_base_url or ELEVENLABS_BASE_URL, self.stats["elevenlabs"])
+
+    async def aclose(self) -> None:
+        for client in (self.openai, self.gemini, self.elevenlabs):
+            await client.aclose()
+
+    def metrics(self) -> dict:
+        return {
+            "http2": get_settings().http2_enabled and HTTP2_AVAILABLE,
+            "providers": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+
+# Singleton instance (created on first use, normally at startup; closed at shutdown)
+_provider_clients: Optional[ProviderClients] = None
+
+
+def get_provider_clients() -> ProviderClients:
+    global _provider_clients
+    if _provider_clients is None:
+        _provider_clients = ProviderClients()
+    return _provider_clients
+
+
+async def close_provider_clients() -> None:
+    global _provider_clients
+    if _provider_clients is not None:
+        await _provider_clients.aclose()
+        _provider_clients = None
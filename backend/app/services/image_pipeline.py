@@ -0,0 +1,139 @@
+"""
+Image ingestion off the event loop.
+
+Uploads are decoded, scaled and encoded for the providers entirely in memory
+(app.utils.image.prepare_image) on a small thread pool: Pillow releases the GIL while
+decoding, resampling and encoding, so the loop keeps serving other requests meanwhile.
+Before the first provider call, line drawings are re-encoded compactly
+(app.utils.sketch_image) on the same pool; the payload sizes before and after are
+reported in /api/metrics.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.config import get_settings
+from app.services.debug_log import logger
+from app.utils.image import PreparedImage, prepare_image
+from app.utils.sketch_image import SketchPayload, encode_line_drawing, estimate_image_tokens
+
+# Longest side of the image sent to the AI
+MAX_IMAGE_DIMENSION = 1024
+
+# Created on first use, shut down with the app
+_image_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_image_executor() -> ThreadPoolExecutor:
+    global _image_executor
+    if _image_executor is None:
+        workers = get_settings().image_workers or os.cpu_count() or 1
+        _image_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
+    return _image_executor
+
+
+def shutdown_image_executor() -> None:
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(cancel_futures=True)
+        _image_executor = None
+
+
+async def prepare_upload_image(content: bytes) -> PreparedImage:
+    """Decode, resize and encode uploaded image bytes on the image pool. Raises ValueError if not an image."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_executor(), prepare_image, content, MAX_IMAGE_DIMENSION)
+
+
+class PayloadStats:
+    """Provider payload sizes before and after the line-drawing encoder."""
+
+    def __init__(self):
+        self.images = 0
+        self.line_drawings = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.encode_seconds = 0.0
+
+    def record(self, before: int, after: int, tokens_before: int, tokens_after: int, line_drawing: bool, elapsed: float) -> None:
+        self.images += 1
+        self.line_drawings += line_drawing
+        self.bytes_before += before
+        self.bytes_after += after
+        self.tokens_before += tokens_before
+        self.tokens_after += tokens_after
+        self.encode_seconds += elapsed
+
+    def snapshot(self) -> dict:
+        return {
+            "images": self.images,
+            "line_drawings": self.line_drawings,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_ratio": round(self.bytes_after / self.bytes_before, 3) if self.bytes_before else None,
+            "est_tokens_before": self.tokens_before,
+            "est_tokens_after": self.tokens_after,
+            "avg_encode_ms": round(self.encode_seconds / self.images * 1000, 1) if self.images else None,
+        }
+
+
+_payload_stats = PayloadStats()
+
+
+def payload_metrics() -> dict:
+    return _payload_stats.snapshot()
+
+
+async def compact_image_payload(image: PreparedImage, provider: str) -> None:
+    """
+    Replace the image's provider payload with the compact line-drawing encoding, once per
+    image; photos and anything the encoder does not make smaller keep their payload.
+    provider ("openai", "gemini") picks the vision token estimate for the budget.
+    """
+    settings = get_settings()
+    if image.compacted or not settings.sketch_payload_enabled:
+        return
+    image.compacted = True
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        payload: Optional[SketchPayload] = await loop.run_in_executor(
+            get_image_executor(),
+            encode_line_drawing,
+            image.image,
+            settings.sketch_payload_max_bytes,
+            settings.sketch_payload_max_tokens,
+            settings.sketch_payload_margin,
+            provider,
+        )
+    except Exception:
+        # The upload payload still works; never fail a request over the optimization
+        logger.exception("line drawing encoding failed")
+        payload = None
+    elapsed = time.perf_counter() - started
+
+    before = len(image.data)
+    tokens_before = estimate_image_tokens(image.image.width, image.image.height, provider)
+    if payload is not None and len(payload.data) < before:
+        image.replace_payload(payload.data, payload.mime_type)
+        tokens_after = payload.tokens
+    else:
+        tokens_after = tokens_before
+    _payload_stats.record(before, len(image.data), tokens_before, tokens_after, payload is not None, elapsed)
+    logger.debug(
+        "image payload",
+        extra={"data": {
+            "line_drawing": payload is not None,
+            "mode": payload.mode if payload else None,
+            "bytes_before": before,
+            "bytes_after": len(image.data),
+            "mime_type": image.mime_type,
+            "est_tokens_before": tokens_before,
+            "est_tokens_after": tokens_after,
+            "encode_ms": round(elapsed * 1000, 1),
+        }},
+    )
@@ -0,0 +1,290 @@
+"""
+Persistent store for compiled build plans.
+
+Each plan is a directory with a block palette, an (N, 5) int32 voxel array
+(x, y, z, palette index, phase) in send order, and the rendered commands as one
+raw byte file plus an offsets array. Arrays are opened with memory mapping, so large
+plans can be replayed, exported or diffed without loading them into RAM.
+An SQLite index tracks size and last access for LRU eviction; SQLite locking plus
+atomic directory renames make the store safe to share between uvicorn workers.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.services.block_planner import BlockPlacement, render_commands
+from app.services.command_scheduler import CLEAR_PREFIX, PHASE_CLEAR
+
+PLAN_FORMAT_VERSION = 1
+
+PALETTE_FILE = "palette.json"
+VOXELS_FILE = "voxels.npy"
+COMMANDS_FILE = "commands.bin"
+OFFSETS_FILE = "offsets.npy"
+INDEX_FILE = "index.sqlite3"
+
+# Commands decoded per read of the memory-mapped command file during replay
+REPLAY_BATCH = 4096
+
+
+def plan_key(payload: dict) -> str:
+    """Stable plan id for a planning input (blueprint(s) + origin(s))."""
+    canonical = json.dumps({"v": PLAN_FORMAT_VERSION, **payload}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class StoredPlan:
+    """A plan opened from disk; arrays are memory-mapped, nothing is read until used."""
+
+    def __init__(self, plan_id: str, path: str, meta: dict):
+        self.plan_id = plan_id
+        self.path = path
+        self.meta = meta
+        with open(os.path.join(path, PALETTE_FILE), "r", encoding="utf-8") as f:
+            self.palette: List[str] = json.load(f)
+        self.voxels: np.ndarray = np.load(os.path.join(path, VOXELS_FILE), mmap_mode="r")
+        self.offsets: np.ndarray = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        commands_path = os.path.join(path, COMMANDS_FILE)
+        if os.path.getsize(commands_path):
+            self._commands = np.memmap(commands_path, dtype=np.uint8, mode="r")
+        else:
+            self._commands = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return int(self.voxels.shape[0])
+
+    def command(self, i: int) -> str:
+        # Each command is stored with its trailing newline
+        return bytes(self._commands[self.offsets[i]:self.offsets[i + 1] - 1]).decode("utf-8")
+
+    def iter_commands(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        """Commands in send order, decoded REPLAY_BATCH at a time from the memory-mapped file."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for first in range(start, stop, REPLAY_BATCH):
+            last = min(stop, first + REPLAY_BATCH)
+            text = bytes(self._commands[self.offsets[first]:self.offsets[last]]).decode("utf-8")
+            yield from text.split("\n")[:-1]
+
+    def footprint(self) -> Tuple[int, int, int, int]:
+        """(min_x, min_z, max_x, max_z) covered by the plan, clear volumes included (see get_footprint)."""
+        if not len(self):
+            return 0, 0, 0, 0
+        xs, zs = self.voxels[:, 0], self.voxels[:, 2]
+        min_x, min_z, max_x, max_z = int(xs.min()), int(zs.min()), int(xs.max()), int(zs.max())
+        # Every clear volume has its own palette entry holding the far corner
+        for block in self.palette:
+            if block.startswith(CLEAR_PREFIX):
+                x2, _, z2 = (int(c) for c in block[len(CLEAR_PREFIX):].split(","))
+                min_x, min_z, max_x, max_z = min(min_x, x2), min(min_z, z2), max(max_x, x2), max(max_z, z2)
+        return min_x, min_z, max_x, max_z
+
+    def chunk_count(self) -> int:
+        """Distinct chunks the plan's placements start in."""
+        if not len(self):
+            return 0
+        chunks = (self.voxels[:, 0].astype(np.int64) >> 4) << 32 | (self.voxels[:, 2].astype(np.int64) >> 4) & 0xFFFFFFFF
+        return int(np.unique(chunks).size)
+
+    def iter_command_bytes(self, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+        """Raw newline-separated commands, in chunks, for exports."""
+        for start in range(0, len(self._commands), chunk_size):
+            yield bytes(self._commands[start:start + chunk_size])
+
+    def iter_function_bytes(self, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+        """iter_command_bytes without the leading "/" of each command, as .mcfunction files require."""
+        line_start = True
+        for chunk in self.iter_command_bytes(chunk_size):
+            if line_start and chunk.startswith(b"/"):
+                chunk = chunk[1:]
+            line_start = chunk.endswith(b"\n")
+            yield chunk.replace(b"\n/", b"\n")
+
+
+class PlanStore:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._init_index()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit connection; multi-statement updates open their own transaction
+        conn = sqlite3.connect(os.path.join(self.root, INDEX_FILE), timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_index(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS plans ("
+                " id TEXT PRIMARY KEY, created_at REAL, last_access REAL,"
+                " size_bytes INTEGER, commands INTEGER, meta TEXT)"
+            )
+
+    def _plan_dir(self, plan_id: str) -> str:
+        return os.path.join(self.root, plan_id)
+
+    def save(self, plan_id: str, placements: List[BlockPlacement], meta: Optional[dict] = None) -> str:
+        """Persist scheduled placements under plan_id (no-op if already stored) and evict if over the cap."""
+        if self.exists(plan_id):
+            return plan_id
+        palette_index: Dict[str, int] = {}
+        voxels = np.empty((len(placements), 5), dtype=np.int32)
+        for i, p in enumerate(placements):
+            voxels[i] = (p.x, p.y, p.z, palette_index.setdefault(p.block_type, len(palette_index)), p.phase)
+        encoded = [c.encode("utf-8") + b"\n" for c in render_commands(placements)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in encoded], out=offsets[1:])
+
+        # Write into a private directory, then rename it into place atomically
+        tmp = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        try:
+            with open(os.path.join(tmp, PALETTE_FILE), "w", encoding="utf-8") as f:
+                json.dump(list(palette_index), f)
+            np.save(os.path.join(tmp, VOXELS_FILE), voxels)
+            np.save(os.path.join(tmp, OFFSETS_FILE), offsets)
+            with open(os.path.join(tmp, COMMANDS_FILE), "wb") as f:
+                f.writelines(encoded)
+            size = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+            try:
+                os.rename(tmp, self._plan_dir(plan_id))
+            except OSError:
+                # Another worker stored the same plan first; keep theirs and (re)index it
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?, ?)",
+                (plan_id, now, now, size, len(placements), json.dumps(meta or {})),
+            )
+        self.evict()
+        return plan_id
+
+    def exists(self, plan_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM plans WHERE id = ?", (plan_id,)).fetchone()
+        return row is not None and os.path.isdir(self._plan_dir(plan_id))
+
+    def get(self, plan_id: str) -> Optional[StoredPlan]:
+        """Open a stored plan and mark it as recently used. Returns None if missing."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT meta FROM plans WHERE id = ?", (plan_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE plans SET last_access = ? WHERE id = ?", (time.time(), plan_id))
+        try:
+            return StoredPlan(plan_id, self._plan_dir(plan_id), json.loads(row[0]))
+        except (OSError, ValueError):
+            return None
+
+    def list(self, limit: int = 50, offset: int = 0) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, created_at, last_access, size_bytes, commands, meta FROM plans"
+                " ORDER BY last_access DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [
+            {
+                "id": r[0],
+                "created_at": r[1],
+                "last_access": r[2],
+                "size_bytes": r[3],
+                "commands": r[4],
+                "meta": json.loads(r[5]),
+            }
+            for r in rows
+        ]
+
+    def evict(self) -> List[str]:
+        """Delete least recently used plans until the store fits max_bytes."""
+        evicted: List[str] = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM plans").fetchone()[0]
+                if total > self.max_bytes:
+                    for plan_id, size in conn.execute(
+                        "SELECT id, size_bytes FROM plans ORDER BY last_access ASC"
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute("DELETE FROM plans WHERE id = ?", (plan_id,))
+                        total -= size
+                        evicted.append(plan_id)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        # Open memory maps stay valid after their files are unlinked
+        for plan_id in evicted:
+            shutil.rmtree(self._plan_dir(plan_id), ignore_errors=True)
+        return evicted
+
+
+def diff_plans(a: StoredPlan, b: StoredPlan, limit: int = 100) -> dict:
+    """Compare the final blocks of two plans position by position (clear passes ignored)."""
+    coords_dtype = np.dtype([("x", "<i4"), ("y", "<i4"), ("z", "<i4")])
+
+    def keyed(plan: StoredPlan, palette: Dict[str, int]):
+        rows = plan.voxels[plan.voxels[:, 4] != PHASE_CLEAR]
+        coords = np.ascontiguousarray(rows[:, :3]).view(coords_dtype).ravel()
+        mapping = np.array([palette.setdefault(s, len(palette)) for s in plan.palette] or [0], dtype=np.int32)
+        return coords, mapping[rows[:, 3]]
+
+    palette: Dict[str, int] = {}
+    ka, ba = keyed(a, palette)
+    kb, bb = keyed(b, palette)
+    _, ia, ib = np.intersect1d(ka, kb, return_indices=True)
+    changed = np.nonzero(ba[ia] != bb[ib])[0]
+    removed = np.setdiff1d(ka, kb)
+    added = np.setdiff1d(kb, ka)
+    blocks = list(palette)
+    return {
+        "from": a.plan_id,
+        "to": b.plan_id,
+        "unchanged": int(len(ia) - len(changed)),
+        "changed": int(len(changed)),
+        "added": int(len(added)),
+        "removed": int(len(removed)),
+        "changes": [
+            {
+                "x": int(ka[ia[i]]["x"]), "y": int(ka[ia[i]]["y"]), "z": int(ka[ia[i]]["z"]),
+                "from": blocks[ba[ia[i]]], "to": blocks[bb[ib[i]]],
+            }
+            for i in changed[:limit]
+        ],
+    }
+
+
+# Singleton instance
+_plan_store: Optional[PlanStore] = None
+
+
+def get_plan_store() -> Optional[PlanStore]:
+    """The shared store, or None when it is disabled."""
+    global _plan_store
+    settings = get_settings()
+    if not settings.plan_store_enabled:
+        return None
+    if _plan_store is None:
+        _plan_store = PlanStore(settings.plan_store_dir, settings.plan_store_max_bytes)
+    return _plan_store
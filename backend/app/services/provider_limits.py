@@ -0,0 +1,97 @@
+"""
+Per-provider concurrency limits for AI calls.
+
+Each provider gets an asyncio.Semaphore capping in-flight requests and an explicit
+wait queue with a maximum depth; callers beyond it are rejected immediately instead
+of piling up. Queue time is recorded so saturation is visible in /api/metrics.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from app.config import get_settings
+
+# Queue times kept for percentile reporting
+QUEUE_TIME_WINDOW = 1000
+
+
+class ProviderBusyError(ValueError):
+    """Raised when a provider's wait queue is full."""
+
+    def __init__(self, provider: str, max_queue: int):
+        self.provider = provider
+        super().__init__(f"{provider} is busy: {max_queue} requests already waiting")
+
+
+class ProviderLimiter:
+    def __init__(self, provider: str, max_concurrency: int, max_queue: int):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting_seen = 0
+        self.completed = 0
+        self.rejected = 0
+        self._queue_times: Deque[float] = deque(maxlen=QUEUE_TIME_WINDOW)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the provider's concurrency slots. Raises ProviderBusyError if the queue is full."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise ProviderBusyError(self.provider, self.max_queue)
+        self.waiting += 1
+        self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+        started = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self._queue_times.append(time.perf_counter() - started)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        times = sorted(self._queue_times)
+
+        def percentile(p: float) -> float:
+            return round(times[min(len(times) - 1, int(p * len(times)))] * 1000, 2) if times else 0.0
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting_seen": self.max_waiting_seen,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_ms_p50": percentile(0.50),
+            "queue_ms_p95": percentile(0.95),
+            "queue_ms_max": round(times[-1] * 1000, 2) if times else 0.0,
+        }
+
+
+# One limiter per provider name
+_limiters: Dict[str, ProviderLimiter] = {}
+
+
+def get_provider_limiter(provider: str) -> ProviderLimiter:
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        settings = get_settings()
+        limiter = ProviderLimiter(provider, settings.ai_max_concurrency, settings.ai_max_queue)
+        _limiters[provider] = limiter
+    return limiter
+
+
+def provider_limits_metrics() -> dict:
+    return {name: limiter.snapshot() for name, limiter in _limiters.items()}
@@ -0,0 +1,304 @@
+"""
+Ordered AI providers with hedged requests, failover and circuit breakers.
+
+AI_PROVIDERS lists providers in order of preference. A call goes to the first provider
+whose circuit breaker is closed; if it has not answered within that provider's rolling
+p95 latency, the next provider is started as a hedge and the first valid result wins
+(the other call is cancelled). A provider that fails is replaced by the next one at
+once. After AI_BREAKER_FAILURE_THRESHOLD consecutive failures a provider is skipped
+for AI_BREAKER_COOLDOWN_SECONDS, then a single trial call decides whether it returns.
+
+"mock:<latency_ms>:<error_rate>[:<ms_per_kb>]" entries are local mock providers for
+testing hedging and failover without network access; ms_per_kb adds latency in
+proportion to the request payload, like an upload-bound provider.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from app.config import Settings, get_settings
+from app.services.provider_limits import ProviderBusyError
+
+T = TypeVar("T")
+
+# Latencies kept per provider for the rolling percentiles
+LATENCY_WINDOW = 200
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ProvidersUnavailableError(ValueError):
+    """Raised when every configured provider is skipped by its circuit breaker."""
+
+    def __init__(self, providers: List[str]):
+        super().__init__(f"No AI provider available (circuit open: {', '.join(providers) or 'none configured'})")
+
+
+class ProviderStatusError(ValueError):
+    """Raised when a provider answers with an HTTP error status."""
+
+    def __init__(self, message: str, status_code: int):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def is_transient_status(status_code: int) -> bool:
+    """Whether an HTTP error status may go away on retry: timeout, rate limit, server error."""
+    return status_code in (408, 429) or status_code >= 500
+
+
+class ProviderSpec:
+    """One entry of the provider list: which API, with which key and model."""
+
+    __slots__ = ("name", "kind", "api_key", "model", "latency_ms", "error_rate", "ms_per_kb")
+
+    def __init__(
+        self,
+        kind: str,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        name: Optional[str] = None,
+        ms_per_kb: float = 0.0,
+    ):
+        self.kind = kind
+        self.name = name or kind
+        self.api_key = api_key
+        self.model = model
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.ms_per_kb = ms_per_kb
+
+    def __repr__(self) -> str:
+        return f"ProviderSpec({self.name!r})"
+
+
+def _parse_mock(entry: str) -> ProviderSpec:
+    parts = entry.split(":")
+    try:
+        latency_ms = float(parts[1]) if len(parts) > 1 and parts[1] else 0.0
+        error_rate = float(parts[2]) if len(parts) > 2 and parts[2] else 0.0
+        ms_per_kb = float(parts[3]) if len(parts) > 3 and parts[3] else 0.0
+    except ValueError:
+        raise ValueError(
+            f"Invalid mock provider '{entry}': expected mock:<latency_ms>:<error_rate>[:<ms_per_kb>]"
+        ) from None
+    return ProviderSpec("mock", model="mock", latency_ms=latency_ms, error_rate=error_rate, name=entry, ms_per_kb=ms_per_kb)
+
+
+def configured_providers(settings: Optional[Settings] = None) -> List[ProviderSpec]:
+    """
+    The usable providers in order. AI_PROVIDER/AI_API_KEY/AI_MODEL describe the primary;
+    other real providers need their own <PROVIDER>_API_KEY and are skipped without one.
+    """
+    settings = settings or get_settings()
+    primary = (settings.ai_provider or "openai").strip().lower()
+    names = [n.strip().lower() for n in (settings.ai_providers or "").split(",") if n.strip()] or [primary]
+
+    providers: List[ProviderSpec] = []
+    for name in names:
+        if name.startswith("mock"):
+            providers.append(_parse_mock(name))
+            continue
+        if name not in ("openai", "gemini"):
+            raise ValueError(f"Unknown AI provider '{name}' (expected openai, gemini or mock)")
+        if name == primary and settings.ai_api_key:
+            api_key, model = settings.ai_api_key, settings.ai_model
+        else:
+            api_key = getattr(settings, f"{name}_api_key")
+            model = getattr(settings, f"{name}_model")
+        if api_key and all(p.name != name for p in providers):
+            providers.append(ProviderSpec(name, api_key=api_key, model=model))
+    return providers
+
+
+class ProviderHealth:
+    """Rolling latency and circuit breaker state of one provider."""
+
+    def __init__(self, name: str, failure_threshold: int, cooldown_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.hedges = 0
+
+    def acquire(self) -> bool:
+        """Whether a call may go to this provider now (takes the trial slot when half-open)."""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown_seconds:
+                return False
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+        self.calls += 1
+        return True
+
+    def record_success(self, latency: float) -> None:
+        self.successes += 1
+        self._latencies.append(latency)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self._trial_in_flight = False
+
+    def record_failure(self, error: BaseException) -> None:
+        self._trial_in_flight = False
+        if isinstance(error, ProviderBusyError):
+            # Our own queue is full: not the provider's fault
+            self.rejected += 1
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self) -> None:
+        """The call lost a hedge race or its caller went away; no verdict on the provider."""
+        self.cancelled += 1
+        self._trial_in_flight = False
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        times = sorted(self._latencies)
+        return times[min(len(times) - 1, int(p * len(times)))]
+
+    def hedge_delay(self, min_samples: int, default_seconds: float) -> float:
+        """How long to wait for this provider before hedging: its p95 once enough calls are recorded."""
+        if len(self._latencies) < min_samples:
+            return default_seconds
+        return self.percentile(0.95)
+
+    def snapshot(self) -> dict:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "hedges_started": self.hedges,
+            "latency_ms_p50": ms(self.percentile(0.50)),
+            "latency_ms_p95": ms(self.percentile(0.95)),
+        }
+
+
+# One health record per provider name
+_health: Dict[str, ProviderHealth] = {}
+
+
+def get_provider_health(name: str) -> ProviderHealth:
+    health = _health.get(name)
+    if health is None:
+        settings = get_settings()
+        health = ProviderHealth(name, settings.ai_breaker_failure_threshold, settings.ai_breaker_cooldown_seconds)
+        _health[name] = health
+    return health
+
+
+def provider_health_metrics() -> dict:
+    return {name: health.snapshot() for name, health in _health.items()}
+
+
+async def call_with_failover(
+    providers: List[ProviderSpec],
+    call: Callable[[ProviderSpec], Awaitable[T]],
+    hedge: bool = True,
+) -> Tuple[T, ProviderSpec]:
+    """
+    Run call(provider) on the first available provider, hedging to the next one when it
+    runs past its p95 and failing over when it raises. Returns (result, provider that
+    produced it); raises the last error if every provider failed.
+    """
+    settings = get_settings()
+    min_samples = settings.ai_hedge_min_samples
+    default_delay = settings.ai_hedge_default_delay_ms / 1000
+    remaining = list(providers)
+    pending: Dict[asyncio.Task, Tuple[ProviderSpec, float]] = {}
+    last_error: Optional[BaseException] = None
+    hedge_at: Optional[float] = None
+
+    async def run(spec: ProviderSpec) -> T:
+        return await call(spec)
+
+    def settle(task: asyncio.Task, spec: ProviderSpec, started: float) -> bool:
+        """Record a finished call on its provider's health; True if it succeeded."""
+        nonlocal last_error
+        health = get_provider_health(spec.name)
+        if task.cancelled():
+            health.record_cancelled()
+            return False
+        error = task.exception()
+        if error is None:
+            health.record_success(time.perf_counter() - started)
+            return True
+        health.record_failure(error)
+        last_error = error
+        return False
+
+    def launch() -> bool:
+        nonlocal hedge_at
+        while remaining:
+            spec = remaining.pop(0)
+            health = get_provider_health(spec.name)
+            if not health.acquire():
+                continue
+            pending[asyncio.ensure_future(run(spec))] = (spec, time.perf_counter())
+            hedge_at = time.perf_counter() + health.hedge_delay(min_samples, default_delay) if hedge else None
+            return True
+        return False
+
+    if not launch():
+        raise ProvidersUnavailableError([p.name for p in providers])
+    try:
+        while pending:
+            timeout = None
+            if hedge_at is not None and remaining:
+                timeout = max(0.0, hedge_at - time.perf_counter())
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # The newest call is past its p95: start the next provider alongside it
+                slow_spec, _ = list(pending.values())[-1]
+                if launch():
+                    get_provider_health(slow_spec.name).hedges += 1
+                else:
+                    hedge_at = None
+                continue
+            # Several calls can finish together: every one is recorded, the first success wins
+            winner: Optional[Tuple[T, ProviderSpec]] = None
+            for task in done:
+                spec, started = pending.pop(task)
+                if settle(task, spec, started) and winner is None:
+                    winner = task.result(), spec
+            if winner is not None:
+                return winner
+            if not pending:
+                launch()
+    finally:
+        for task, (spec, started) in pending.items():
+            if task.done():
+                settle(task, spec, started)
+            else:
+                task.cancel()
+                get_provider_health(spec.name).record_cancelled()
+
+    if last_error is None:
+        raise ProvidersUnavailableError([p.name for p in providers])
+    raise last_error
@@ -0,0 +1,75 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+The first caller for a key (the leader) starts the upstream call as its own task;
+callers arriving with the same key while it runs await that task instead of starting
+another, and all share its result or exception. Every caller awaits through
+asyncio.shield, so one disconnecting client never cancels the call for the others;
+the upstream task is cancelled only when no caller is left waiting for it.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.abandoned = 0
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run fn() once per key at a time. Returns (result, shared) where shared means another caller led."""
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t, key=key, call=call: self._forget(key, call))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            # This caller went away; stop the upstream call only if nobody else wants it
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
+                self.abandoned += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "abandoned": self.abandoned,
+        }
+
+
+# Singleton instance
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,201 @@
+"""Plan several blueprints at different origins as one build (e.g. a village)."""
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.models import Blueprint, Origin
+from app.services.block_planner import BlockPlacement, BlockPlanner, get_build_bounds
+from app.services.command_scheduler import (
+    CLEAR_PREFIX,
+    PHASE_CLEAR,
+    chunk_of,
+    resolve_final_placements,
+    schedule_placements,
+)
+from app.services.block_connectivity import connect_states
+
+Box = Tuple[int, int, int, int]  # min_x, min_z, max_x, max_z (inclusive)
+
+# /fill refuses volumes above 32768 blocks: one chunk column (16x16) by 128 layers
+MAX_FILL_HEIGHT = 128
+# Decorations (leaves) may land one block outside the cleared volume
+FOOTPRINT_MARGIN = 1
+
+
+class SiteCollisionError(ValueError):
+    """Raised when two structures of a site overlap."""
+
+    def __init__(self, collisions: List[Tuple[int, int]]):
+        self.collisions = collisions
+        pairs = ", ".join(f"#{a + 1} and #{b + 1}" for a, b in collisions)
+        super().__init__(f"Structures overlap: {pairs}")
+
+
+class GridIndex:
+    """Uniform grid spatial index over 2D boxes; cells are chunk sized."""
+
+    def __init__(self, cell_size: int = 16):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._boxes: Dict[int, Box] = {}
+
+    def _cells_for(self, box: Box) -> Iterator[Tuple[int, int]]:
+        c = self.cell_size
+        for cx in range(box[0] // c, box[2] // c + 1):
+            for cz in range(box[1] // c, box[3] // c + 1):
+                yield cx, cz
+
+    def insert(self, item: int, box: Box) -> None:
+        self._boxes[item] = box
+        for cell in self._cells_for(box):
+            self._cells.setdefault(cell, []).append(item)
+
+    def query(self, box: Box) -> Set[int]:
+        """Items whose boxes intersect box."""
+        hits: Set[int] = set()
+        for cell in self._cells_for(box):
+            for item in self._cells.get(cell, ()):
+                other = self._boxes[item]
+                if other[0] <= box[2] and box[0] <= other[2] and other[1] <= box[3] and box[1] <= other[3]:
+                    hits.add(item)
+        return hits
+
+
+def structure_footprint(blueprint: Blueprint, origin: Origin) -> Box:
+    x1, _, z1, x2, _, z2 = get_build_bounds(blueprint, origin.x, origin.y, origin.z)
+    m = FOOTPRINT_MARGIN
+    return x1 - m, z1 - m, x2 + m, z2 + m
+
+
+def find_collisions(structures: List[Tuple[Blueprint, Origin]]) -> List[Tuple[int, int]]:
+    """Return index pairs of structures whose footprints overlap."""
+    index = GridIndex()
+    collisions: List[Tuple[int, int]] = []
+    for i, (blueprint, origin) in enumerate(structures):
+        box = structure_footprint(blueprint, origin)
+        collisions.extend((j, i) for j in sorted(index.query(box)))
+        index.insert(i, box)
+    return collisions
+
+
+class StructurePlan:
+    """
+    One structure planned and scheduled by a worker, in a compact form for the trip back:
+    rows of (x, y, z, phase, palette index) in schedule order, the block states they index,
+    and the chunk runs of that order as (phase, chunk x, chunk walk, start, stop).
+    """
+
+    __slots__ = ("rows", "palette", "runs", "warnings")
+
+    def __init__(self, rows: np.ndarray, palette: List[str], runs: np.ndarray, warnings: List[str]):
+        self.rows = rows
+        self.palette = palette
+        self.runs = runs
+        self.warnings = warnings
+
+
+def _plan_structure(blueprint_data: dict, origin: Tuple[int, int, int]) -> StructurePlan:
+    """Worker: plan one structure, resolve its final connected placements and schedule them (clear excluded)."""
+    blueprint = Blueprint.model_validate(blueprint_data)
+    planner = BlockPlanner()
+    placements = planner.generate_placements(blueprint, Origin(x=origin[0], y=origin[1], z=origin[2]))
+    scheduled = schedule_placements(connect_states(resolve_final_placements(placements)), resolved=True)
+
+    palette: Dict[str, int] = {}
+    rows = np.array(
+        [(p.x, p.y, p.z, p.phase, palette.setdefault(p.block_type, len(palette))) for p in scheduled],
+        dtype=np.int32,
+    ).reshape(-1, 5)
+    # Same (phase, chunk x, chunk walk) as the scheduler's sort key, for every row at once
+    cx = rows[:, 0] >> 4
+    cz = rows[:, 2] >> 4
+    keys = np.stack([rows[:, 3], cx, np.where(cx % 2 == 0, cz, -cz)], axis=1)
+    starts = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+    starts = np.concatenate([[0], starts]) if len(rows) else starts
+    stops = np.append(starts[1:], len(rows))[:len(starts)]
+    runs = np.column_stack([keys[starts], starts, stops]).astype(np.int32)
+    return StructurePlan(rows, list(palette), runs, planner.warnings)
+
+
+def shared_clear_pass(structures: List[Tuple[Blueprint, Origin]]) -> List[BlockPlacement]:
+    """
+    One clear pass for the whole site: every structure's clear volume split into
+    chunk-column boxes small enough for /fill, in chunk order, without duplicates.
+    """
+    boxes: Set[Tuple[int, int, int, int, int, int]] = set()
+    for blueprint, origin in structures:
+        x1, y1, z1, x2, y2, z2 = get_build_bounds(blueprint, origin.x, origin.y, origin.z)
+        for cx in range(x1 >> 4, (x2 >> 4) + 1):
+            for cz in range(z1 >> 4, (z2 >> 4) + 1):
+                bx1, bx2 = max(x1, cx * 16), min(x2, cx * 16 + 15)
+                bz1, bz2 = max(z1, cz * 16), min(z2, cz * 16 + 15)
+                for by1 in range(y1, y2 + 1, MAX_FILL_HEIGHT):
+                    boxes.add((bx1, by1, bz1, bx2, min(y2, by1 + MAX_FILL_HEIGHT - 1), bz2))
+    ordered = sorted(boxes, key=lambda b: (chunk_of(b[0], b[2]), b[1]))
+    return [
+        BlockPlacement(x=b[0], y=b[1], z=b[2], block_type=f"{CLEAR_PREFIX}{b[3]},{b[4]},{b[5]}", phase=PHASE_CLEAR)
+        for b in ordered
+    ]
+
+
+class SitePlan:
+    def __init__(self, placements: List[BlockPlacement], warnings: List[str]):
+        self.placements = placements
+        self.warnings = warnings
+
+
+def plan_site(structures: List[Tuple[Blueprint, Origin]]) -> SitePlan:
+    """
+    Check footprints for collisions, plan every structure (in parallel when there is more
+    than one) and merge them into one scheduled placement list with a shared clear pass.
+    Raises SiteCollisionError if structures overlap.
+    """
+    collisions = find_collisions(structures)
+    if collisions:
+        raise SiteCollisionError(collisions)
+
+    jobs = [(bp.model_dump(mode="json"), (o.x, o.y, o.z)) for bp, o in structures]
+    if len(jobs) > 1:
+        results = list(get_site_executor().map(_plan_structure, *zip(*jobs)))
+    else:
+        results = [_plan_structure(*job) for job in jobs]
+    return merge_structures(structures, results)
+
+
+def merge_structures(structures: List[Tuple[Blueprint, Origin]], results: List[StructurePlan]) -> SitePlan:
+    """
+    The site's placements: the shared clear pass, then the structures' schedules merged
+    chunk run by chunk run. Footprints do not overlap, so no support crosses structures and
+    each structure keeps its own order; only the runs are interleaved.
+    """
+    merged: List[BlockPlacement] = shared_clear_pass(structures)
+    rows = [r.rows.tolist() for r in results]
+    streams = [[(*run[:3], i, *run[3:]) for run in r.runs.tolist()] for i, r in enumerate(results)]
+    for *_, i, start, stop in heapq.merge(*streams):
+        palette = results[i].palette
+        merged.extend(BlockPlacement(x, y, z, palette[block], phase) for x, y, z, phase, block in rows[i][start:stop])
+    warnings = [f"Structure #{i + 1}: {w}" for i, r in enumerate(results) for w in r.warnings]
+    return SitePlan(merged, warnings)
+
+
+# Shared process pool, created on first multi-structure site
+_site_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_site_executor() -> ProcessPoolExecutor:
+    global _site_executor
+    if _site_executor is None:
+        workers = get_settings().site_planner_workers or os.cpu_count() or 1
+        _site_executor = ProcessPoolExecutor(max_workers=workers)
+    return _site_executor
+
+
+def shutdown_site_executor() -> None:
+    global _site_executor
+    if _site_executor is not None:
+        _site_executor.shutdown(cancel_futures=True)
+        _site_executor = None
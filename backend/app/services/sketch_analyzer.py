@@ -0,0 +1,492 @@
+"""
+Local blueprint extraction for clean front-view pen sketches, without an AI call.
+
+The sketch is binarized against an estimate of the paper shading, strokes are
+dilated to close small gaps, and everything the page border cannot reach is the
+building silhouette. Ground, wall tops and roof peaks come from the silhouette's
+column profile; segments are split where a vertical stroke runs from the ground up
+to a wall top or the profile jumps; enclosed holes inside a wall face are doors and
+windows. The geometry is redrawn in pixel space and its overlap (IoU) with the
+silhouette is the confidence: AIClient only calls a provider when it is below
+SKETCH_CONFIDENCE_THRESHOLD.
+
+Any closed outline matches its own redraw, so the overlap alone does not say the image
+is a building. Ink inside the outline that no roof, segment edge or opening accounts
+for (text, hatching, a drawing inside a frame) lowers the confidence, and so does an
+outline without a roof or openings (a plain box, a page border).
+"""
+import math
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.utils.image import ImageSource
+
+# Working resolution (longest side) of the binary mask
+WORK_DIMENSION = 400
+# Binarization resolution; strokes are found here and max-pooled down to WORK_DIMENSION
+INK_DIMENSION = 1024
+# A pixel is ink when darker than this fraction of the local paper brightness
+INK_RATIO = 0.72
+# Stroke dilation (work pixels) that closes gaps in hand-drawn outlines
+GAP_RADIUS = 2
+# A segment boundary stroke may lean one column per this many rows (about 18 degrees)
+VERTICAL_DRIFT_ROWS = 3
+# More ink than this is a photo or a shaded drawing, not an outline
+MAX_INK_FRACTION = 0.12
+# Segment size of the model's examples: the narrowest segment is at least this many blocks wide
+MIN_SEGMENT_BLOCKS = 6
+MIN_BUILDING_BLOCKS = 12
+MIN_WALL_BLOCKS = 4
+DEPTH_BLOCKS = 8
+# Share of the drawing's ink that the redraw does not explain: up to FREE is detail
+# (door handles, shingles, a wobbly second line), from there the confidence falls
+# linearly to 0 at ZERO
+STRAY_INK_FREE = 0.2
+STRAY_INK_ZERO = 0.4
+# Confidence factor of a building without roof and openings, or a roofless outline
+# spanning the page: a rectangle, a page border or a frame
+PLAIN_BOX_FACTOR = 0.5
+PAGE_SPAN = 0.95
+
+
+class SketchAnalysis:
+    """Result of analyze_sketch: geometry (Blueprint "building"/"segments" keys) and confidence in 0..1."""
+
+    __slots__ = ("geometry", "confidence", "reason", "elapsed")
+
+    def __init__(self, geometry: Optional[dict], confidence: float, reason: str = "", elapsed: float = 0.0):
+        self.geometry = geometry
+        self.confidence = confidence
+        self.reason = reason
+        self.elapsed = elapsed
+
+    def __repr__(self) -> str:
+        return f"SketchAnalysis(confidence={self.confidence:.2f}, reason={self.reason!r})"
+
+
+def _load_gray(source: ImageSource) -> np.ndarray:
+    if isinstance(source, Image.Image):
+        return _gray(source)
+    with Image.open(source) as img:
+        # JPEG decodes straight to a reduced grayscale size
+        scale = INK_DIMENSION / max(img.size)
+        img.draft("L", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        img.load()
+        return _gray(img)
+
+
+def _gray(img: Image.Image) -> np.ndarray:
+    if img.mode in ("RGBA", "LA", "P"):
+        # Transparent background is paper
+        rgba = img.convert("RGBA")
+        paper = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        paper.alpha_composite(rgba)
+        img = paper
+    gray = img.convert("L")
+    if max(gray.size) > 1.5 * INK_DIMENSION:
+        gray.thumbnail((INK_DIMENSION, INK_DIMENSION), Image.Resampling.BILINEAR)
+    return np.asarray(gray, dtype=np.float32)
+
+
+def _ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Ink pixels relative to the paper brightness around them (handles shadows on photos)."""
+    h, w = gray.shape
+    small = Image.fromarray(gray.astype(np.uint8)).resize((16, 16), Image.Resampling.BOX)
+    paper = np.asarray(small.resize((w, h), Image.Resampling.BILINEAR), dtype=np.float32)
+    ink = gray < paper * INK_RATIO
+    # Max-pool to the working resolution so one-pixel strokes survive the downscale
+    factor = max(1, math.ceil(max(h, w) / WORK_DIMENSION))
+    if factor > 1:
+        ph, pw = math.ceil(h / factor) * factor, math.ceil(w / factor) * factor
+        padded = np.zeros((ph, pw), dtype=bool)
+        padded[:h, :w] = ink
+        ink = padded.reshape(ph // factor, factor, pw // factor, factor).any(axis=(1, 3))
+    return ink
+
+
+def _dilate(mask: np.ndarray, rx: int, ry: int) -> np.ndarray:
+    out = mask.copy()
+    for dx in range(1, rx + 1):
+        out[:, dx:] |= mask[:, :-dx]
+        out[:, :-dx] |= mask[:, dx:]
+    grown = out.copy()
+    for dy in range(1, ry + 1):
+        out[dy:, :] |= grown[:-dy, :]
+        out[:-dy, :] |= grown[dy:, :]
+    return out
+
+
+def _erode(mask: np.ndarray, r: int) -> np.ndarray:
+    return ~_dilate(~mask, r, r)
+
+
+def _label(mask: np.ndarray) -> Tuple[np.ndarray, List[dict]]:
+    """
+    4-connected components of mask (run-based union-find). Returns the label image
+    (background 0) and the area and bounding box (x0, y0, x1, y1 inclusive) of each label.
+    """
+    parent: List[int] = [0]
+
+    def find(a: int) -> int:
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    runs: List[Tuple[int, int, int, int]] = []  # (row, start, end, provisional label)
+    previous: List[Tuple[int, int, int]] = []
+    padded = np.zeros(mask.shape[1] + 2, dtype=np.int8)
+    for y in range(mask.shape[0]):
+        padded[1:-1] = mask[y]
+        edges = np.flatnonzero(np.diff(padded))
+        current = []
+        j = 0
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            label = 0
+            while j < len(previous) and previous[j][1] <= start:
+                j += 1
+            k = j
+            while k < len(previous) and previous[k][0] < end:
+                other = find(previous[k][2])
+                if label == 0:
+                    label = other
+                elif other != label:
+                    parent[max(label, other)] = min(label, other)
+                    label = min(label, other)
+                k += 1
+            if label == 0:
+                label = len(parent)
+                parent.append(label)
+            current.append((start, end, label))
+            runs.append((y, start, end, label))
+        previous = current
+
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    final = {}
+    components: List[dict] = []
+    for y, start, end, label in runs:
+        root = find(label)
+        index = final.get(root)
+        if index is None:
+            index = final[root] = len(components) + 1
+            components.append({"label": index, "area": 0, "box": [start, y, end - 1, y]})
+        component = components[index - 1]
+        component["area"] += end - start
+        box = component["box"]
+        box[0] = min(box[0], start)
+        box[2] = max(box[2], end - 1)
+        box[3] = y
+        labels[y, start:end] = index
+    return labels, components
+
+
+def _runs(flags: np.ndarray) -> List[Tuple[int, int]]:
+    """[start, end] (inclusive) of every run of True."""
+    padded = np.concatenate(([False], flags, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return [(int(s), int(e) - 1) for s, e in zip(edges[::2], edges[1::2])]
+
+
+def _stroke_reach(ink: np.ndarray, first_row: int, start_rows: np.ndarray) -> np.ndarray:
+    """
+    For each column, the highest row an ink path climbing from start_rows[column] reaches.
+    The path may move one column sideways every VERTICAL_DRIFT_ROWS rows: hand-drawn
+    verticals lean and wobble, roof slopes are too shallow to follow.
+    """
+    strokes = _dilate(ink, 1, 2)
+    unreached = ink.shape[0]
+    columns = np.arange(ink.shape[1])
+    reach = np.full(ink.shape[1], unreached)
+    best = np.where(strokes[first_row], first_row, unreached)
+    for row in range(first_row + 1, int(start_rows.max()) + 1):
+        up = best.copy()
+        if row % VERTICAL_DRIFT_ROWS == 0:
+            up[1:] = np.minimum(up[1:], best[:-1])
+            up[:-1] = np.minimum(up[:-1], best[1:])
+        best = np.where(strokes[row], np.minimum(up, row), unreached)
+        starting = columns[start_rows == row]
+        reach[starting] = best[starting]
+    return reach
+
+
+def _segment_breaks(ink: np.ndarray, top: np.ndarray, bottom: np.ndarray, span: Tuple[int, int], margin: int) -> List[int]:
+    """
+    Columns inside a wall span where a segment boundary is: a vertical stroke from the
+    ground up to the lower of the two neighbouring wall tops, or (weaker evidence) a jump
+    in the silhouette top that no such stroke explains, e.g. a flat connector without a
+    dividing line.
+    """
+    a, b = span
+    # Climb from each column's own ground stroke (hand-drawn ground lines slope)
+    reach = _stroke_reach(ink, int(top[a:b + 1].min()), np.clip(bottom - 2 * GAP_RADIUS, 0, None))
+    height = bottom - top
+    jump = max(6 * GAP_RADIUS, 0.12 * float(height[a:b + 1].max()))
+    # Outer walls and roof overhang edges are not boundaries
+    edge = max(3 * margin, (b - a) // 20)
+    lines, jumps = [], []
+    for x in range(a + edge, b - edge + 1):
+        lower_top = max(top[max(a, x - 3 * margin)], top[min(b, x + 3 * margin)])
+        needed = bottom[x] - lower_top
+        if needed > 4 * margin and bottom[x] - reach[x] >= 0.92 * needed:
+            lines.append(x)
+        elif abs(int(top[x + 1]) - int(top[x])) > jump:
+            jumps.append(x)
+    breaks = [(s + e) // 2 for s, e in _runs(np.isin(np.arange(b + 1), lines))]
+    for s, e in _runs(np.isin(np.arange(b + 1), jumps)):
+        x = (s + e) // 2
+        if all(abs(x - other) > 4 * edge for other in breaks):
+            breaks.append(x)
+    return sorted(breaks)
+
+
+def _shape(strokes: np.ndarray, top: np.ndarray, ground: int, span: Tuple[int, int], margin: int) -> Tuple[int, Optional[dict]]:
+    """
+    Wall top row and roof (peak row/column, type, overhang columns) of one segment. The
+    middle of the span decides flat vs roofed, since a neighbour's roof may overhang its
+    edges; the wall top of a roofed segment is the eave line when one is drawn across
+    the span, else the silhouette top at the wall edges.
+    """
+    a, b = span
+    inset = (b - a) // 5
+    inner = top[a + inset:b - inset + 1]
+    middle = int(np.median(top[a + 2 * inset:b - 2 * inset + 1]))
+    edges = (int(top[min(b, a + margin)]), int(top[max(a, b - margin)]))
+    # Flat, or lower in the middle than at both edges (neighbouring roofs overhanging a connector)
+    if int(inner.max() - inner.min()) <= max(2 * GAP_RADIUS, 0.06 * (b - a)) or middle >= max(edges) - GAP_RADIUS:
+        return middle, None
+
+    profile = top[a:b + 1]
+    peak_row = int(profile.min())
+    edge_row = max(edges)
+    wall_top = edge_row
+    if b - a > 2 * margin + 3:
+        coverage = strokes[:, a + margin:b - margin + 1].mean(axis=1)
+        low = min(edge_row + (ground - edge_row) // 3, ground - margin)
+        for row in range(peak_row + (edge_row - peak_row) // 3, low):
+            if coverage[row] > 0.8:
+                wall_top = row
+                break
+    if wall_top - peak_row <= 2 * GAP_RADIUS:
+        return wall_top, None
+
+    near_peak = np.flatnonzero(profile <= peak_row + GAP_RADIUS)
+    # Opening the silhouette blunts a sharp peak by about its radius on each side
+    plateau = (near_peak.max() - near_peak.min() - 2 * (GAP_RADIUS + 2)) / max(1, b - a)
+    centre = (near_peak.min() + near_peak.max()) / 2 / max(1, b - a)
+    if plateau > 0.3:
+        kind = "hip"
+    elif centre < 0.2 or centre > 0.8:
+        kind = "shed"
+    else:
+        kind = "gable"
+    overhang = []
+    for step, start in ((-1, a - 1), (1, b + 1)):
+        n, x = 0, start
+        while 0 <= x < top.size and top[x] < wall_top - GAP_RADIUS and n < (b - a) // 4:
+            n += 1
+            x += step
+        overhang.append(n)
+    roof = {"peak_row": peak_row, "peak_x": a + (near_peak.min() + near_peak.max()) // 2, "type": kind, "overhang": overhang}
+    return wall_top, roof
+
+
+def _openings(holes: List[dict], span: Tuple[int, int], wall_top: int, ground: int, gap: int) -> Tuple[List[dict], int]:
+    """
+    Enclosed holes inside the wall face that look like rectangles (pixel boxes, door when
+    touching the ground), and how many wall faces the span holes: more than one means a
+    segment boundary was missed.
+    """
+    a, b = span
+    width, height = b - a, ground - wall_top
+    # Holes reach to within the dilated stroke of the outline they are drawn against
+    clearance = 2 * gap + 2
+    found = []
+    faces = 0
+    for hole in holes:
+        x0, y0, x1, y1 = hole["box"]
+        w, h = x1 - x0 + 1, y1 - y0 + 1
+        centre_x, centre_y = (x0 + x1) / 2, (y0 + y1) / 2
+        if not (a < centre_x < b and wall_top < centre_y < ground):
+            continue
+        if hole["area"] > 0.2 * width * height and (x0 - a <= clearance or b - x1 <= clearance):
+            faces += 1
+            continue
+        if x0 - a <= clearance or b - x1 <= clearance or y0 <= wall_top or y1 >= ground:
+            continue
+        if w > 0.7 * width or h > 0.9 * height or w < 2 or h < 2 or hole["area"] < 0.65 * w * h:
+            continue
+        # The hole stops at the (dilated) ground stroke
+        door = ground - y1 <= 3 * gap + 0.1 * height
+        found.append({"type": "door" if door else "window", "box": (x0 - gap, y0 - gap, x1 + gap, y1 + gap)})
+    return found, faces
+
+
+def _render(shape: Tuple[int, int], segments: List[dict], ground: int) -> np.ndarray:
+    canvas = Image.new("1", (shape[1], shape[0]), 0)
+    draw = ImageDraw.Draw(canvas)
+    for seg in segments:
+        a, b = seg["span"]
+        draw.rectangle((a, seg["wall_top"], b, ground), fill=1)
+        roof = seg["roof"]
+        if roof is None:
+            continue
+        left, right = a - roof["overhang"][0], b + roof["overhang"][1]
+        if roof["type"] == "hip":
+            inset = (b - a) // 4
+            points = [(left, seg["wall_top"]), (a + inset, roof["peak_row"]), (b - inset, roof["peak_row"]), (right, seg["wall_top"])]
+        else:
+            points = [(left, seg["wall_top"]), (roof["peak_x"], roof["peak_row"]), (right, seg["wall_top"])]
+            if roof["type"] == "shed":
+                points.insert(2 if roof["peak_x"] > (a + b) / 2 else 1, (roof["peak_x"], seg["wall_top"]))
+        draw.polygon(points, fill=1)
+    return np.asarray(canvas, dtype=bool)
+
+
+def _stray_ink(ink: np.ndarray, drawn: np.ndarray, segments: List[dict], gap: int) -> float:
+    """
+    Share of the ink on the redrawn building that lies inside it, away from the outline,
+    and is not explained by a roof (anything above the wall top), a segment edge or an
+    opening (its box, panes and frame included).
+    """
+    pad = 2 * gap + 2
+    explained = np.zeros(drawn.shape, dtype=bool)
+    for seg in segments:
+        a, b = seg["span"]
+        explained[:, max(0, a - pad):a + pad + 1] = True
+        explained[:, max(0, b - pad):b + pad + 1] = True
+        roof = seg["roof"]
+        if roof is not None:
+            left, right = a - roof["overhang"][0], b + roof["overhang"][1]
+            explained[:seg["wall_top"] + pad + 1, max(0, left - pad):right + pad + 1] = True
+        for opening in seg["openings"]:
+            x0, y0, x1, y1 = opening["box"]
+            explained[max(0, y0 - pad):y1 + pad + 1, max(0, x0 - pad):x1 + pad + 1] = True
+    total = np.count_nonzero(ink & _dilate(drawn, gap, gap))
+    if not total:
+        return 0.0
+    return np.count_nonzero(ink & _erode(drawn, pad) & ~explained) / total
+
+
+def _to_blocks(segments: List[dict], ground: int) -> dict:
+    """Pixel geometry to Blueprint building/segments with a scale that respects the model's minimum sizes."""
+    total = segments[-1]["span"][1] - segments[0]["span"][0]
+    narrowest = min(s["span"][1] - s["span"][0] for s in segments)
+    lowest = min(ground - s["wall_top"] for s in segments)
+    scale = max(1.0, min(total / MIN_BUILDING_BLOCKS, narrowest / MIN_SEGMENT_BLOCKS, lowest / MIN_WALL_BLOCKS))
+
+    def blocks(px: float, low: int, high: int) -> int:
+        return max(low, min(high, int(round(px / scale))))
+
+    buildings = []
+    for seg in segments:
+        a, b = seg["span"]
+        width = blocks(b - a, 6, 80)
+        wall = blocks(ground - seg["wall_top"], 4, 60)
+        building = {"width_blocks": width, "wall_height_blocks": wall, "depth_blocks": DEPTH_BLOCKS, "openings": []}
+        roof = seg["roof"]
+        if roof is not None:
+            height = blocks(seg["wall_top"] - roof["peak_row"], 2, 8)
+            if roof["type"] == "shed":
+                height = min(8, max(height, math.ceil(width / 2)))
+            building["roof"] = {
+                "type": roof["type"],
+                "height_blocks": height,
+                "overhang": blocks(sum(roof["overhang"]) / 2, 0, 2),
+            }
+        for opening in seg["openings"]:
+            x0, y0, x1, y1 = opening["box"]
+            building["openings"].append({
+                "type": opening["type"],
+                "x": blocks(x0 - a, 0, width - 1),
+                "y": 0 if opening["type"] == "door" else blocks(ground - y1, 0, wall - 1),
+                "w": blocks(x1 - x0, 1, width),
+                "h": blocks(y1 - y0, 1, wall),
+            })
+        buildings.append(building)
+    if len(buildings) == 1:
+        return {"view": "front", "building": buildings[0]}
+    return {"view": "front", "segments": buildings}
+
+
+def analyze_sketch(source: ImageSource) -> SketchAnalysis:
+    """Extract blueprint geometry from a front-view outline sketch. Never raises: failures score 0."""
+    started = time.perf_counter()
+    try:
+        geometry, confidence, reason = _analyze(source)
+    except Exception as e:
+        geometry, confidence, reason = None, 0.0, f"analysis failed: {e}"
+    return SketchAnalysis(geometry, confidence, reason, time.perf_counter() - started)
+
+
+def _analyze(source: ImageSource) -> Tuple[Optional[dict], float, str]:
+    ink = _ink_mask(_load_gray(source))
+    if not ink.any() or ink.mean() > MAX_INK_FRACTION:
+        return None, 0.0, "not an outline drawing"
+
+    gap = GAP_RADIUS
+    closed = _dilate(ink, gap, gap)
+    regions, components = _label(~closed)
+    h, w = ink.shape
+    exterior = {c["label"] for c in components if c["box"][0] == 0 or c["box"][1] == 0 or c["box"][2] == w - 1 or c["box"][3] == h - 1}
+    filled = ~np.isin(regions, list(exterior))
+    # Opening removes strokes that enclose nothing (ground lines, stray marks)
+    solid = _dilate(_erode(filled, gap + 2), gap + 2, gap + 2) & filled
+    parts, pieces = _label(solid)
+    if not pieces:
+        return None, 0.0, "outline is not closed"
+    largest = max(pieces, key=lambda c: c["area"])
+    silhouette = parts == largest["label"]
+    if largest["area"] < 0.03 * h * w:
+        return None, 0.0, "outline is not closed"
+
+    columns = silhouette.any(axis=0)
+    top = np.where(columns, silhouette.argmax(axis=0), h).astype(np.int64)
+    bottom = np.where(columns, h - 1 - silhouette[::-1].argmax(axis=0), -1)
+    ground = int(bottom.max())
+    # Columns standing on the ground (hand-drawn ground lines slope a little); roof overhangs end higher up
+    wall_columns = columns & (bottom >= ground - max(2 * gap + 2, 0.1 * (ground - int(top.min()))))
+    spans = [s for s in _runs(wall_columns) if s[1] - s[0] > 4 * gap]
+    if not spans:
+        return None, 0.0, "no walls found"
+
+    margin = 2 * gap
+    strokes = _dilate(ink, 1, 1)
+    segments = []
+    for span in spans:
+        edges = [span[0]] + _segment_breaks(ink, top, bottom, span, margin) + [span[1]]
+        for a, b in zip(edges, edges[1:]):
+            if b - a <= 2 * margin:
+                continue
+            wall_top, roof = _shape(strokes, top, ground, (a, b), margin)
+            segments.append({"span": (a, b), "wall_top": wall_top, "roof": roof})
+    if not segments:
+        return None, 0.0, "no walls found"
+
+    holes = [c for c in components if c["label"] not in exterior]
+    merged = 0
+    for seg in segments:
+        seg["openings"], faces = _openings(holes, seg["span"], seg["wall_top"], ground, gap)
+        merged += faces > 1
+
+    drawn = _render(silhouette.shape, segments, ground)
+    union = np.count_nonzero(drawn | silhouette)
+    confidence = np.count_nonzero(drawn & silhouette) / union if union else 0.0
+    # The outline can match while the structure does not: two wall faces in one segment
+    confidence *= 0.7 ** merged
+    if len(segments) > 7:
+        confidence *= 0.8
+    reason = f"{len(segments)} segment(s)"
+    stray = _stray_ink(ink, drawn, segments, gap)
+    if stray > STRAY_INK_FREE:
+        confidence *= max(0.0, 1 - (stray - STRAY_INK_FREE) / (STRAY_INK_ZERO - STRAY_INK_FREE))
+        reason += f", {stray:.0%} unexplained ink"
+    if not any(seg["roof"] for seg in segments):
+        x0, y0, x1, y1 = largest["box"]
+        spans_page = x1 - x0 + 1 >= PAGE_SPAN * w and y1 - y0 + 1 >= PAGE_SPAN * h
+        if spans_page or not any(seg["openings"] for seg in segments):
+            confidence *= PLAIN_BOX_FACTOR
+            reason += ", roofless outline spanning the page" if spans_page else ", no roof or openings"
+    return _to_blocks(segments, ground), float(confidence), reason
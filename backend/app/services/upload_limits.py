@@ -0,0 +1,88 @@
+"""
+Early rejection of oversized uploads.
+
+Upload endpoints would otherwise parse (and spool) the whole multipart body before the
+route can look at its size. This middleware answers 413 from the Content-Length header
+before any of the body is read, and stops reading a body without one (chunked) as soon
+as it passes the limit.
+"""
+import json
+from typing import Optional
+
+from app.config import get_settings
+
+# Multipart boundaries, part headers and form fields on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def upload_limit(path: str) -> Optional[int]:
+    """Largest request body accepted on this path, or None for no limit."""
+    settings = get_settings()
+    if path.startswith("/api/blueprint/batch"):
+        return settings.batch_max_bytes + MULTIPART_OVERHEAD
+    if path.startswith("/api/blueprint"):
+        return settings.max_upload_size + MULTIPART_OVERHEAD
+    return None
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware: 413 for POST bodies over upload_limit(path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = upload_limit(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    await _reject(send, limit)
+                    return
+                break
+
+        received = 0
+        rejected = started = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Looks like the client went away: the route stops parsing
+                    rejected = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if rejected and not started:
+                # Whatever the route made of the cut-off body, the answer is 413
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected or started:
+                raise
+        if rejected and not started:
+            await _reject(send, limit)
+
+
+async def _reject(send, limit: int) -> None:
+    size = limit - MULTIPART_OVERHEAD
+    readable = f"{size // (1024 * 1024)}MB" if size >= 1024 * 1024 else f"{size // 1024}KB"
+    body = json.dumps({"detail": f"Upload is too large. Maximum size is {readable}."}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))],
+    })
+    await send({"type": "http.response.body", "body": body})
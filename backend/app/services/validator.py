@@ -1,29 +1,295 @@
-"""Validate and clamp AI-generated blueprint JSON to the schema."""
-from typing import List, Tuple
-from app.models import Blueprint
+"""
+Validate and repair AI-generated blueprint JSON against the schema.
 
+The dict is validated with a precompiled TypeAdapter. When that fails, each error in
+Pydantic's structured error list is repaired where it occurs (out-of-range numbers are
+clamped, numbers in strings parsed, missing fields defaulted, unusable list items
+dropped) and the result validated again; every repair is reported as a
+ValidationWarning. Repairs copy the containers they write to, so the caller's dict is
+never modified.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple, Type
 
-def validate_blueprint(raw: dict) -> Tuple[Blueprint, List[str]]:
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from app.config import get_settings
+from app.models import Blueprint, Building, Materials, Opening, Roof, Style, ValidationWarning
+from app.services.block_registry import get_block_registry
+from app.services.geometry_lint import lint_blueprint, lint_building
+
+# Block kinds (see data/vanilla_blocks.json) accepted per material slot; None accepts any known block
+MATERIAL_SLOT_KINDS: Dict[str, Optional[Tuple[str, ...]]] = {
+    "foundation": None,
+    "wall": None,
+    "trim": None,
+    "roof": ("stairs", "slab", ""),
+    "window": ("pane", ""),
+    "door": ("door",),
+}
+
+# Compiled once: validation is the hot path of every blueprint response
+_BLUEPRINT_ADAPTER = TypeAdapter(Blueprint)
+_BUILDING_ADAPTER = TypeAdapter(Building)
+
+# Repairs can uncover errors Pydantic only checks once the fields are valid (building or segments set)
+MAX_REPAIR_ROUNDS = 3
+
+# Model of the fields under each key of the blueprint dict
+_CONTAINER_MODELS: Dict[str, Type[BaseModel]] = {
+    "building": Building,
+    "segments": Building,
+    "roof": Roof,
+    "openings": Opening,
+    "style": Style,
+    "materials": Materials,
+}
+
+# Values for required fields that are missing or beyond repair; fields not listed drop their list item
+_REQUIRED_DEFAULTS: Dict[Type[BaseModel], Dict[str, Any]] = {
+    Building: {"width_blocks": 24, "wall_height_blocks": 12, "depth_blocks": 10},
+    Roof: {"type": "gable", "height_blocks": 4, "overhang": 1},
+    Opening: {"x": 0, "y": 0, "w": 1, "h": 3},
+}
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_DROP = object()
+
+
+def validate_blueprint(raw: dict) -> Tuple[Blueprint, List[ValidationWarning]]:
     """
-    Validate raw AI blueprint dict and return a Blueprint model plus any warnings.
-    Pydantic validation will clamp values to allowed ranges and coerce types.
+    Validate a raw AI blueprint dict and return a Blueprint model plus the repairs made to
+    get there, including the opening geometry fixes (geometry_lint). Raises
+    ValidationError if it cannot be made valid.
     """
-    warnings: List[str] = []
-    # Normalize keys (AI might return different casing)
-    data = _normalize_blueprint_dict(raw)
-    # Let Pydantic validate and clamp; catch validation errors and surface as warnings
-    try:
-        blueprint = Blueprint.model_validate(data)
-    except Exception as e:
-        # If full validation fails, try with defaults for optional parts
-        warnings.append(f"Validation adjustment: {str(e)}")
-        data = _apply_safe_defaults(data)
-        blueprint = Blueprint.model_validate(data)
+    blueprint, warnings = _validate(_BLUEPRINT_ADAPTER, _normalize_blueprint_dict(raw), Blueprint)
+    if get_settings().geometry_lint_enabled:
+        warnings.extend(lint_blueprint(blueprint))
+    warnings.extend(_repair_materials(blueprint.style.materials, blueprint.style.theme))
     return blueprint, warnings
 
 
+def validate_segment(raw: dict) -> Tuple[Optional[Building], List[ValidationWarning]]:
+    """
+    Validate one building/segment on its own (used for streamed partial blueprints).
+    Returns (None, warnings) if it can't be made valid even with repairs.
+    """
+    warnings: List[ValidationWarning] = []
+    try:
+        building, _ = _validate(_BUILDING_ADAPTER, _normalize_building_dict(raw), Building, warnings)
+    except ValidationError:
+        return None, warnings
+    if get_settings().geometry_lint_enabled:
+        lint_building(building, "segment", warnings)
+    return building, warnings
+
+
+def warning_messages(warnings: List[ValidationWarning]) -> List[str]:
+    """The plain-text warnings of the API responses."""
+    return [w.message for w in warnings]
+
+
+def repair_materials(materials: Materials, theme: str = "ghibli") -> List[str]:
+    """
+    Check every material against the vanilla block registry and repair it in place:
+    normalize the id, otherwise fall back to the style palette. Returns warnings.
+    """
+    return warning_messages(_repair_materials(materials, theme))
+
+
+def _repair_materials(materials: Materials, theme: str) -> List[ValidationWarning]:
+    from app.services.ai_client import STYLE_PALETTES
+
+    registry = get_block_registry()
+    palette = STYLE_PALETTES.get(theme, Materials().model_dump())
+    warnings: List[ValidationWarning] = []
+    for slot, kinds in MATERIAL_SLOT_KINDS.items():
+        value = getattr(materials, slot)
+        repaired = _repair_material(registry, value, kinds)
+        if repaired is None:
+            repaired = palette.get(slot) or getattr(Materials(), slot)
+            warnings.append(ValidationWarning(
+                path=f"style.materials.{slot}",
+                code="unknown_material",
+                message=f"Unknown {slot} material '{value}' replaced with '{repaired}'",
+                value=value,
+                repaired=repaired,
+            ))
+        if repaired != value:
+            setattr(materials, slot, repaired)
+    return warnings
+
+
+def _repair_material(registry, value: str, kinds: Optional[Tuple[str, ...]]) -> Optional[str]:
+    """Return the canonical form of a valid material, or None if it can't be used in this slot."""
+    if not isinstance(value, str):
+        return None
+    try:
+        state = registry.parse(value)
+    except ValueError:
+        return None
+    if kinds is not None and state.kind not in kinds:
+        return None
+    return state.rendered
+
+
+def _validate(adapter: TypeAdapter, data: dict, root: Type[BaseModel], warnings: Optional[List[ValidationWarning]] = None):
+    """(model, warnings): validate, repairing the reported fields of data between attempts."""
+    if warnings is None:
+        warnings = []
+    # Containers repairs may write to: data itself and the copies _writable makes
+    owned = {id(data): data}
+    for _ in range(MAX_REPAIR_ROUNDS):
+        try:
+            return adapter.validate_python(data), warnings
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+        _repair_fields(data, errors, root, warnings, owned)
+    return adapter.validate_python(data), warnings
+
+
+def _repair_fields(
+    data: dict,
+    errors: List[dict],
+    root: Type[BaseModel],
+    warnings: List[ValidationWarning],
+    owned: Dict[int, Any],
+) -> None:
+    """
+    Repair each field in the error list in data. Unusable list items are removed last, so
+    indices stay valid, and fields inside them are not repaired first.
+    """
+    fixes = []
+    # Location of each list item to remove -> reason
+    dropped: Dict[tuple, str] = {}
+    for error in errors:
+        loc, kind = tuple(error["loc"]), error["type"]
+        if not loc:
+            if root is Blueprint:
+                fixes.append((loc, error, None))
+            continue
+        if isinstance(loc[-1], int):
+            dropped.setdefault(loc, error["msg"])
+            continue
+        model = root
+        for key in loc[:-1]:
+            if isinstance(key, str):
+                model = _CONTAINER_MODELS.get(key, model)
+        repaired = _repair_value(model, loc[-1], None if kind == "missing" else error["input"], kind)
+        if repaired is not _DROP:
+            fixes.append((loc, error, repaired))
+            continue
+        # The innermost list item holding the field
+        for i in range(len(loc) - 1, -1, -1):
+            if isinstance(loc[i], int):
+                dropped.setdefault(loc[: i + 1], f"{_path(loc)}: {error['msg']}")
+                break
+
+    def under_dropped(loc: tuple, strict: bool = False) -> bool:
+        return any(loc[: len(d)] == d and (len(d) < len(loc) or not strict) for d in dropped)
+
+    for loc, error, repaired in fixes:
+        if under_dropped(loc):
+            continue
+        if not loc:
+            # Blueprint-level: neither building nor segments
+            data["building"] = dict(_REQUIRED_DEFAULTS[Building])
+            data["segments"] = None
+            warnings.append(ValidationWarning(
+                path="building",
+                code=error["type"],
+                message="No building or segments: using a default building",
+                repaired=data["building"],
+            ))
+            continue
+        path = _path(loc)
+        value = None if error["type"] == "missing" else error["input"]
+        _writable(data, loc[:-1], owned)[loc[-1]] = repaired
+        warnings.append(ValidationWarning(
+            path=path,
+            code=error["type"],
+            message=f"{path}: missing, set to {repaired!r}" if value is None
+            else f"{path}: {error['msg']}; {value!r} replaced with {repaired!r}",
+            value=value,
+            repaired=repaired,
+        ))
+
+    removals = []
+    for loc, reason in dropped.items():
+        if under_dropped(loc, strict=True):
+            continue
+        removals.append((_writable(data, loc[:-1], owned), loc[-1]))
+        path = _path(loc)
+        warnings.append(ValidationWarning(path=path, code="removed", message=f"{path}: removed ({reason})"))
+    for items, index in sorted(removals, key=lambda r: r[1], reverse=True):
+        del items[index]
+
+
+def _repair_value(model: Type[BaseModel], name: str, value: Any, kind: str) -> Any:
+    """Replacement for an invalid field value, or _DROP to remove the list item holding it."""
+    field = model.model_fields.get(name)
+    if field is None:
+        return _DROP
+    if field.is_required():
+        fallback = _REQUIRED_DEFAULTS.get(model, {}).get(name, _DROP)
+    else:
+        fallback = field.get_default(call_default_factory=True)
+        if isinstance(fallback, BaseModel):
+            fallback = fallback.model_dump()
+    if kind.startswith(("int_", "float_", "greater_", "less_")):
+        number = _parse_number(value)
+        if number is None:
+            return fallback
+        if field.annotation is int:
+            number = int(round(number))
+        for bound in field.metadata:
+            if getattr(bound, "ge", None) is not None:
+                number = max(number, bound.ge)
+            if getattr(bound, "le", None) is not None:
+                number = min(number, bound.le)
+        return number
+    if kind == "enum" and isinstance(value, str):
+        choice = value.strip().lower()
+        if choice in {member.value for member in field.annotation}:
+            return choice
+    return fallback
+
+
+def _parse_number(value: Any) -> Optional[float]:
+    """A number, or the first number in a string ("12 blocks"); None otherwise."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER.search(value)
+        if match:
+            return float(match.group())
+    return None
+
+
+def _writable(data: dict, keys: tuple, owned: Dict[int, Any]) -> Any:
+    """
+    The container at keys, shallow-copying every container on the way that data does not
+    own yet (path copying), so a repair never writes into the caller's objects.
+    """
+    for key in keys:
+        child = data[key]
+        if id(child) not in owned:
+            child = dict(child) if isinstance(child, dict) else list(child)
+            owned[id(child)] = child
+            data[key] = child
+        data = child
+    return data
+
+
+def _path(loc: tuple) -> str:
+    return ".".join(str(key) for key in loc)
+
+
 def _normalize_blueprint_dict(d: dict) -> dict:
-    """Ensure dict structure matches Blueprint schema (building, segments, style, view)."""
+    """
+    Ensure dict structure matches Blueprint schema (building, segments, style, view). The
+    result shares unchanged nested values with d; repairs copy what they write to.
+    """
     out = {"view": d.get("view", "front")}
     if "segments" in d and isinstance(d["segments"], list) and len(d["segments"]) > 0:
         out["segments"] = [_normalize_building_dict(s) for s in d["segments"]]
@@ -34,80 +300,44 @@ def _normalize_blueprint_dict(d: dict) -> dict:
     else:
         out["building"] = {}
         out["segments"] = None
-    if "style" in d:
-        out["style"] = d["style"]
-    else:
-        out["style"] = {}
+    out["style"] = d.get("style", {})
     return out
 
 
 def _normalize_building_dict(b: dict) -> dict:
-    """Normalize a single building/segment dict (openings, door 1x2, etc.)."""
+    """Normalize a single building/segment dict (openings, door 1x2, etc.) without modifying b."""
     if not isinstance(b, dict):
         return b
     out = dict(b)
-    if "openings" not in out:
+    openings = out.get("openings")
+    if openings is None:
         out["openings"] = []
-    for op in out["openings"]:
-        if not isinstance(op, dict):
-            continue
-        if "w" not in op or op.get("w") is None:
-            op["w"] = 1
-        if "h" not in op or op.get("h") is None:
-            op["h"] = 2 if op.get("type") == "door" else 3
-        if op.get("type") == "door":
-            op["w"] = 1
-            op["h"] = 2
+    elif isinstance(openings, list):
+        out["openings"] = [_normalize_opening(op) for op in openings]
     return out
 
 
-def _apply_safe_defaults(data: dict) -> dict:
-    """Fill missing required fields with schema defaults so validation can succeed."""
-    if "segments" in data and isinstance(data["segments"], list):
-        for i, seg in enumerate(data["segments"]):
-            if isinstance(seg, dict):
-                data["segments"][i] = _apply_building_defaults(seg)
-        if "building" not in data or data["building"] is None:
-            data["building"] = data["segments"][0] if data["segments"] else {}
-    else:
-        b = data.get("building") or {}
-        data["building"] = _apply_building_defaults(b)
-        if "segments" not in data:
-            data["segments"] = None
-    if "style" not in data:
-        data["style"] = {}
-    return data
-
-
-def _apply_building_defaults(b: dict) -> dict:
-    """Fill defaults for a single building/segment."""
-    if not isinstance(b, dict):
-        return b
-    if "width_blocks" not in b:
-        b["width_blocks"] = 24
-    if "wall_height_blocks" not in b:
-        b["wall_height_blocks"] = 12
-    if "depth_blocks" not in b:
-        b["depth_blocks"] = 10
-    # Do not default roof when missing: segment has no roof (e.g. flat connector)
-    if "openings" not in b:
-        b["openings"] = []
-    for op in b["openings"]:
-        if not isinstance(op, dict):
-            continue
-        if "w" not in op or op.get("w") is None:
-            op["w"] = 1
-        if "h" not in op or op.get("h") is None:
-            op["h"] = 2 if op.get("type") == "door" else 3
-        if op.get("type") == "door":
-            op["w"] = 1
-            op["h"] = 2
-    return b
+def _normalize_opening(op: dict) -> dict:
+    """The opening with default sizes and doors 1x2; a copy only if that changes anything."""
+    if not isinstance(op, dict):
+        return op
+    if op.get("type") == "door":
+        if op.get("w") == 1 and op.get("h") == 2:
+            return op
+        return {**op, "w": 1, "h": 2}
+    if op.get("w") is not None and op.get("h") is not None:
+        return op
+    out = dict(op)
+    if out.get("w") is None:
+        out["w"] = 1
+    if out.get("h") is None:
+        out["h"] = 3
+    return out
 
 
 class BlueprintValidator:
     """Validator for blueprint JSON; use validate_blueprint() for the main API."""
 
     @staticmethod
-    def validate(raw: dict) -> Tuple[Blueprint, List[str]]:
+    def validate(raw: dict) -> Tuple[Blueprint, List[ValidationWarning]]:
         return validate_blueprint(raw)
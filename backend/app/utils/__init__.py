@@ -1,3 +1,4 @@
-from .image import resize_image_for_ai
+from .image import PreparedImage, prepare_image, image_digest, perceptual_hash
+from .audio import PreparedAudio, prepare_audio
 
-__all__ = ["resize_image_for_ai"]
\ No newline at end of file
+__all__ = ["PreparedImage", "prepare_image", "image_digest", "perceptual_hash", "PreparedAudio", "prepare_audio"]
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""Voice recording preprocessing before speech-to-text."""
+import io
+import time
+import wave
+from typing import Dict, Optional
+
+import numpy as np
+
+WAV_CONTENT_TYPES = ("audio/wav", "audio/x-wav", "audio/wave", "audio/vnd.wave")
+
+# Voice activity detection on frames of this length
+FRAME_SECONDS = 0.02
+# A frame is speech when its energy is this far above the noise floor (dB) ...
+VOICE_MARGIN_DB = 12.0
+# ... and above this absolute level (dBFS), so a silent file is not all "speech"
+MIN_VOICE_DB = -55.0
+# Noise floor: this percentile of the frame energies
+NOISE_PERCENTILE = 10
+# Silence kept before the first and after the last speech frame
+PADDING_SECONDS = 0.25
+# Taps of the anti-aliasing filter used when downsampling
+FILTER_TAPS = 101
+
+
+class PreparedAudio:
+    """A recording as it is sent to speech-to-text, with what preprocessing did to it."""
+
+    __slots__ = ("data", "content_type", "stats")
+
+    def __init__(self, data: bytes, content_type: str, stats: Dict[str, float]):
+        self.data = data
+        self.content_type = content_type
+        # bytes_before/after, seconds_before/after, sample_rate, elapsed; empty on pass-through
+        self.stats = stats
+
+
+def is_wav(content: bytes, content_type: Optional[str]) -> bool:
+    if content[:4] == b"RIFF" and content[8:12] == b"WAVE":
+        return True
+    return (content_type or "").split(";")[0].strip().lower() in WAV_CONTENT_TYPES and content[:4] == b"RIFF"
+
+
+def _read_pcm(content: bytes) -> tuple:
+    """(mono float32 samples in -1..1, sample rate) of a PCM WAV. Raises wave.Error/EOFError if unreadable."""
+    with wave.open(io.BytesIO(content), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = (np.where(values >= 1 << 23, values - (1 << 24), values) / float(1 << 23)).astype(np.float32)
+    elif width == 4:
+        samples = (np.frombuffer(frames, dtype="<i4") / float(1 << 31)).astype(np.float32)
+    else:
+        raise wave.Error(f"unsupported sample width {width}")
+    samples = samples[: len(samples) // channels * channels]
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+
+def voice_span(samples: np.ndarray, rate: int) -> Optional[tuple]:
+    """
+    (start, end) sample indices of the speech, padded by PADDING_SECONDS, from frame
+    energies against the recording's own noise floor; None when nothing rises above it.
+    """
+    frame = max(1, int(rate * FRAME_SECONDS))
+    count = len(samples) // frame
+    if count == 0:
+        return None
+    frames = samples[: count * frame].reshape(count, frame)
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-12)
+    threshold = max(np.percentile(energy_db, NOISE_PERCENTILE) + VOICE_MARGIN_DB, MIN_VOICE_DB)
+    voiced = np.flatnonzero(energy_db > threshold)
+    if voiced.size == 0:
+        return None
+    pad = int(rate * PADDING_SECONDS)
+    return max(0, voiced[0] * frame - pad), min(len(samples), (voiced[-1] + 1) * frame + pad)
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int) -> np.ndarray:
+    """Downsample to target_rate: windowed-sinc low-pass below the new Nyquist, then interpolation."""
+    if rate <= target_rate:
+        return samples
+    cutoff = 0.45 * target_rate / rate
+    n = np.arange(FILTER_TAPS) - (FILTER_TAPS - 1) / 2
+    taps = (np.sinc(2 * cutoff * n) * np.hamming(FILTER_TAPS)).astype(np.float32)
+    filtered = np.convolve(samples, taps / taps.sum(), mode="same")
+    positions = np.arange(0, len(samples) - 1, rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), filtered).astype(np.float32)
+
+
+def _write_wav(samples: np.ndarray, rate: int) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+    return out.getvalue()
+
+
+def prepare_audio(content: bytes, content_type: Optional[str], target_rate: int = 16000) -> PreparedAudio:
+    """
+    Shrink a PCM WAV recording for speech-to-text: downmix to mono, trim the silence before
+    and after the speech (voice_span), downsample to target_rate and re-encode as 16-bit
+    PCM. Compressed formats (WebM/Opus, MP3, OGG), WAVs the wave module cannot read and
+    results that would not be smaller are passed through unchanged.
+    """
+    passthrough = PreparedAudio(content, content_type or "audio/webm", {})
+    if not is_wav(content, content_type):
+        return passthrough
+    started = time.perf_counter()
+    try:
+        samples, rate = _read_pcm(content)
+    except (wave.Error, EOFError, ValueError):
+        return passthrough
+    seconds_before = len(samples) / rate if rate else 0.0
+    span = voice_span(samples, rate)
+    if span is not None:
+        samples = samples[span[0]: span[1]]
+    samples = resample(samples, rate, target_rate)
+    rate = min(rate, target_rate)
+    data = _write_wav(samples, rate)
+    if len(data) >= len(content):
+        return passthrough
+    return PreparedAudio(data, "audio/wav", {
+        "bytes_before": len(content),
+        "bytes_after": len(data),
+        "seconds_before": seconds_before,
+        "seconds_after": len(samples) / rate,
+        "sample_rate": rate,
+        "elapsed": time.perf_counter() - started,
+    })
@@ -0,0 +1,70 @@
+"""Hamming-distance index over 64-bit perceptual hashes (multi-index hashing)."""
+from functools import lru_cache
+from itertools import combinations
+from typing import Any, Dict, List, Tuple
+
+HASH_BITS = 64
+SEGMENTS = 4
+SEGMENT_BITS = HASH_BITS // SEGMENTS
+SEGMENT_MASK = (1 << SEGMENT_BITS) - 1
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius: int) -> Tuple[int, ...]:
+    """Every SEGMENT_BITS-wide mask with at most radius bits set."""
+    masks = [0]
+    for r in range(1, min(radius, SEGMENT_BITS) + 1):
+        for bits in combinations(range(SEGMENT_BITS), r):
+            m = 0
+            for b in bits:
+                m |= 1 << b
+            masks.append(m)
+    return tuple(masks)
+
+
+class HammingIndex:
+    """
+    The hash is split into SEGMENTS chunks, each with its own exact-match table.
+    If two hashes are within radius, at least one chunk differs in at most
+    radius // SEGMENTS bits (pigeonhole), so a search probes each table with those
+    few bit flips and only verifies the handful of candidates it finds.
+    """
+
+    def __init__(self):
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(SEGMENTS)]
+        self._hashes: List[int] = []
+        self._values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, item: int, value: Any) -> None:
+        i = len(self._hashes)
+        self._hashes.append(item)
+        self._values.append(value)
+        for s, table in enumerate(self._tables):
+            table.setdefault((item >> (s * SEGMENT_BITS)) & SEGMENT_MASK, []).append(i)
+
+    def search(self, item: int, radius: int) -> List[Tuple[int, Any]]:
+        """All (distance, value) pairs within radius, closest first."""
+        if radius < 0 or not self._hashes:
+            return []
+        masks = _flip_masks(radius // SEGMENTS)
+        seen = set()
+        found: List[Tuple[int, Any]] = []
+        for s, table in enumerate(self._tables):
+            segment = (item >> (s * SEGMENT_BITS)) & SEGMENT_MASK
+            for m in masks:
+                for i in table.get(segment ^ m, ()):
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    d = (self._hashes[i] ^ item).bit_count()
+                    if d <= radius:
+                        found.append((d, self._values[i]))
+        found.sort(key=lambda f: f[0])
+        return found
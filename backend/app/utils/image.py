@@ -1,30 +1,154 @@
 """Image preprocessing for AI analysis."""
-from PIL import Image
+import base64
+import hashlib
+import io
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Union
 
+import numpy as np
+from PIL import Image, ImageOps
 
-def resize_image_for_ai(file_path: str, max_dimension: int = 1024) -> None:
+# A file path or an already decoded image
+ImageSource = Union[str, Image.Image]
+
+# EXIF orientation tag
+_ORIENTATION = 0x0112
+
+# Formats sent to the providers as uploaded when no resize is needed
+PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+class PreparedImage:
+    """
+    An upload decoded, scaled to fit the AI's max dimension and encoded once, all in memory:
+    `image` feeds the cache hashes and the sketch analyzer, `data` (of `mime_type`) the providers.
+    """
+
+    __slots__ = ("image", "data", "mime_type", "timings", "compacted", "_base64")
+
+    def __init__(self, image: Image.Image, data: bytes, mime_type: str, timings: Dict[str, float]):
+        self.image = image
+        self.data = data
+        self.mime_type = mime_type
+        # Seconds spent per stage (decode, resize, encode)
+        self.timings = timings
+        # Whether the payload went through the line-drawing encoder (image_pipeline)
+        self.compacted = False
+        self._base64: Optional[str] = None
+
+    def replace_payload(self, data: bytes, mime_type: str) -> None:
+        """Send other bytes to the providers; `image` is unchanged."""
+        self.data = data
+        self.mime_type = mime_type
+        self._base64 = None
+
+    @property
+    def base64(self) -> str:
+        """Base64 of `data`, computed once however many providers are asked."""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode("ascii")
+        return self._base64
+
+
+def prepare_image(content: bytes, max_dimension: int = 1024, quality: int = 90) -> PreparedImage:
+    """
+    Decode image bytes and get them ready for the providers, in memory. Images that already
+    fit max_dimension in a format every provider accepts are sent as uploaded; others are
+    uprighted (EXIF orientation), scaled so the longest side is max_dimension and encoded
+    as JPEG, transparent areas becoming white paper. JPEG sources are decoded directly at
+    a reduced scale (draft) when that still covers max_dimension.
+    Raises ValueError if the bytes are not a decodable image.
+    """
+    timings: Dict[str, float] = {"decode": 0.0, "resize": 0.0, "encode": 0.0}
+    started = time.perf_counter()
+    try:
+        img = Image.open(io.BytesIO(content))
+        fmt = img.format
+        if fmt == "JPEG":
+            scale = max_dimension / max(img.size)
+            if scale < 1:
+                img.draft("RGB", (int(img.width * scale) + 1, int(img.height * scale) + 1))
+        img.load()
+    except Exception as e:
+        raise ValueError(f"Not a readable image: {e}") from None
+    upright = img.getexif().get(_ORIENTATION, 1) == 1
+    decoded = time.perf_counter()
+    timings["decode"] = decoded - started
+
+    if upright and fmt in PASSTHROUGH_FORMATS and max(img.size) <= max_dimension:
+        return PreparedImage(img, content, PASSTHROUGH_FORMATS[fmt], timings)
+
+    if not upright:
+        img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P", "PA"):
+        rgba = img.convert("RGBA")
+        img = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        img.alpha_composite(rgba)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    w, h = img.size
+    if max(w, h) > max_dimension:
+        scale = max_dimension / max(w, h)
+        img = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.Resampling.LANCZOS)
+    resized = time.perf_counter()
+    timings["resize"] = resized - decoded
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    timings["encode"] = time.perf_counter() - resized
+    return PreparedImage(img, out.getvalue(), "image/jpeg", timings)
+
+
+def prepare_image_file(file_path: str, max_dimension: int = 1024) -> PreparedImage:
+    """prepare_image for an image on disk (scripts and benchmarks)."""
+    with open(file_path, "rb") as f:
+        return prepare_image(f.read(), max_dimension)
+
+
+@contextmanager
+def _opened(source: ImageSource) -> Iterator[Image.Image]:
+    if isinstance(source, Image.Image):
+        yield source
+    else:
+        with Image.open(source) as img:
+            yield img
+
+
+def image_digest(source: ImageSource, max_dimension: int = 1024) -> str:
+    """
+    SHA-256 of the normalized image: decoded to RGB and scaled to fit max_dimension.
+    Lossless re-encodes (PNG vs lossless WebP) and metadata-only changes hash the same;
+    a lossy JPEG re-save changes the pixels and does not (see perceptual_hash).
+    Falls back to hashing the raw file bytes if the image cannot be decoded.
+    """
+    h = hashlib.sha256()
+    try:
+        with _opened(source) as img:
+            img = img.convert("RGB")
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            h.update(f"{img.width}x{img.height}:".encode("ascii"))
+            h.update(img.tobytes())
+    except Exception:
+        if isinstance(source, Image.Image):
+            raise
+        with open(source, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def perceptual_hash(source: ImageSource, hash_size: int = 8) -> Optional[int]:
     """
-    Resize image in place so the longest side is at most max_dimension.
-    Reduces payload size and cost for vision API. Keeps aspect ratio and format.
+    Difference hash (dHash) of the image as a hash_size**2-bit integer: the picture is
+    shrunk to (hash_size + 1) x hash_size grayscale and each bit says whether a pixel is
+    brighter than its right neighbour. Re-scans and re-photos of the same sketch land a few
+    bits apart. Returns None if the image cannot be decoded.
     """
     try:
-        with Image.open(file_path) as img:
-            img.load()
-            w, h = img.size
-            if w <= max_dimension and h <= max_dimension:
-                return
-            if w >= h:
-                new_w = max_dimension
-                new_h = int(h * max_dimension / w)
-            else:
-                new_h = max_dimension
-                new_w = int(w * max_dimension / h)
-            resized = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-            fmt = img.format or "PNG"
-            save_kw: dict = {}
-            if fmt.upper() in ("JPEG", "JPG", "WEBP"):
-                save_kw["quality"] = 90
-            resized.save(file_path, format=fmt, **save_kw)
+        with _opened(source) as img:
+            small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
     except Exception:
-        # If resize fails, leave file unchanged so AI can still try to process it
-        pass
\ No newline at end of file
+        return None
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
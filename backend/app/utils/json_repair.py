@@ -0,0 +1,142 @@
+"""
+Tolerant single-pass JSON parser for model output.
+
+Handles, in one linear scan: prose or markdown fences around the object, single-quoted
+strings, Python literals (True/False/None), unquoted keys, // and /* */ comments, missing
+or trailing commas, and output truncated anywhere (open strings are closed, dangling keys
+dropped, open containers closed). Tokens are matched with one compiled regex, so the
+per-character work happens in C; a well-formed object (even inside fences or prose)
+takes the C decoder fast path.
+"""
+import json
+import re
+from typing import Any, List, Optional
+
+_TOKEN = re.compile(
+    r"""
+    \s*(?:
+        (?P<punct>[{}\[\]:,])
+      | (?P<dstr>"[^"\\]*(?:\\.[^"\\]*)*")
+      | (?P<sstr>'[^'\\]*(?:\\.[^'\\]*)*')
+      | (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+      | (?P<num>-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<open>["'].*)
+      | (?P<other>\S)
+      | (?P<end>\Z)
+    )
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_WORDS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+_MISSING = object()
+_STRING_DECODER = json.JSONDecoder(strict=False)
+_RAW_DECODER = json.JSONDecoder()
+
+
+def _decode_string(token: str, closed: bool = True) -> str:
+    quote = token[0]
+    body = token[1:-1] if closed else token[1:]
+    if "\\" not in body and (quote == '"' or '"' not in body):
+        return body
+    if quote == "'":
+        body = body.replace('\\"', '"').replace("\\'", "'").replace('"', '\\"')
+    if not closed and body.endswith("\\") and not body.endswith("\\\\"):
+        body = body[:-1]
+    try:
+        return _STRING_DECODER.decode(f'"{body}"')
+    except ValueError:
+        return body
+
+
+def parse_json_tolerant(text: str) -> dict:
+    """Parse the first JSON object in text, repairing common model-output defects. Raises ValueError."""
+    text = text.strip().lstrip("\ufeff")
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object found in model output")
+    # Fast path (C decoder): a well-formed object, possibly wrapped in fences or prose
+    try:
+        result, _ = _RAW_DECODER.raw_decode(text, start)
+        if isinstance(result, dict):
+            return result
+    except ValueError:
+        pass
+
+    stack: List[Any] = []  # open containers
+    keys: List[Any] = []  # per open container: key waiting for its value (_MISSING if none)
+    root: Optional[dict] = None
+
+    for m in _TOKEN.finditer(text, start):
+        kind = m.lastgroup
+        if kind == "punct":
+            token = m.group(kind)
+            if token == "{" or token == "[":
+                container = {} if token == "{" else []
+                if stack:
+                    parent = stack[-1]
+                    if parent.__class__ is list:
+                        parent.append(container)
+                    elif keys[-1] is not _MISSING:
+                        parent[keys[-1]] = container
+                        keys[-1] = _MISSING
+                    # (a container where a key belongs is parsed but not attached)
+                else:
+                    root = container
+                stack.append(container)
+                keys.append(_MISSING)
+            elif token == "}" or token == "]":
+                stack.pop()
+                keys.pop()
+                if not stack:
+                    break
+            elif token == ",":
+                # A key without a value before the comma is dropped
+                keys[-1] = _MISSING
+            # ':' carries no information beyond the key/value alternation
+            continue
+
+        if kind == "dstr" or kind == "sstr":
+            value = _decode_string(m.group(kind))
+        elif kind == "num":
+            token = m.group(kind)
+            value = float(token) if ("." in token or "e" in token or "E" in token) else int(token)
+        elif kind == "word":
+            token = m.group(kind)
+            if token in _WORDS:
+                value = _WORDS[token]
+            elif m.end() == len(text):
+                break  # literal cut off by truncation ("tr", "nul")
+            elif stack[-1].__class__ is dict and keys[-1] is _MISSING:
+                keys[-1] = token  # unquoted key
+                continue
+            else:
+                value = token
+        elif kind == "open":
+            # Unterminated string: the output was cut off inside it
+            if stack[-1].__class__ is list or keys[-1] is not _MISSING:
+                value = _decode_string(m.group(kind), closed=False)
+            else:
+                break
+        elif kind == "end":
+            break
+        else:
+            continue  # comments and stray characters
+
+        container = stack[-1]
+        if container.__class__ is list:
+            container.append(value)
+        elif keys[-1] is _MISSING:
+            # A value where a key belongs: strings become keys, anything else is dropped
+            if value.__class__ is str:
+                keys[-1] = value
+        else:
+            container[keys[-1]] = value
+            keys[-1] = _MISSING
+        if kind == "open":
+            break
+
+    if root is None:
+        raise ValueError("No JSON object found in model output")
+    return root
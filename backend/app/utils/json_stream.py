@@ -0,0 +1,130 @@
+"""Incremental scanner that yields blueprint parts as soon as their JSON objects close."""
+import json
+import re
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+PathItem = Union[str, int]
+
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+class _Frame:
+    __slots__ = ("is_object", "name", "start", "key", "index")
+
+    def __init__(self, is_object: bool, name: Optional[PathItem], start: int):
+        self.is_object = is_object
+        self.name = name  # key or index of this container in its parent
+        self.start = start  # offset of the opening bracket in the buffer
+        self.key: Optional[str] = None  # object: key of the value being read
+        self.index = 0  # array: index of the value being read
+
+
+class BlueprintStreamParser:
+    """
+    Feed model output chunk by chunk; `feed` returns the parts that completed:
+    ("segment", i, dict) for each closed segments[i], ("building", None, dict) and
+    ("style", None, dict) when those objects close. Text before the first '{'
+    (markdown fences, prose) is skipped. Every character is scanned once.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._frames: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self.started = False
+        self.finished = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._text
+
+    def _path(self) -> Tuple[PathItem, ...]:
+        return tuple(f.name for f in self._frames[1:])
+
+    def feed(self, chunk: str) -> List[Tuple[str, Optional[int], dict]]:
+        self._text += chunk
+        return list(self._scan())
+
+    def _scan(self) -> Iterator[Tuple[str, Optional[int], dict]]:
+        text = self._text
+        frames = self._frames
+        i = self._pos
+        n = len(text)
+        while i < n and not self.finished:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:i]
+                i += 1
+                continue
+            if not self.started:
+                if c == "{":
+                    self.started = True
+                else:
+                    i += 1
+                    continue
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == ":":
+                if frames and frames[-1].is_object:
+                    frames[-1].key = self._last_string
+            elif c == ",":
+                if frames and not frames[-1].is_object:
+                    frames[-1].index += 1
+            elif c in "{[":
+                parent = frames[-1] if frames else None
+                if parent is None:
+                    name = None
+                elif parent.is_object:
+                    name = parent.key
+                else:
+                    name = parent.index
+                frames.append(_Frame(c == "{", name, i))
+            elif c in "}]":
+                if frames:
+                    frame = frames[-1]
+                    if frame.is_object:
+                        event = self._closed(frame, text[frame.start:i + 1])
+                        if event is not None:
+                            yield event
+                    frames.pop()
+                    if not frames:
+                        self.finished = True
+            i += 1
+        self._pos = i
+
+    def _closed(self, frame: _Frame, raw: str) -> Optional[Tuple[str, Optional[int], dict]]:
+        path = self._path()
+        if len(path) == 2 and path[0] == "segments" and isinstance(path[1], int):
+            kind, index = "segment", path[1]
+        elif path == ("building",):
+            kind, index = "building", None
+        elif path == ("style",):
+            kind, index = "style", None
+        else:
+            return None
+        value = _loads(raw)
+        if not isinstance(value, dict):
+            return None
+        return kind, index, value
+
+
+def _loads(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except ValueError:
+        try:
+            return json.loads(_TRAILING_COMMA.sub(r"\1", raw))
+        except ValueError:
+            return None
@@ -0,0 +1,165 @@
+"""
+Voice upload size and transcription latency with and without audio preprocessing.
+
+Synthetic speech-like recordings (harmonics under a syllable envelope, with room noise
+and silence before and after) are written as 16-bit PCM WAV at 48 kHz stereo and 44.1
+kHz mono, the formats browsers and phone recorders produce. For each: the upload size
+before and after prepare_audio, the seconds of audio, and the preprocessing time.
+
+Then every recording is transcribed through transcribe_audio_cached (result cache off)
+against a local mock ElevenLabs STT server, with and without preprocessing. The mock
+answers after --base-ms plus --ms-per-kb per KB received (upload) plus
+--ms-per-second per second of audio (model time), like the real service does.
+
+Run from backend/:  python benchmarks/bench_audio_preprocess.py [--repeat 5] [--base-ms 150]
+                        [--ms-per-kb 0.5] [--ms-per-second 40] [--port 8765]
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import threading
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import uvicorn  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from app.config import get_settings  # noqa: E402
+from app.services.elevenlabs_client import audio_metrics, transcribe_audio_cached  # noqa: E402
+from app.services.http_clients import close_provider_clients  # noqa: E402
+from app.utils.audio import prepare_audio  # noqa: E402
+
+# (name, sample rate, channels, leading silence s, speech s, trailing silence s)
+RECORDINGS = [
+    ("short_48k_stereo", 48000, 2, 1.5, 3.0, 2.0),
+    ("long_48k_stereo", 48000, 2, 2.0, 12.0, 4.0),
+    ("tail_heavy_44k_mono", 44100, 1, 0.5, 4.0, 8.0),
+    ("tight_16k_mono", 16000, 1, 0.1, 6.0, 0.1),
+]
+
+
+def synth_wav(rate: int, channels: int, lead: float, speech: float, tail: float, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(rate * speech)) / rate
+    envelope = np.clip(np.sin(2 * np.pi * 2.5 * t), 0, None) ** 0.5
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.4 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12)) * envelope * 0.15
+    samples = np.concatenate([np.zeros(int(rate * lead)), voice, np.zeros(int(rate * tail))])
+    samples = samples + 0.002 * rng.standard_normal(len(samples))
+    frames = np.repeat(samples[:, None], channels, axis=1)
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.clip(frames, -1, 1) * 32767).astype("<i2").tobytes())
+    return out.getvalue()
+
+
+def wav_seconds(content: bytes) -> float:
+    try:
+        with wave.open(io.BytesIO(content), "rb") as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        return 0.0
+
+
+def mock_stt_app(args: argparse.Namespace) -> Starlette:
+    async def speech_to_text(request: Request) -> JSONResponse:
+        form = await request.form()
+        content = await form["file"].read()
+        delay = args.base_ms + args.ms_per_kb * len(content) / 1024 + args.ms_per_second * wav_seconds(content)
+        await asyncio.sleep(delay / 1000)
+        return JSONResponse({"text": "a small stone cottage with a chimney"})
+
+    return Starlette(routes=[Route("/speech-to-text", speech_to_text, methods=["POST"])])
+
+
+def start_server(args: argparse.Namespace) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(mock_stt_app(args), host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def transcribe_all(recordings: list, repeat: int, preprocess: bool) -> list:
+    get_settings().audio_preprocess_enabled = preprocess
+    latencies = []
+    try:
+        for _ in range(repeat):
+            for content in recordings:
+                started = time.perf_counter()
+                await transcribe_audio_cached(content, "audio/wav")
+                latencies.append(time.perf_counter() - started)
+    finally:
+        await close_provider_clients()
+    return latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--base-ms", type=float, default=150)
+    parser.add_argument("--ms-per-kb", type=float, default=0.5)
+    parser.add_argument("--ms-per-second", type=float, default=40)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    recordings = []
+    print(f"{'recording':22} {'before':>9} {'after':>8} {'saved':>6} {'seconds':>13} {'rate':>6} {'ms':>6}")
+    total_before = total_after = 0
+    for seed, (name, rate, channels, lead, speech, tail) in enumerate(RECORDINGS):
+        content = synth_wav(rate, channels, lead, speech, tail, seed)
+        recordings.append(content)
+        started = time.perf_counter()
+        prepared = prepare_audio(content, "audio/wav", settings.audio_target_rate)
+        elapsed = (time.perf_counter() - started) * 1000
+        stats = prepared.stats
+        total_before += len(content)
+        total_after += len(prepared.data)
+        if not stats:
+            print(f"{name:22} {len(content):9} {'passed through':>15}{'':>27} {elapsed:6.1f}")
+            continue
+        seconds = f"{stats['seconds_before']:.1f} -> {stats['seconds_after']:.1f}"
+        print(
+            f"{name:22} {len(content):9} {len(prepared.data):8} {1 - len(prepared.data) / len(content):6.1%} "
+            f"{seconds:>13} {stats['sample_rate']:6} {elapsed:6.1f}"
+        )
+    print(f"\ntotal upload {total_before} -> {total_after} bytes ({total_after / total_before:.1%})")
+
+    settings.ai_cache_enabled = False
+    settings.elevenlabs_api_key = "bench"
+    settings.elevenlabs_base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(args)
+    print(
+        f"\ntranscription against the mock STT ({args.base_ms:g} ms + {args.ms_per_kb:g} ms/KB + "
+        f"{args.ms_per_second:g} ms/s of audio, {args.repeat} x {len(recordings)} calls)"
+    )
+    try:
+        means = {}
+        for preprocess in (False, True):
+            latencies = asyncio.run(transcribe_all(recordings, args.repeat, preprocess))
+            means[preprocess] = statistics.mean(latencies)
+            label = "preprocessed" if preprocess else "original upload"
+            print(f"  {label:16} mean {means[preprocess] * 1000:7.1f} ms  p50 {statistics.median(latencies) * 1000:7.1f} ms")
+        print(f"  delta            {(means[True] - means[False]) * 1000:+7.1f} ms per recording")
+    finally:
+        server.should_exit = True
+    print(f"\n/api/metrics voice_audio: {audio_metrics()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
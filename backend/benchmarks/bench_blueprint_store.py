@@ -0,0 +1,110 @@
+"""
+Blueprint re-fetch and build-by-id costs with the blueprint store.
+
+Seeded random blueprints (1-5 segments, 2-6 openings each) are validated and stored. For
+each, the table compares:
+  - the /api/build request body posting the full blueprint vs referencing its id,
+  - keying the build plan: dumping and hashing the blueprint (as before) vs the id,
+  - GET /api/blueprints/{id}: a full fetch vs a revalidation with If-None-Match (304).
+The store lives in a temporary directory; requests go through the ASGI app in process.
+
+Run from backend/:  python benchmarks/bench_blueprint_store.py [--blueprints 200] [--seed 7]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.config import get_settings  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import blueprint_store  # noqa: E402
+from app.services.plan_store import plan_key  # noqa: E402
+from app.services.validator import validate_blueprint  # noqa: E402
+
+ORIGIN = {"x": 100, "y": 70, "z": 100}
+
+
+def random_segment(rng: random.Random) -> dict:
+    width, height = rng.randint(8, 24), rng.randint(5, 12)
+    openings = [{"type": "door", "x": rng.randint(1, width - 2), "y": 0}]
+    for i in range(rng.randint(2, 6)):
+        openings.append({"type": "window", "x": (2 + 3 * i) % (width - 2), "y": 2 + i % 2 * 3, "w": 2, "h": 2})
+    return {
+        "width_blocks": width,
+        "wall_height_blocks": height,
+        "depth_blocks": rng.randint(6, 16),
+        "roof": {"type": rng.choice(["gable", "shed", "hip"]), "height_blocks": rng.randint(3, 8), "overhang": 1},
+        "openings": openings,
+    }
+
+
+def mean_us(times: list) -> float:
+    return statistics.mean(times) * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blueprints", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.blueprint_store_path = os.path.join(tempfile.mkdtemp(), "blueprints.sqlite3")
+    blueprint_store._blueprint_store = None
+    store = blueprint_store.get_blueprint_store()
+
+    rng = random.Random(args.seed)
+    blueprints = []
+    for _ in range(args.blueprints):
+        raw = {"segments": [random_segment(rng) for _ in range(rng.randint(1, 5))]}
+        blueprints.append(validate_blueprint(raw)[0])
+    put_times, ids = [], []
+    for blueprint in blueprints:
+        started = time.perf_counter()
+        ids.append(store.put(blueprint, "bench"))
+        put_times.append(time.perf_counter() - started)
+
+    body_full = [len(json.dumps({"blueprint": b.model_dump(mode="json"), "origin": ORIGIN})) for b in blueprints]
+    body_id = [len(json.dumps({"blueprint_id": i, "origin": ORIGIN})) for i in ids]
+
+    key_full, key_id = [], []
+    for blueprint, blueprint_id in zip(blueprints, ids):
+        started = time.perf_counter()
+        plan_key({"blueprint": blueprint.model_dump(mode="json"), "origin": ORIGIN})
+        key_full.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        plan_key({"blueprint_id": blueprint_id, "origin": ORIGIN})
+        key_id.append(time.perf_counter() - started)
+
+    client = TestClient(app)
+    fetch, revalidate, fetched_bytes = [], [], []
+    for blueprint_id in ids:
+        started = time.perf_counter()
+        response = client.get(f"/api/blueprints/{blueprint_id}")
+        fetch.append(time.perf_counter() - started)
+        fetched_bytes.append(len(response.content))
+        started = time.perf_counter()
+        response = client.get(f"/api/blueprints/{blueprint_id}", headers={"If-None-Match": response.headers["etag"]})
+        revalidate.append(time.perf_counter() - started)
+        assert response.status_code == 304
+
+    print(f"{len(blueprints)} blueprints stored ({len(set(ids))} distinct ids), put mean {mean_us(put_times):.0f} us")
+    print(f"{'':28} {'full blueprint':>15} {'by id':>10}")
+    print(f"{'build request body (bytes)':28} {statistics.mean(body_full):15.0f} {statistics.mean(body_id):10.0f}")
+    print(f"{'plan key (us)':28} {mean_us(key_full):15.1f} {mean_us(key_id):10.1f}")
+    print(f"\n{'GET /api/blueprints/{id}':28} {'fetch':>15} {'304':>10}")
+    print(f"{'response body (bytes)':28} {statistics.mean(fetched_bytes):15.0f} {0:10}")
+    print(f"{'latency (us, in process)':28} {mean_us(fetch):15.0f} {mean_us(revalidate):10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Block placements and commands of blueprints with messy openings, with and without the
+geometry lint.
+
+Seeded random blueprints (1-5 segments) get AI-style opening mistakes: overlapping and
+duplicated windows, windows past the wall edge or up into the roof, doors above the
+ground. Each is validated with GEOMETRY_LINT_ENABLED off and on, planned with
+BlockPlanner and scheduled; the table shows placements and commands (what RCON would
+send) of both, the savings the lint reported (for commands: the cells it clipped off
+outside the wall faces, an upper bound), and the lint time per blueprint.
+
+Run from backend/:  python benchmarks/bench_geometry_lint.py [--blueprints 200] [--seed 7]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings  # noqa: E402
+from app.models import Origin  # noqa: E402
+from app.services.block_planner import BlockPlanner  # noqa: E402
+from app.services.command_scheduler import schedule_placements  # noqa: E402
+from app.services.geometry_lint import lint_blueprint  # noqa: E402
+from app.services.validator import validate_blueprint  # noqa: E402
+
+
+def messy_segment(rng: random.Random) -> dict:
+    width, height = rng.randint(8, 24), rng.randint(5, 12)
+    openings = [{"type": "door", "x": rng.randint(1, width - 2), "y": rng.choice([0, 0, 0, 1, 2]), "w": 1, "h": 2}]
+    for _ in range(rng.randint(2, 6)):
+        w, h = rng.randint(1, 3), rng.randint(1, 3)
+        openings.append({"type": "window", "x": rng.randint(0, width), "y": rng.randint(1, height), "w": w, "h": h})
+    if rng.random() < 0.5:
+        openings.append(dict(rng.choice(openings[1:])))  # duplicated window
+    roof = {"type": rng.choice(["gable", "shed", "hip"]), "height_blocks": rng.randint(3, 8), "overhang": rng.randint(0, 2)}
+    return {
+        "width_blocks": width,
+        "wall_height_blocks": height,
+        "depth_blocks": 10,
+        "roof": roof if rng.random() < 0.8 else None,
+        "openings": openings,
+    }
+
+
+def plan_counts(blueprint) -> tuple:
+    placements = BlockPlanner().generate_placements(blueprint, Origin(x=0, y=64, z=0))
+    return len(placements), len(schedule_placements(placements))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blueprints", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    raws = [{"segments": [messy_segment(rng) for _ in range(rng.randint(1, 5))]} for _ in range(args.blueprints)]
+    settings = get_settings()
+
+    totals = dict.fromkeys(("placements_before", "placements_after", "commands_before", "commands_after", "reported_placements", "reported_commands", "fixes"), 0)
+    lint_times = []
+    for raw in raws:
+        settings.geometry_lint_enabled = False
+        blueprint, _ = validate_blueprint(raw)
+        placements_before, commands_before = plan_counts(blueprint)
+        started = time.perf_counter()
+        warnings = lint_blueprint(blueprint)
+        lint_times.append(time.perf_counter() - started)
+        placements_after, commands_after = plan_counts(blueprint)
+        totals["placements_before"] += placements_before
+        totals["placements_after"] += placements_after
+        totals["commands_before"] += commands_before
+        totals["commands_after"] += commands_after
+        if warnings:
+            summary = warnings[-1].value
+            totals["reported_placements"] += summary["placements_saved"]
+            totals["reported_commands"] += summary["cells_clipped"]
+            totals["fixes"] += len(warnings) - 1
+    settings.geometry_lint_enabled = True
+
+    n = len(raws)
+    print(f"{n} blueprints, {totals['fixes']} opening fixes")
+    print(f"{'':12} {'before':>10} {'after':>10} {'saved':>8} {'lint reported':>14}")
+    for kind in ("placements", "commands"):
+        before, after = totals[f"{kind}_before"], totals[f"{kind}_after"]
+        print(f"{kind:12} {before:10} {after:10} {before - after:8} {totals[f'reported_{kind}']:14}")
+    print(f"\nlint time per blueprint: mean {statistics.mean(lint_times) * 1e6:.0f} us, max {max(lint_times) * 1e6:.0f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
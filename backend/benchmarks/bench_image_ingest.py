@@ -0,0 +1,160 @@
+"""
+Per-stage cost of image ingestion on the test_builds/ images.
+
+"disk" is the former path: write the upload to the upload dir, reopen it, resize it in
+place (LANCZOS, same format) and read it back for base64. "memory" is prepare_image:
+decode (JPEG via draft) -> resize -> JPEG encode, then base64, without touching the disk.
+Every stage is timed --repeat times per image (median ms shown).
+
+With --concurrency N the memory pipeline also runs N uploads at once inline on the
+event loop and then on the image pool, reporting the longest event-loop stall seen by
+a 1 ms ticker meanwhile.
+
+Run from backend/:  python benchmarks/bench_image_ingest.py [--repeat 20] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import base64
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from app.services.image_pipeline import MAX_IMAGE_DIMENSION, prepare_upload_image, shutdown_image_executor  # noqa: E402
+from app.utils.image import prepare_image  # noqa: E402
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "test_builds")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def disk_stages(content: bytes, filename: str, directory: str) -> dict:
+    """The former upload path, stage by stage."""
+    times = {}
+    started = time.perf_counter()
+    path = os.path.join(directory, f"{uuid.uuid4()}_{filename}")
+    with open(path, "wb") as f:
+        f.write(content)
+    written = time.perf_counter()
+    times["write"] = written - started
+
+    with Image.open(path) as img:
+        img.load()
+        decoded = time.perf_counter()
+        times["decode"] = decoded - written
+        w, h = img.size
+        fmt = img.format or "PNG"
+        if max(w, h) > MAX_IMAGE_DIMENSION:
+            scale = MAX_IMAGE_DIMENSION / max(w, h)
+            resized = img.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
+            scaled = time.perf_counter()
+            times["resize"] = scaled - decoded
+            save_kw = {"quality": 90} if fmt.upper() in ("JPEG", "WEBP") else {}
+            resized.save(path, format=fmt, **save_kw)
+            times["encode"] = time.perf_counter() - scaled
+        else:
+            times["resize"] = times["encode"] = 0.0
+    reread = time.perf_counter()
+    with open(path, "rb") as f:
+        base64.b64encode(f.read()).decode("utf-8")
+    times["base64"] = time.perf_counter() - reread
+    os.remove(path)
+    times["total"] = time.perf_counter() - started
+    return times
+
+
+def memory_stages(content: bytes) -> dict:
+    started = time.perf_counter()
+    prepared = prepare_image(content, MAX_IMAGE_DIMENSION)
+    encoded = time.perf_counter()
+    prepared.base64
+    times = dict(prepared.timings)
+    times["base64"] = time.perf_counter() - encoded
+    times["total"] = time.perf_counter() - started
+    return times
+
+
+async def loop_stall(uploads: list, pooled: bool) -> tuple:
+    """(wall seconds, longest loop stall in seconds) while all uploads are prepared at once."""
+    stall = 0.0
+    running = True
+
+    async def ticker() -> None:
+        nonlocal stall
+        while running:
+            before = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stall = max(stall, time.perf_counter() - before - 0.001)
+
+    async def inline(content: bytes) -> None:
+        prepare_image(content, MAX_IMAGE_DIMENSION)
+
+    tick = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await asyncio.gather(*(prepare_upload_image(c) if pooled else inline(c) for c in uploads))
+    wall = time.perf_counter() - started
+    running = False
+    await tick
+    return wall, stall
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    names = sorted(n for n in os.listdir(IMAGES_DIR) if n.lower().endswith(IMAGE_EXTENSIONS))
+    directory = tempfile.mkdtemp(prefix="bench_ingest_")
+    stages = ("write", "decode", "resize", "encode", "base64", "total")
+    print(f"{'image':26} {'size':>9} {'path':6} " + " ".join(f"{s:>7}" for s in stages) + "  (median ms)")
+    totals = {"disk": [], "memory": []}
+    try:
+        for name in names:
+            with open(os.path.join(IMAGES_DIR, name), "rb") as f:
+                content = f.read()
+            with Image.open(os.path.join(IMAGES_DIR, name)) as img:
+                size = f"{img.width}x{img.height}"
+            runs = {
+                "disk": [disk_stages(content, name, directory) for _ in range(args.repeat)],
+                "memory": [memory_stages(content) for _ in range(args.repeat)],
+            }
+            for path, times in runs.items():
+                medians = {s: statistics.median(t.get(s, 0.0) for t in times) * 1000 for s in stages}
+                totals[path].append(medians["total"])
+                label = name if path == "disk" else ""
+                print(f"{label:26} {size if path == 'disk' else '':>9} {path:6} " + " ".join(f"{medians[s]:7.1f}" for s in stages))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print(f"\nsum of medians: disk {sum(totals['disk']):.1f} ms, memory {sum(totals['memory']):.1f} ms")
+
+    if args.concurrency > 0:
+        uploads = []
+        while len(uploads) < args.concurrency:
+            for name in names[: args.concurrency - len(uploads)]:
+                with open(os.path.join(IMAGES_DIR, name), "rb") as f:
+                    uploads.append(f.read())
+
+        async def compare() -> None:
+            for pooled in (False, True):
+                wall, stall = await loop_stall(uploads, pooled)
+                label = "image pool" if pooled else "inline"
+                print(f"{len(uploads)} uploads {label:10}: {wall * 1000:7.1f} ms wall, longest loop stall {stall * 1000:6.1f} ms")
+
+        print()
+        try:
+            asyncio.run(compare())
+        finally:
+            shutdown_image_executor()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
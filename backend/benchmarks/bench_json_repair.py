@@ -0,0 +1,86 @@
+"""
+Benchmark and corpus check for the tolerant model-output JSON parser.
+
+Every file in json_corpus/ is a malformed (or valid) model response; each must parse
+and pass blueprint validation. Then multi-KB synthetic responses (valid, fenced,
+single-quoted, trailing commas, truncated) are timed to report worst-case parse time.
+
+Run from backend/:  python benchmarks/bench_json_repair.py
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.validator import validate_blueprint  # noqa: E402
+from app.utils.json_repair import parse_json_tolerant  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "json_corpus")
+RUNS = 200
+
+
+def timed(fn, *args, runs: int = RUNS):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1e6, max(samples) * 1e6
+
+
+def synthetic_responses(segments: int) -> dict:
+    segment = {
+        "width_blocks": 10, "wall_height_blocks": 6, "depth_blocks": 8,
+        "roof": {"type": "gable", "height_blocks": 4, "overhang": 1},
+        "openings": [{"type": "window", "x": 2 + i, "y": 3, "w": 2, "h": 2} for i in range(6)],
+    }
+    blueprint = {
+        "view": "front",
+        "segments": [segment] * segments,
+        "style": {"theme": "ghibli", "materials": {"wall": "oak_planks"}, "decor": ["lantern"], "variation": 0.15},
+    }
+    text = json.dumps(blueprint, indent=2)
+    return {
+        "valid": text,
+        "fenced": f"Here you go:\n```json\n{text}\n```",
+        "single_quotes": repr(blueprint),
+        "trailing_commas": text.replace("}\n", "},\n").replace("]\n", "],\n"),
+        "truncated_90pct": text[: int(len(text) * 0.9)],
+        "truncated_in_string": text[: text.rindex('"oak_planks"') + 5],
+    }
+
+
+def main() -> int:
+    failures = 0
+    print(f"{'corpus file':40} {'bytes':>7} {'median us':>10} {'max us':>9}  result")
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        with open(os.path.join(CORPUS_DIR, name), "r", encoding="utf-8") as f:
+            text = f.read()
+        try:
+            raw = parse_json_tolerant(text)
+            validate_blueprint(raw)
+            median, worst = timed(parse_json_tolerant, text)
+            print(f"{name:40} {len(text):7d} {median:10.1f} {worst:9.1f}  ok")
+        except Exception as e:
+            failures += 1
+            print(f"{name:40} {len(text):7d} {'-':>10} {'-':>9}  FAILED: {e}")
+
+    print()
+    print(f"{'synthetic response':40} {'bytes':>7} {'median us':>10} {'max us':>9}  us/KB")
+    worst_case = 0.0
+    for segments in (8, 32, 128):
+        for variant, text in synthetic_responses(segments).items():
+            median, worst = timed(parse_json_tolerant, text, runs=50)
+            worst_case = max(worst_case, median / (len(text) / 1024))
+            print(f"{f'{segments} segments, {variant}':40} {len(text):7d} {median:10.1f} {worst:9.1f}  {median / (len(text) / 1024):6.1f}")
+
+    print()
+    print(f"worst median cost: {worst_case:.1f} us per KB; corpus failures: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
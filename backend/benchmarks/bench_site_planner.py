@@ -0,0 +1,114 @@
+"""
+Site planning wall time against the number of planner processes.
+
+A seeded village of random structures (1-3 segments each) on a grid is planned with
+plan_site for each worker count. The pool is created and warmed before timing. Alongside,
+the table splits one in-process run into its phases:
+  - plan: planning, resolving and scheduling every structure (spread over the pool),
+  - transfer: pickling the per-structure arrays back to the parent,
+  - merge: the shared clear pass and the k-way merge of the structures' chunk runs,
+the last two staying on one core whatever the worker count. The last line is the Amdahl
+bound (plan + transfer + merge) / (transfer + merge) on the speedup.
+
+Run from backend/:  python benchmarks/bench_site_planner.py [--structures 16] [--workers 1,2,4] [--seed 7]
+"""
+import argparse
+import os
+import pickle
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings  # noqa: E402
+from app.models import Origin  # noqa: E402
+from app.services import site_planner  # noqa: E402
+from app.services.validator import validate_blueprint  # noqa: E402
+
+# Distance between structure origins; larger than any random footprint
+SPACING = 96
+
+
+def random_segment(rng: random.Random) -> dict:
+    width, height = rng.randint(10, 28), rng.randint(5, 12)
+    openings = [{"type": "door", "x": rng.randint(1, width - 2), "y": 0}]
+    for i in range(rng.randint(2, 6)):
+        openings.append({"type": "window", "x": (2 + 3 * i) % (width - 2), "y": 2 + i % 2 * 3, "w": 2, "h": 2})
+    return {
+        "width_blocks": width,
+        "wall_height_blocks": height,
+        "depth_blocks": rng.randint(8, 18),
+        "roof": {"type": rng.choice(["gable", "shed", "hip"]), "height_blocks": rng.randint(3, 8), "overhang": 1},
+        "openings": openings,
+    }
+
+
+def village(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    side = max(1, int(count ** 0.5 + 0.999))
+    structures = []
+    for i in range(count):
+        raw = {"segments": [random_segment(rng) for _ in range(rng.randint(1, 3))]}
+        origin = Origin(x=(i % side) * SPACING, y=64, z=(i // side) * SPACING)
+        structures.append((validate_blueprint(raw)[0], origin))
+    return structures
+
+
+def phases(structures: list) -> dict:
+    """One in-process plan_site, timed phase by phase."""
+    jobs = [(bp.model_dump(mode="json"), (o.x, o.y, o.z)) for bp, o in structures]
+    started = time.perf_counter()
+    results = [site_planner._plan_structure(*job) for job in jobs]
+    plan = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = [pickle.loads(pickle.dumps(r)) for r in results]
+    transfer = time.perf_counter() - started
+
+    started = time.perf_counter()
+    site = site_planner.merge_structures(structures, results)
+    merge = time.perf_counter() - started
+    return {"plan": plan, "transfer": transfer, "merge": merge, "placements": len(site.placements)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--structures", type=int, default=16)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    structures = village(args.structures, args.seed)
+    split = phases(structures)
+    print(f"{len(structures)} structures, {split['placements']} placements, {os.cpu_count()} CPUs")
+    print(f"{'phase (one core)':18} {'ms':>9}")
+    for name in ("plan", "transfer", "merge"):
+        print(f"{name:18} {split[name] * 1000:9.1f}")
+
+    settings = get_settings()
+    print(f"\n{'workers':>7} {'wall ms':>9} {'speedup':>8}")
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        site_planner.shutdown_site_executor()
+        settings.site_planner_workers = workers
+        site_planner.plan_site(structures)  # start and warm the pool
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            site_planner.plan_site(structures)
+            times.append(time.perf_counter() - started)
+        wall = statistics.median(times)
+        baseline = baseline or wall
+        print(f"{workers:7} {wall * 1000:9.1f} {baseline / wall:8.2f}")
+    site_planner.shutdown_site_executor()
+
+    serial = split["transfer"] + split["merge"]
+    print(f"\nAmdahl bound on speedup: {(split['plan'] + serial) / serial:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
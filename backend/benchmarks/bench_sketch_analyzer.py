@@ -0,0 +1,162 @@
+"""
+Accuracy and speed of the local sketch analyzer on the test_builds/ images.
+
+Each image is analyzed --repeat times; the report lists latency, confidence, whether
+the result would be used without an AI call (SKETCH_CONFIDENCE_THRESHOLD), and how
+the extracted structure compares with a hand-labelled reference: the roof of each
+segment left to right, and the number of doors and windows. With AI_API_KEY set the
+provider's result for each image is timed and compared the same way.
+
+Then synthetic images that are not buildings (noise, a blank page, a circle, a plain
+rectangle, a page border, a framed note, a hatched box, a drawing inside a page border)
+are analyzed; none of them may be handled locally.
+
+Run from backend/:  python benchmarks/bench_sketch_analyzer.py [--repeat 20] [--ai]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings  # noqa: E402
+from app.services.ai_client import AIClient  # noqa: E402
+from app.services.http_clients import close_provider_clients  # noqa: E402
+from app.services.sketch_analyzer import analyze_sketch  # noqa: E402
+from app.utils.image import prepare_image_file  # noqa: E402
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "test_builds")
+
+# Roof type per segment (None = flat), doors, windows
+REFERENCE = {
+    "IMG_6765.jpg": (["gable", None, "gable", None, "gable"], 1, 2),
+    "castle.png": (["gable", None, "gable"], 0, 0),
+    "house_w_door_window.png": (["gable"], 1, 1),
+    "image.jpg": (["gable", None, "gable"], 1, 1),
+    "image_1.jpg": (["gable"], 1, 2),
+    "plain_house.png": (["gable"], 0, 0),
+}
+
+
+def negatives() -> dict:
+    """Images that must not become a blueprint without the AI: name -> image."""
+    def page() -> tuple:
+        img = Image.new("L", (1000, 800), 255)
+        return img, ImageDraw.Draw(img)
+
+    font = ImageFont.load_default()
+    rng = np.random.default_rng(3)
+    cases = {"noise": Image.fromarray((rng.random((800, 1000)) * 255).astype(np.uint8))}
+    cases["blank page"], _ = page()
+    img, draw = page()
+    draw.ellipse((250, 150, 750, 650), outline=0, width=4)
+    cases["circle"] = img
+    img, draw = page()
+    draw.rectangle((250, 250, 750, 650), outline=0, width=4)
+    cases["rectangle"] = img
+    img, draw = page()
+    draw.rectangle((15, 15, 985, 785), outline=0, width=5)
+    cases["page border"] = img
+    img, draw = page()
+    draw.rectangle((150, 150, 850, 650), outline=0, width=4)
+    for i in range(12):
+        draw.text((190, 190 + 35 * i), "Meeting notes: call the builder about the windows and roof", fill=0, font=font)
+    cases["framed note"] = img
+    img, draw = page()
+    draw.rectangle((250, 250, 750, 650), outline=0, width=4)
+    for x in range(250, 750, 25):
+        draw.line((x, 650, min(750, x + 400), 650 - (min(750, x + 400) - x)), fill=0, width=2)
+    cases["hatched box"] = img
+    img, draw = page()
+    draw.rectangle((15, 15, 985, 785), outline=0, width=5)
+    draw.rectangle((300, 400, 700, 700), outline=0, width=4)
+    draw.line([(280, 400), (500, 250), (720, 400)], fill=0, width=4)
+    cases["house in page border"] = img
+    return cases
+
+
+def structure(raw: dict) -> tuple:
+    segments = raw.get("segments") or [raw.get("building") or {}]
+    roofs = [(s.get("roof") or {}).get("type") for s in segments]
+    openings = [o.get("type") for s in segments for o in s.get("openings") or []]
+    return roofs, openings.count("door"), openings.count("window")
+
+
+def score(raw: dict, name: str) -> str:
+    roofs, doors, windows = structure(raw)
+    want_roofs, want_doors, want_windows = REFERENCE[name]
+    checks = [roofs == want_roofs, doors == want_doors, windows == want_windows]
+    return f"{sum(checks)}/3" + ("" if all(checks) else f" (got {roofs} {doors}d {windows}w)")
+
+
+async def compare_ai(images: list) -> None:
+    client = AIClient()
+    print(f"\nprovider {client.provider}, model {client.model}")
+    try:
+        for path in images:
+            name = os.path.basename(path)
+            image = prepare_image_file(path)
+            started = time.perf_counter()
+            try:
+                raw, _ = await client.analyze_image(image, "ghibli")
+            except Exception as e:
+                print(f"  {name:26} FAILED {e}")
+                continue
+            print(f"  {name:26} {(time.perf_counter() - started) * 1000:8.0f} ms  {score(raw, name)}")
+    finally:
+        await close_provider_clients()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--ai", action="store_true", help="also time the configured AI provider")
+    args = parser.parse_args()
+
+    threshold = get_settings().sketch_confidence_threshold
+    images = [os.path.join(IMAGES_DIR, name) for name in sorted(REFERENCE)]
+    print(f"{'image':26} {'p50 ms':>7} {'max ms':>7} {'conf':>5} {'local':>5}  structure")
+    correct = local = 0
+    for path in images:
+        name = os.path.basename(path)
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            analysis = analyze_sketch(path)
+            times.append(time.perf_counter() - started)
+        times.sort()
+        used = analysis.geometry is not None and analysis.confidence >= threshold
+        local += used
+        result = score(analysis.geometry, name) if analysis.geometry else f"- ({analysis.reason})"
+        correct += result == "3/3"
+        print(
+            f"{name:26} {times[len(times) // 2] * 1000:7.1f} {times[-1] * 1000:7.1f} "
+            f"{analysis.confidence:5.2f} {'yes' if used else 'no':>5}  {result}"
+        )
+    print(f"\n{local}/{len(images)} handled locally (threshold {threshold}), {correct}/{len(images)} structurally correct")
+
+    print(f"\n{'not a building':26} {'conf':>5} {'local':>5}  reason")
+    accepted = 0
+    cases = negatives()
+    for name, img in cases.items():
+        analysis = analyze_sketch(img)
+        used = analysis.geometry is not None and analysis.confidence >= threshold
+        accepted += used
+        print(f"{name:26} {analysis.confidence:5.2f} {'YES' if used else 'no':>5}  {analysis.reason}")
+    print(f"\n{accepted}/{len(cases)} non-buildings handled locally (should be 0)")
+
+    if args.ai:
+        if not get_settings().ai_api_key:
+            print("\nAI_API_KEY is not set; skipping the provider comparison.")
+        else:
+            asyncio.run(compare_ai(images))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Provider payload of the test_builds/ images before and after the line-drawing encoder.
+
+For each image: the prepared upload (bytes, estimated vision tokens) and what
+encode_line_drawing makes of it (bytes, 1-bit or grayscale, crop size, tokens,
+encoding time). Then every image goes through AIClient.analyze_image against a local
+mock provider whose latency grows with the payload (mock:<latency_ms>:0:<ms_per_kb>),
+with and without the encoder, to show the end-to-end change.
+
+Run from backend/:  python benchmarks/bench_sketch_payload.py [--max-bytes 49152] [--max-tokens 0]
+                        [--latency-ms 800] [--ms-per-kb 1.0] [--repeat 10]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings  # noqa: E402
+from app.services.ai_client import AIClient  # noqa: E402
+from app.services.image_pipeline import payload_metrics, shutdown_image_executor  # noqa: E402
+from app.utils.image import prepare_image_file  # noqa: E402
+from app.utils.sketch_image import encode_line_drawing, estimate_image_tokens  # noqa: E402
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "test_builds")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def payload_table(paths: list, args: argparse.Namespace) -> None:
+    print(f"{'image':26} {'before':>8} {'tokens':>6}   {'after':>7} {'mode':>4} {'type':>5} {'size':>9} {'tokens':>6} {'ms':>6}")
+    total_before = total_after = 0
+    for path in paths:
+        image = prepare_image_file(path)
+        tokens = estimate_image_tokens(image.image.width, image.image.height, args.provider)
+        started = time.perf_counter()
+        payload = encode_line_drawing(image.image, args.max_bytes, args.max_tokens, get_settings().sketch_payload_margin, args.provider)
+        elapsed = (time.perf_counter() - started) * 1000
+        total_before += len(image.data)
+        name = os.path.basename(path)
+        if payload is None:
+            total_after += len(image.data)
+            print(f"{name:26} {len(image.data):8} {tokens:6}   not a line drawing{'':>21} {elapsed:6.1f}")
+            continue
+        total_after += len(payload.data)
+        size = f"{payload.size[0]}x{payload.size[1]}"
+        print(
+            f"{name:26} {len(image.data):8} {tokens:6}   {len(payload.data):7} {payload.mode:>4} "
+            f"{payload.mime_type.split('/')[1]:>5} {size:>9} {payload.tokens:6} {elapsed:6.1f}"
+        )
+    print(f"\ntotal payload {total_before} -> {total_after} bytes ({total_after / total_before:.1%})")
+
+
+async def end_to_end(paths: list, repeat: int, compact: bool) -> list:
+    settings = get_settings()
+    settings.sketch_payload_enabled = compact
+    client = AIClient()
+    latencies = []
+    for _ in range(repeat):
+        for path in paths:
+            image = prepare_image_file(path)
+            started = time.perf_counter()
+            await client.analyze_image(image, "ghibli")
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-bytes", type=int, default=get_settings().sketch_payload_max_bytes)
+    parser.add_argument("--max-tokens", type=int, default=get_settings().sketch_payload_max_tokens)
+    parser.add_argument("--provider", default="openai", help="token estimate: openai or gemini")
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--ms-per-kb", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    paths = [os.path.join(IMAGES_DIR, n) for n in sorted(os.listdir(IMAGES_DIR)) if n.lower().endswith(IMAGE_EXTENSIONS)]
+    payload_table(paths, args)
+
+    settings = get_settings()
+    settings.ai_providers = f"mock:{args.latency_ms:g}:0:{args.ms_per_kb:g}"
+    print(f"\nend to end against {settings.ai_providers} ({args.repeat} x {len(paths)} calls)")
+    try:
+        for compact in (False, True):
+            latencies = asyncio.run(end_to_end(paths, args.repeat, compact))
+            label = "line-drawing encoder" if compact else "prepared upload"
+            print(f"  {label:21} mean {statistics.mean(latencies) * 1000:7.1f} ms  p50 {statistics.median(latencies) * 1000:7.1f} ms")
+    finally:
+        shutdown_image_executor()
+    print(f"\n/api/metrics image_payload: {payload_metrics()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Compare the prompt+examples mode with provider structured output on the test_builds/ images.
+
+Prints the prompt size of both modes, then (with AI_API_KEY set) analyzes every image
+once per mode, bypassing the result cache, and reports latency, token usage as
+reported by the provider, and how many results needed validation adjustments.
+
+Run from backend/:  python benchmarks/bench_structured_output.py [--style ghibli]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings  # noqa: E402
+from app.services.ai_client import AIClient, _get_blueprint_prompt  # noqa: E402
+from app.services.ai_usage import ai_usage_metrics  # noqa: E402
+from app.services.http_clients import close_provider_clients  # noqa: E402
+from app.services.validator import validate_blueprint  # noqa: E402
+from app.utils.image import prepare_image_file  # noqa: E402
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "test_builds")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+async def run_mode(structured: bool, images: list, style: str) -> dict:
+    client = AIClient(structured=structured)
+    latencies, adjusted, failed = [], 0, 0
+    for path in images:
+        image = prepare_image_file(path)
+        started = time.perf_counter()
+        try:
+            raw, _ = await client.analyze_image(image, style)
+            _, warnings = validate_blueprint(raw)
+            adjusted += any(w.startswith("Validation adjustment") for w in warnings)
+        except Exception as e:
+            failed += 1
+            print(f"  {client.mode:10} {os.path.basename(path)}: FAILED {e}")
+            continue
+        latencies.append(time.perf_counter() - started)
+        print(f"  {client.mode:10} {os.path.basename(path):28} {latencies[-1] * 1000:8.0f} ms")
+    return {"latencies": latencies, "adjusted": adjusted, "failed": failed}
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--style", default="ghibli")
+    args = parser.parse_args()
+
+    print("prompt size (characters)")
+    for structured in (False, True):
+        mode = "structured" if structured else "prompt"
+        print(f"  {mode:10} {len(_get_blueprint_prompt(args.style, structured)):6d}")
+
+    settings = get_settings()
+    if not settings.ai_api_key:
+        print("\nAI_API_KEY is not set; skipping the provider comparison.")
+        return 0
+
+    images = sorted(
+        os.path.join(IMAGES_DIR, name)
+        for name in os.listdir(IMAGES_DIR)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    print(f"\n{len(images)} images, provider {settings.ai_provider}, model {settings.ai_model}")
+    results = {}
+    try:
+        for structured in (False, True):
+            results["structured" if structured else "prompt"] = await run_mode(structured, images, args.style)
+    finally:
+        await close_provider_clients()
+
+    usage = ai_usage_metrics()
+    print(f"\n{'mode':10} {'ok':>4} {'failed':>6} {'adjusted':>8} {'p50 ms':>8} {'avg in tok':>10} {'avg out tok':>11}")
+    for mode, result in results.items():
+        stats = usage.get(f"{settings.ai_provider.strip().lower()}/{mode}", {})
+        latencies = sorted(result["latencies"])
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        print(
+            f"{mode:10} {len(latencies):4d} {result['failed']:6d} {result['adjusted']:8d} {p50:8.0f} "
+            f"{stats.get('avg_prompt_tokens') or '-':>10} {stats.get('avg_output_tokens') or '-':>11}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
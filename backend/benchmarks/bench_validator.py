@@ -0,0 +1,140 @@
+"""
+Blueprint validation time per blueprint, former validator vs the current one.
+
+"former" is the previous validate_blueprint: normalize (mutating the caller's
+openings), Blueprint.model_validate, and on any error fill defaults and validate the
+whole blueprint again (out-of-range values still fail). "current" is
+app.services.validator.validate_blueprint: precompiled TypeAdapter, field-level repair
+from the structured error list, no aliasing. Material repair is the same in both and
+excluded from the timings.
+
+Run from backend/:  python benchmarks/bench_validator.py [--repeat 2000]
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Blueprint  # noqa: E402
+from app.services import validator  # noqa: E402
+
+
+def building(width: int = 20, openings: int = 4, **extra) -> dict:
+    b = {
+        "width_blocks": width,
+        "wall_height_blocks": 10,
+        "depth_blocks": 10,
+        "roof": {"type": "gable", "height_blocks": 5, "overhang": 1},
+        "openings": [{"type": "window", "x": 2 + 3 * i, "y": 4, "w": 2, "h": 2} for i in range(openings)]
+        + [{"type": "door", "x": 1, "y": 0, "w": 1, "h": 2}],
+    }
+    b.update(extra)
+    return b
+
+
+STYLE = {"theme": "ghibli", "materials": {"wall": "oak_planks", "roof": "spruce_stairs"}, "decor": ["lantern"], "variation": 0.2}
+
+CASES = {
+    "single building": {"building": building(), "style": STYLE},
+    "5 segments": {"segments": [building(width=12, openings=6) for _ in range(5)], "style": STYLE},
+    "3 bad fields": {"building": building(width=120, wall_height_blocks="12 blocks", roof={"type": "Gable", "height_blocks": 1, "overhang": 1}), "style": STYLE},
+    "missing fields": {"building": {"width_blocks": 30, "openings": [{"type": "door", "x": 2, "y": 0}]}, "style": STYLE},
+    "5 segments, 1 bad": {"segments": [building(width=12, openings=6) for _ in range(4)] + [building(depth_blocks=3.5)], "style": STYLE},
+}
+
+
+def former_validate(raw: dict):
+    """The previous validator without material repair; raises on what it can't fix."""
+    data = former_normalize(raw)
+    try:
+        return Blueprint.model_validate(data)
+    except Exception as e:
+        str(e)  # formatted into the warning
+        return Blueprint.model_validate(former_defaults(data))
+
+
+def former_normalize(d: dict) -> dict:
+    out = {"view": d.get("view", "front")}
+    if isinstance(d.get("segments"), list) and d["segments"]:
+        out["segments"] = [former_building(s) for s in d["segments"]]
+        out["building"] = None
+    elif "building" in d:
+        out["building"] = former_building(d["building"])
+        out["segments"] = None
+    else:
+        out["building"] = {}
+        out["segments"] = None
+    out["style"] = d.get("style", {})
+    return out
+
+
+def former_building(b: dict) -> dict:
+    out = dict(b)
+    out.setdefault("openings", [])
+    for op in out["openings"]:
+        op.setdefault("w", 1)
+        op.setdefault("h", 2 if op.get("type") == "door" else 3)
+        if op.get("type") == "door":
+            op["w"], op["h"] = 1, 2
+    return out
+
+
+def former_defaults(data: dict) -> dict:
+    buildings = data["segments"] if data.get("segments") else [data["building"]]
+    for b in buildings:
+        b.setdefault("width_blocks", 24)
+        b.setdefault("wall_height_blocks", 12)
+        b.setdefault("depth_blocks", 10)
+    return data
+
+
+def current_validate(raw: dict):
+    data = validator._normalize_blueprint_dict(raw)
+    return validator._validate(validator._BLUEPRINT_ADAPTER, data, Blueprint)
+
+
+def time_per_call(fn, raw: dict, repeat: int) -> float:
+    """Best microseconds per call of 7 runs of repeat calls (fresh copies, since the former one mutates)."""
+    runs = []
+    for _ in range(7):
+        inputs = [copy.deepcopy(raw) for _ in range(repeat)]
+        started = time.perf_counter()
+        for item in inputs:
+            fn(item)
+        runs.append((time.perf_counter() - started) / repeat * 1e6)
+    return min(runs)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'blueprint':20} {'former us':>10} {'current us':>11} {'speedup':>8}  repairs")
+    for name, raw in CASES.items():
+        try:
+            former_validate(copy.deepcopy(raw))
+            former = time_per_call(former_validate, raw, args.repeat)
+            former_label = f"{former:10.1f}"
+        except Exception:
+            former, former_label = None, f"{'fails':>10}"
+        current = time_per_call(current_validate, raw, args.repeat)
+        _, warnings = current_validate(copy.deepcopy(raw))
+        speedup = f"{former / current:7.2f}x" if former else f"{'':>8}"
+        print(f"{name:20} {former_label} {current:11.1f} {speedup}  {len(warnings)}")
+
+    raw = copy.deepcopy(CASES["missing fields"])
+    before = copy.deepcopy(raw)
+    former_validate(raw)
+    print(f"\nformer validator modified the caller's dict: {raw != before}")
+    raw = copy.deepcopy(before)
+    validator.validate_blueprint(raw)
+    print(f"current validator modified the caller's dict: {raw != before}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())